@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booking.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Приложение потока событий импортируется после настройки Django
+from reservation.streams import route_events  # noqa: E402
+
+application = route_events(django_application)
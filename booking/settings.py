@@ -12,22 +12,53 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env(name, default=None):
+    return os.environ.get(f'BOOKING_{name}', default)
+
+
+def env_bool(name, default):
+    value = env(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Профиль настроек: development - отладка и SQLite, production - без
+# отладочных инструментов. Остальные параметры BOOKING_* уточняют профиль
+PROFILE = env('PROFILE', 'development')
+PRODUCTION = PROFILE == 'production'
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = '86!7v=2k-*i#u%4^0lc85&4pj(52=ql*ek%y=5bf#l5q3_*fj0'
+SECRET_KEY = env('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_bool('DEBUG', not PRODUCTION)
 
-ALLOWED_HOSTS = [
-    "*",
-]
+ALLOWED_HOSTS = env('ALLOWED_HOSTS')
+
+if PRODUCTION:
+    # ключ из репозитория и любой хост годятся только для разработки
+    missing = [f'BOOKING_{name}' for name, value in (
+        ('SECRET_KEY', SECRET_KEY), ('ALLOWED_HOSTS', ALLOWED_HOSTS)
+    ) if not value]
+    if missing:
+        raise ImproperlyConfigured(
+            f'Профиль production требует {", ".join(missing)}')
+else:
+    SECRET_KEY = SECRET_KEY or (
+        '86!7v=2k-*i#u%4^0lc85&4pj(52=ql*ek%y=5bf#l5q3_*fj0')
+    ALLOWED_HOSTS = ALLOWED_HOSTS or '*'
+ALLOWED_HOSTS = ALLOWED_HOSTS.split(',')
 
 
 # Application definition
@@ -47,10 +78,10 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'drf_yasg',
     'corsheaders',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'reservation.middleware.query_instrumentation_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -59,16 +90,22 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG and not PRODUCTION:
+    # middleware панели отладки только синхронный: под ASGI запросы через
+    # него обрабатываются по одному, поэтому панель подключается лишь в
+    # отладке и никогда в боевом профиле
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'reservation.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
@@ -76,12 +113,121 @@ REST_FRAMEWORK = {
     ],
 }
 
+if PRODUCTION:
+    # без страниц браузерного API: только JSON
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'rest_framework.renderers.JSONRenderer',
+    ]
+
 # разрешит обрабатывать запросы, приходящие с любого хоста,
 # игнорируя политику Some Origin
 CORS_ORIGIN_ALLOW_ALL = True
 # определяет URL'ы, к которым можно обращаться с других доменов
 CORS_URLS_REGEX = r'^/(api|swagger)/.*$'
 
+# индекс занятости помещений в памяти процесса для поиска свободных мест;
+# хранит не больше RESERVATION_OCCUPANCY_DAYS последних запрошенных дней
+RESERVATION_OCCUPANCY_CACHE = True
+RESERVATION_OCCUPANCY_DAYS = 62
+
+# максимальное число броней в одном запросе reservations/bulk/
+RESERVATION_BULK_LIMIT = 500
+
+# максимальное число вхождений в одной серии повторяющихся броней
+RESERVATION_SERIES_MAX_OCCURRENCES = 500
+# окно по умолчанию для просмотра вхождений серии, в днях
+RESERVATION_SERIES_WINDOW_DAYS = 30
+
+# число броней, читаемых из базы за раз при потоковой выгрузке
+RESERVATION_EXPORT_CHUNK_SIZE = 2000
+
+# время жизни кэшированных ответов API помещений, в секундах; ответы
+# кэшируются по версии изменений и становятся неактуальны сразу после
+# изменения броней
+RESERVATION_RESPONSE_CACHE_TIMEOUT = 300
+
+# размер пула потоков, в котором асинхронные представления обращаются к
+# базе; ограничивает число соединений с базой одного ASGI-процесса
+RESERVATION_ASYNC_DB_THREADS = 8
+
+# брокер событий занятости помещений для потока /api/v1/events/:
+# InMemoryBroker получает изменения из сигналов своего процесса,
+# VersionBroker - из таблицы версий, то есть от всех процессов
+RESERVATION_EVENTS_BROKER = 'reservation.events.InMemoryBroker'
+# такт рассылки событий, в секундах: изменения помещения за такт
+# сливаются в одно событие
+RESERVATION_EVENTS_TICK = 1
+
+# кэш проверенных токенов API в памяти процесса: число записей и время
+# жизни записи в секундах. Отзыв токена сбрасывает кэши всех процессов
+# через таблицу версий изменений
+RESERVATION_TOKEN_CACHE_SIZE = 10000
+RESERVATION_TOKEN_CACHE_TIMEOUT = 60
+
+# ограничение запросов, изменяющих брони (reservation.throttling):
+# корзины токенов на пользователя, на помещение и общая; '30/min' -
+# 30 запросов подряд и пополнение на 30 токенов в минуту. Нагрузочные
+# команды снимают ограничение через RESERVATION_THROTTLE_ENABLED
+RESERVATION_THROTTLE_ENABLED = True
+RESERVATION_THROTTLE_RATES = {
+    'user': '30/min',
+    'room': '60/min',
+    'global': '600/min',
+}
+# доля каждой корзины, доступная только сотрудникам (is_staff)
+RESERVATION_THROTTLE_STAFF_RESERVE = 0.2
+# хранилище корзин: LocalBucketStore - память процесса,
+# CacheBucketStore - кэш Django, общий для процессов при общем CACHES
+RESERVATION_THROTTLE_STORE = 'reservation.throttling.LocalBucketStore'
+
+# замеры запросов (reservation.middleware): сколько последних ответов
+# каждого представления учитывать в процентилях и с какой длительности,
+# в миллисекундах, SQL-запрос пишется в журнал как медленный
+RESERVATION_METRICS_WINDOW = 1000
+RESERVATION_SLOW_QUERY_MS = 200
+
+# брони, закончившиеся больше RESERVATION_ARCHIVE_AFTER_DAYS дней назад,
+# archive_reservations переносит в архив порциями по
+# RESERVATION_ARCHIVE_BATCH_SIZE; более новые брони в архив не попадают
+RESERVATION_ARCHIVE_AFTER_DAYS = 180
+RESERVATION_ARCHIVE_BATCH_SIZE = 5000
+
+# период статистики занятости (/api/v1/stats/) по умолчанию и наибольший
+# допустимый период, в днях
+RESERVATION_STATS_DEFAULT_DAYS = 30
+RESERVATION_STATS_MAX_DAYS = 366
+
+# поиск свободного времени (rooms/<id>/slots/, buildings/<id>/slots/):
+# наибольшее окно в днях и наибольшее число слотов в ответе
+RESERVATION_SLOTS_MAX_DAYS = 31
+RESERVATION_SLOTS_MAX_LIMIT = 100
+
+# наибольшее окно в днях для броней, вложенных в здания (/api/v1/buildings/)
+RESERVATION_BUILDINGS_MAX_DAYS = 31
+
+# фоновые задачи (reservation.jobs): ThreadPoolBackend выполняет их в
+# пуле потоков процесса, DatabaseBackend - командой run_jobs из таблицы
+# Job, InMemoryBackend - только по вызову run_pending, для тестов
+RESERVATION_JOBS_BACKEND = 'reservation.jobs.ThreadPoolBackend'
+RESERVATION_JOBS_THREADS = 2
+# попыток на задачу и пауза после первой неудачи в секундах, которая
+# удваивается с каждой следующей до RESERVATION_JOBS_RETRY_MAX_DELAY
+RESERVATION_JOBS_MAX_ATTEMPTS = 5
+RESERVATION_JOBS_RETRY_DELAY = 10
+RESERVATION_JOBS_RETRY_MAX_DELAY = 3600
+# run_jobs: сколько секунд задача закреплена за обработчиком и как часто
+# опрашивается пустая очередь
+RESERVATION_JOBS_LEASE = 300
+RESERVATION_JOBS_POLL_INTERVAL = 1
+
+# окно календарей .ics в днях назад и вперёд от текущих суток; архив в
+# ленты не попадает, поэтому RESERVATION_ICAL_PAST_DAYS должно быть
+# меньше RESERVATION_ARCHIVE_AFTER_DAYS
+RESERVATION_ICAL_PAST_DAYS = 30
+RESERVATION_ICAL_FUTURE_DAYS = 180
+# сколько секунд хранится отрисованный VEVENT брони
+RESERVATION_ICAL_FRAGMENT_TIMEOUT = 86400
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -111,11 +257,69 @@ WSGI_APPLICATION = 'booking.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# BOOKING_DB_ENGINE=postgresql включает PostgreSQL, по умолчанию - SQLite
+if env('DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env('DB_NAME', 'booking'),
+            'USER': env('DB_USER', 'booking'),
+            'PASSWORD': env('DB_PASSWORD', ''),
+            'HOST': env('DB_HOST', 'localhost'),
+            'PORT': env('DB_PORT', '5432'),
+            # постоянные соединения: процесс не подключается к базе заново
+            # на каждый запрос
+            'CONN_MAX_AGE': int(env('DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+    if env_bool('DB_PGBOUNCER', False):
+        # PgBouncer в режиме пула транзакций выдаёт соединения с сервером
+        # на время транзакции, и серверные курсоры iterator() между
+        # транзакциями не живут
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # сколько секунд ждать, пока другой процесс держит запись
+            'OPTIONS': {'timeout': 20},
+            # постоянные соединения: каждое новое выполняет SQLITE_PRAGMAS
+            'CONN_MAX_AGE': int(env('DB_CONN_MAX_AGE', 60)),
+            # тестовая база в файле: в общей базе в памяти одновременные
+            # записи из потоков падают с «database table is locked»
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
+
+# PRAGMA, которые reservation.signals выполняет при каждом подключении к
+# SQLite: WAL позволяет читать во время записи, synchronous=NORMAL в
+# режиме WAL не теряет целостность при сбое процесса
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'temp_store': 'memory',
+    'cache_size': -20000,
+    'mmap_size': 134217728,
+}
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'reservation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }
 
 
@@ -25,7 +25,7 @@ urlpatterns = [
 ]
 
 
-if settings.DEBUG:
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     import debug_toolbar
 
     urlpatterns += (path("__debug__/", include(debug_toolbar.urls)),)
\ No newline at end of file
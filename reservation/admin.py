@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Building, Reservation, Room
+from .models import (Building, Job, Reservation, ReservationArchive,
+                     ReservationSeries, Room)
 
 
 class ReserveAdmin(admin.ModelAdmin):
@@ -11,6 +12,21 @@ class ReserveAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
+class ArchiveAdmin(ReserveAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class SeriesAdmin(admin.ModelAdmin):
+    list_display = ("pk", "room", "frequency", "datetime_from",
+                    "datetime_to", "until", "author", "created")
+    list_filter = ("frequency", "datetime_from",)
+    empty_value_display = "-пусто-"
+
+
 class RoomAdmin(admin.ModelAdmin):
     list_display = ("pk", "name", "building",)
     search_fields = ("name",)
@@ -18,6 +34,16 @@ class RoomAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("pk", "name", "status", "attempts", "run_at",
+                    "created")
+    list_filter = ("status", "name",)
+    empty_value_display = "-пусто-"
+
+
 admin.site.register(Reservation, ReserveAdmin)
+admin.site.register(ReservationArchive, ArchiveAdmin)
+admin.site.register(ReservationSeries, SeriesAdmin)
 admin.site.register(Room, RoomAdmin)
 admin.site.register(Building)
+admin.site.register(Job, JobAdmin)
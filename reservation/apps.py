@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ReservationConfig(AppConfig):
     name = 'reservation'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,75 @@
+import datetime
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .conflicts import lock_writes
+from .models import Reservation, ReservationArchive
+from .versions import rooms_changed
+
+# Колонки, переносимые в архив без изменений
+ARCHIVE_COLUMNS = ('id', 'room_id', 'author_id', 'series_id',
+                   'datetime_from', 'datetime_to', 'created')
+
+# Включается на время переноса: сигналы не обрабатывают удаление каждой
+# перенесённой брони, помещения порции отмечаются изменившимися один раз
+archiving = ContextVar('reservation_archiving', default=False)
+
+
+def archive_horizon():
+    """
+    Граница архива: все архивные брони начинаются раньше неё, поэтому
+    запросы, не заходящие за границу, читают только таблицу Reservation.
+    """
+    return timezone.now() - datetime.timedelta(
+        days=settings.RESERVATION_ARCHIVE_AFTER_DAYS)
+
+
+def archive_batches(cutoff, batch_size):
+    """
+    Переносит брони, закончившиеся не позже cutoff, в ReservationArchive
+    порциями по batch_size в отдельных транзакциях и после каждой порции
+    возвращает число перенесённых броней.
+    """
+    while True:
+        with transaction.atomic():
+            token = archiving.set(True)
+            try:
+                lock_writes()
+                rows = list(Reservation.objects.select_for_update().filter(
+                    datetime_to__lte=cutoff
+                ).order_by('pk').values(*ARCHIVE_COLUMNS)[:batch_size])
+                if not rows:
+                    return
+                ReservationArchive.objects.bulk_create(
+                    ReservationArchive(**row) for row in rows)
+                # Удаляются ровно скопированные брони: бронь, перенесённая
+                # в прошлое после выборки, в порцию не попала
+                Reservation.objects.filter(
+                    pk__in=[row['id'] for row in rows]).delete()
+                # Прошедшие брони не влияют на занятость, но исчезают из
+                # ответов API, которые кэшируются по версии помещения
+                rooms_changed({row['room_id'] for row in rows})
+            finally:
+                archiving.reset(token)
+        yield len(rows)
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+    ).values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def with_reservation_count(users):
+    """
+    Добавляет пользователям reservation_count - число их броней вместе с
+    архивом, - вычисляемое тем же запросом.
+    """
+    return users.annotate(
+        reservation_count=count_subquery(Reservation, 'author')
+        + count_subquery(ReservationArchive, 'author'))
@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import functools
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param
+
+from .authentication import CachedTokenAuthentication
+from .caching import (CACHE_KEY_PREFIX, make_etag, not_modified,
+                      set_validators)
+from .fast_serializers import (reservation_records, reservation_values,
+                               room_records)
+from .models import Room
+from .pagination import KeysetPagination
+from .serializers import ReservationSerializer
+from .throttling import check_booking_throttles
+from .versions import room_scope, scope_state
+from .views import available_room_rows, save_booking
+
+# Наибольшее время ожидания изменений в long-poll запросе, в секундах
+MAX_WAIT = 60
+# Как часто ожидающий запрос сверяет версию изменений, в секундах
+POLL_INTERVAL = 1
+WAIT_QUERY_PARAM = 'wait'
+
+# ORM Django синхронный, поэтому запросы к базе выполняются в отдельном
+# ограниченном пуле потоков. Число одновременных соединений с базой не
+# превышает размера пула, сколько бы клиентов ни ждали ответа
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.RESERVATION_ASYNC_DB_THREADS,
+    thread_name_prefix='reservation-db',
+)
+
+
+def in_db_thread(func, *args):
+    # Как между запросами в синхронных обработчиках: повторное
+    # использование соединения потока определяет CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args):
+    """
+    Выполняет синхронную работу с базой в пуле потоков. Переменные
+    контекста, например замеры запроса, переходят в поток пула.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db_executor, functools.partial(contextvars.copy_context().run,
+                                       in_db_thread, func, *args))
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json')
+
+
+def problem(error):
+    """Ответ с ошибкой API в том же виде, что у представлений DRF."""
+    detail = error.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {'detail': detail}
+    response = render(detail, error.status_code)
+    if getattr(error, 'wait', None):
+        response['Retry-After'] = '%d' % error.wait
+    if isinstance(error, exceptions.NotAuthenticated):
+        response['WWW-Authenticate'] = (
+            CachedTokenAuthentication().authenticate_header(None))
+    return response
+
+
+def authenticate(request):
+    credentials = CachedTokenAuthentication().authenticate(Request(request))
+    if credentials is None:
+        raise exceptions.NotAuthenticated()
+    return credentials[0]
+
+
+def api_view(*methods):
+    """
+    Асинхронное представление API: проверяет метод запроса и токен
+    пользователя так же, как ReservationViewSet и RoomViewSet.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return problem(exceptions.MethodNotAllowed(request.method))
+            try:
+                request.user = await run_db(authenticate, request)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as error:
+                return problem(error)
+
+        # csrf_exempt оборачивает представление синхронной функцией
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@api_view('GET')
+async def rooms(request):
+    """
+    Асинхронный вариант списка помещений RoomViewSet.list:
+    datetime_from и datetime_to отбирают свободные в промежутке помещения,
+    building - помещения здания, limit и offset задают страницу.
+    """
+    def page():
+        query = Request(request)
+        try:
+            rows = available_room_rows(query.query_params)
+        except ValueError:
+            raise exceptions.ParseError()
+        paginator = LimitOffsetPagination()
+        page = paginator.paginate_queryset(rows, query)
+        if page is None:
+            return room_records(rows)
+        return paginator.get_paginated_response(room_records(page)).data
+
+    return render(await run_db(page))
+
+
+@api_view('GET')
+async def room_reservations(request, pk):
+    """
+    Асинхронный вариант RoomViewSet.retrieve: брони помещения постранично.
+    С заголовком If-None-Match и параметром wait=<секунды> работает как
+    long-poll: ответ 304 приходит, только если за это время брони
+    помещения не изменились. Ожидающий запрос не занимает поток.
+    """
+    try:
+        wait = float(request.GET.get(WAIT_QUERY_PARAM, 0))
+    except ValueError:
+        raise exceptions.ParseError()
+    # С nan любое сравнение ложно, и срок ожидания не наступил бы
+    if not math.isfinite(wait):
+        raise exceptions.ParseError()
+    wait = min(max(wait, 0), MAX_WAIT)
+    scope = room_scope(pk)
+    # Ожидание не меняет ответ, поэтому не входит в ETag
+    url = remove_query_param(request.build_absolute_uri(), WAIT_QUERY_PARAM)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        version, updated = await run_db(scope_state, scope)
+        etag = make_etag(scope, version, url, JSONRenderer.media_type)
+        if not not_modified(request, etag, updated):
+            break
+        if loop.time() >= deadline:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        await asyncio.sleep(min(POLL_INTERVAL, deadline - loop.time()))
+
+    def page():
+        key = CACHE_KEY_PREFIX + etag
+        data = cache.get(key)
+        if data is None:
+            if not Room.objects.filter(pk=pk).exists():
+                raise exceptions.NotFound()
+            paginator = KeysetPagination()
+            records = reservation_records(paginator.paginate_queryset(
+                reservation_values(Room(pk=pk).reservation.all()),
+                Request(request)))
+            data = paginator.get_paginated_response(records).data
+            cache.set(key, data, settings.RESERVATION_RESPONSE_CACHE_TIMEOUT)
+        return data
+
+    response = render(await run_db(page))
+    set_validators(response, etag, updated)
+    return response
+
+
+@api_view('POST')
+async def create_reservation(request):
+    """
+    Асинхронный вариант создания брони: те же поля и ответы, что у
+    POST /api/v1/reservations/, включая 409 при пересечении.
+    """
+    def create():
+        query = Request(request,
+                        parsers=[JSONParser(), FormParser(), MultiPartParser()])
+        query.user = request.user
+        check_booking_throttles(query)
+        serializer = ReservationSerializer(data=query.data)
+        serializer.is_valid(raise_exception=True)
+        save_booking(serializer, author=request.user)
+        return serializer.data
+
+    return render(await run_db(create), status.HTTP_201_CREATED)
@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .versions import TOKEN_SCOPE, bump_scope, scope_state
+
+
+class TokenCache:
+    """
+    Кэш проверенных токенов в памяти процесса: не больше size записей,
+    давно не использованные вытесняются первыми, запись живёт timeout
+    секунд и действует только в своём поколении.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, entry_generation, credentials = entry
+            if expires < time.monotonic() or entry_generation != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return credentials
+
+    def set(self, key, generation, credentials):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout,
+                                  generation, credentials)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key=None, user_id=None):
+        with self._lock:
+            for cached_key, (_, _, (user, _)) in list(self._entries.items()):
+                if cached_key == key or user.pk == user_id:
+                    del self._entries[cached_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.RESERVATION_TOKEN_CACHE_SIZE,
+                         settings.RESERVATION_TOKEN_CACHE_TIMEOUT)
+
+
+def generation():
+    """
+    Поколение кэша токенов из таблицы версий: увеличивается при удалении
+    токена или изменении пользователя и сбрасывает кэши всех процессов.
+    Один запрос по уникальному ключу вместо чтения токена с пользователем.
+    """
+    return scope_state(TOKEN_SCOPE)[0]
+
+
+def invalidate_tokens(key=None, user_id=None):
+    """
+    Убирает из кэша токен key или все токены пользователя user_id.
+    Другие процессы сбрасывают свои кэши по новому поколению, которое
+    появляется после фиксации изменения: прочитанное до неё в кэше
+    не задержится.
+    """
+    token_cache.evict(key, user_id)
+    transaction.on_commit(lambda: bump_scope(TOKEN_SCOPE))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, которая для недавно проверенных токенов читает
+    из базы только поколение кэша. Отозванный токен или деактивированный
+    пользователь перестают действовать во всех процессах сразу после
+    фиксации изменения.
+    """
+
+    def authenticate_credentials(self, key):
+        current = generation()
+        credentials = token_cache.get(key, current)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, current, credentials)
+        user, token = credentials
+        # Пользователь из кэша общий для запросов, и изменения его полей в
+        # одном запросе не должны быть видны в другом
+        return copy.copy(user), token
@@ -0,0 +1,79 @@
+import datetime
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .conflicts import overlapping, series_occurrences
+from .models import Reservation, ReservationSeries, Room
+
+
+def parse_datetime(value):
+    """
+    Разбирает время в формате ISO. Время без часового пояса считается
+    заданным в часовом поясе проекта.
+    """
+    value = datetime.datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_window(query_params):
+    """
+    Возвращает пару (datetime_from, datetime_to) из параметров запроса.
+    Отсутствующие границы возвращаются как None. Бросает ValueError при
+    неверном формате или перепутанных границах.
+    """
+    datetime_from = query_params.get('datetime_from', None)
+    if datetime_from:
+        datetime_from = parse_datetime(datetime_from)
+    datetime_to = query_params.get('datetime_to', None)
+    if datetime_to:
+        datetime_to = parse_datetime(datetime_to)
+    if datetime_from and datetime_to and datetime_to <= datetime_from:
+        raise ValueError('Перепутаны местами начало и конец периода')
+    return datetime_from or None, datetime_to or None
+
+
+def free_rooms(datetime_from, datetime_to, queryset=None):
+    """
+    Возвращает помещения, свободные на всём интервале
+    [datetime_from, datetime_to). Занятость бронями проверяется одним
+    подзапросом NOT EXISTS по индексу (room, datetime_to, datetime_from),
+    так что идентификаторы занятых помещений в память не выгружаются.
+    Исключаются только помещения, где в окно попадает вхождение серии.
+    """
+    if queryset is None:
+        queryset = Room.objects.all()
+    busy = overlapping(Reservation.objects.filter(room=OuterRef('pk')),
+                       datetime_from, datetime_to)
+    queryset = queryset.filter(~Exists(busy))
+    series_rooms = {
+        occurrence.series.room_id for occurrence in series_occurrences(
+            ReservationSeries.objects.all(), datetime_from, datetime_to)
+    }
+    if series_rooms:
+        queryset = queryset.exclude(pk__in=series_rooms)
+    return queryset
+
+
+def busy_intervals(window_from, window_to, room_ids=None):
+    """
+    Занятые интервалы помещений в окне с учётом вхождений серий:
+    словарь {id помещения: [(начало, конец), ...]} без сортировки.
+    """
+    reservations = Reservation.objects.all()
+    series = ReservationSeries.objects.all()
+    if room_ids is not None:
+        reservations = reservations.filter(room_id__in=room_ids)
+        series = series.filter(room_id__in=room_ids)
+    intervals = defaultdict(list)
+    rows = overlapping(reservations, window_from, window_to).values_list(
+        'room_id', 'datetime_from', 'datetime_to')
+    for room_id, datetime_from, datetime_to in rows:
+        intervals[room_id].append((datetime_from, datetime_to))
+    for occurrence in series_occurrences(series, window_from, window_to):
+        intervals[occurrence.series.room_id].append(
+            (occurrence.datetime_from, occurrence.datetime_to))
+    return intervals
@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versions import scope_state
+
+CACHE_KEY_PREFIX = 'reservation:response:'
+
+
+def make_etag(scope, version, url, media_type):
+    """
+    ETag ответа: область и её версия плюс отпечаток адреса и формата,
+    так что разные страницы и фильтры получают разные метки.
+    """
+    fingerprint = hashlib.md5(f'{url}|{media_type}'.encode()).hexdigest()
+    return quote_etag(f'{scope}-{version}-{fingerprint}')
+
+
+def modified_stamp(updated):
+    """
+    Время изменения для Last-Modified и If-Modified-Since: в HTTP они с
+    точностью до секунды, поэтому время округляется вверх, до конца
+    секунды изменения.
+    """
+    return int(updated.timestamp()) + 1
+
+
+def not_modified(request, etag, updated):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in {tag.strip() for tag in if_none_match.split(',')} \
+            or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (if_modified_since is not None and updated is not None
+            and modified_stamp(updated) <= if_modified_since)
+
+
+def set_validators(response, etag, updated):
+    """
+    Заголовки условного GET. Last-Modified отдаётся, только когда секунда
+    изменения закончилась: следующее изменение в ту же секунду было бы
+    неотличимо по нему, и клиент получил бы устаревший 304.
+    """
+    response['ETag'] = etag
+    if updated is not None and modified_stamp(updated) <= time.time():
+        response['Last-Modified'] = http_date(modified_stamp(updated))
+    # Клиент может хранить ответ, но должен сверять его по ETag
+    response['Cache-Control'] = 'private, no-cache'
+
+
+def conditional_response(request, scope, build):
+    """
+    Отвечает на GET с учётом версии изменений области scope.
+    Если у клиента актуальная версия, возвращает 304, не обращаясь к
+    таблице броней. Иначе берёт данные из кэша ответов или строит их
+    функцией build и кэширует. Устаревшие записи кэша недостижимы, так как
+    версия входит в ключ.
+    """
+    version, updated = scope_state(scope)
+    etag = make_etag(scope, version, request.build_absolute_uri(),
+                     request.accepted_media_type)
+    if not_modified(request, etag, updated):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        key = CACHE_KEY_PREFIX + etag
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = build()
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data,
+                          settings.RESERVATION_RESPONSE_CACHE_TIMEOUT)
+    set_validators(response, etag, updated)
+    return response
@@ -0,0 +1,290 @@
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+FORMAT_ERROR = 'Формат не соответствует ISO'
+INCORRECT_INTERVAL_ERROR = ('Некорректный промежуток бронирования. '
+                            'Время окончания раньше времени начала')
+FROM_INTERSECTS_ERROR = ('Выбранное время занято. '
+                         'Выберите более позднее время '
+                         'для начала бронирования.')
+TO_INTERSECTS_ERROR = ('Выбранное время занято. '
+                       'Выберите более раннее время '
+                       'для окончания бронирования.')
+INCLUDES_INTERVAL_ERROR = 'Выбранное время занято.'
+SERIES_CONFLICT_ERROR = ('Вхождение серии {:%d.%m.%Y %H:%M} пересекается '
+                         'с занятым временем.')
+
+
+def overlapping(queryset, datetime_from, datetime_to):
+    """
+    Отбирает брони, пересекающиеся с полуоткрытым интервалом
+    [datetime_from, datetime_to). Стыкующиеся брони пересечением не считаются.
+    """
+    return queryset.filter(datetime_from__lt=datetime_to,
+                           datetime_to__gt=datetime_from)
+
+
+def series_occurrences(queryset, window_from, window_to):
+    """
+    Вхождения серий из queryset, пересекающиеся с окном. Серии выбираются
+    одним запросом, вхождения разворачиваются только внутри окна.
+    """
+    queryset = queryset.filter(datetime_from__lt=window_to,
+                               until__gt=window_from)
+    for series in queryset:
+        yield from series.occurrences(window_from, window_to)
+
+
+def find_conflict(room_id, datetime_from, datetime_to, exclude_pk=None):
+    """
+    Возвращает самую раннюю бронь или вхождение серии помещения,
+    пересекающиеся с интервалом, или None. Брони проверяются одним
+    запросом, серии - ещё одним, только если среди броней пересечений нет.
+    Архив проверяется только для интервалов, начинающихся до его границы.
+    """
+    from .archive import archive_horizon
+    from .models import Reservation, ReservationArchive, ReservationSeries
+
+    models = [Reservation]
+    if datetime_from < archive_horizon():
+        models.append(ReservationArchive)
+    for model in models:
+        queryset = overlapping(model.objects.filter(room_id=room_id),
+                               datetime_from, datetime_to)
+        if exclude_pk is not None:
+            queryset = queryset.exclude(pk=exclude_pk)
+        conflict = queryset.order_by('datetime_from').only(
+            'pk', 'datetime_from', 'datetime_to').first()
+        if conflict is not None:
+            return conflict
+    return next(series_occurrences(
+        ReservationSeries.objects.filter(room_id=room_id),
+        datetime_from, datetime_to), None)
+
+
+def find_series_conflict(series):
+    """
+    Возвращает первое вхождение серии, пересекающееся с бронями или
+    другими сериями того же помещения, или None.
+    """
+    from .archive import archive_horizon
+    from .models import Reservation, ReservationArchive, ReservationSeries
+
+    occurrences = list(series.occurrences())
+    if not occurrences:
+        return None
+    window_from = occurrences[0].datetime_from
+    window_to = occurrences[-1].datetime_to
+    models = [Reservation]
+    if window_from < archive_horizon():
+        models.append(ReservationArchive)
+    taken = []
+    for model in models:
+        taken.extend(overlapping(
+            model.objects.filter(room_id=series.room_id),
+            window_from, window_to
+        ).values_list('datetime_from', 'datetime_to'))
+    others = ReservationSeries.objects.filter(room_id=series.room_id)
+    if series.pk is not None:
+        others = others.exclude(pk=series.pk)
+    taken.extend((occurrence.datetime_from, occurrence.datetime_to)
+                 for occurrence in series_occurrences(others, window_from,
+                                                      window_to))
+    taken.sort()
+    for occurrence in occurrences:
+        position = bisect_left(taken, (occurrence.datetime_to,))
+        if position and taken[position - 1][1] > occurrence.datetime_from:
+            return occurrence
+    return None
+
+
+def conflict_errors(conflict, datetime_from, datetime_to):
+    """
+    Определяет, какая граница нового интервала попала в занятое время,
+    и возвращает словарь ошибок по полям.
+    """
+    if conflict.datetime_from <= datetime_from < conflict.datetime_to:
+        return {'datetime_from': FROM_INTERSECTS_ERROR}
+    if conflict.datetime_from < datetime_to <= conflict.datetime_to:
+        return {'datetime_to': TO_INTERSECTS_ERROR}
+    return {'datetime_to': INCLUDES_INTERVAL_ERROR}
+
+
+def series_conflict_errors(occurrence):
+    return {'datetime_from': [SERIES_CONFLICT_ERROR.format(
+        occurrence.datetime_from)]}
+
+
+def check_interval(datetime_from, datetime_to):
+    if not datetime_from:
+        raise ValidationError({'datetime_from': FORMAT_ERROR})
+    if not datetime_to:
+        raise ValidationError({'datetime_to': FORMAT_ERROR})
+    if datetime_to <= datetime_from:
+        raise ValidationError({'datetime_to': INCORRECT_INTERVAL_ERROR,
+                               'datetime_from': INCORRECT_INTERVAL_ERROR})
+
+
+def check_reservation(room_id, datetime_from, datetime_to, exclude_pk=None):
+    """
+    Общая проверка брони для модели, формы, админки и API.
+    Бросает ValidationError с ошибками по полям.
+    """
+    check_interval(datetime_from, datetime_to)
+    if room_id is None:
+        return
+    conflict = find_conflict(room_id, datetime_from, datetime_to, exclude_pk)
+    if conflict is not None:
+        raise ValidationError(
+            conflict_errors(conflict, datetime_from, datetime_to))
+
+
+class ReservationConflict(ValidationError):
+    """Пересечение, обнаруженное под блокировкой помещения."""
+
+
+# Блокировки помещений внутри процесса. Нужны бэкендам без SELECT ... FOR
+# UPDATE (SQLite), чтобы потоки одного процесса не ждали друг друга на
+# блокировке всей базы
+_room_locks = defaultdict(threading.Lock)
+_room_locks_guard = threading.Lock()
+
+
+def _process_lock(room_id):
+    with _room_locks_guard:
+        return _room_locks[room_id]
+
+
+def lock_rooms(room_ids):
+    """
+    Блокирует строки помещений до конца текущей транзакции.
+    На SQLite вместо SELECT ... FOR UPDATE выполняется пустое обновление,
+    которое сразу захватывает блокировку записи и упорядочивает писателей
+    из разных процессов.
+    """
+    from .models import Room
+
+    rooms = Room.objects.filter(pk__in=room_ids)
+    if connection.features.has_select_for_update:
+        list(rooms.select_for_update().order_by('pk')
+             .values_list('pk', flat=True))
+    else:
+        rooms.update(slug=F('slug'))
+
+
+def lock_writes():
+    """
+    На SQLite сразу захватывает блокировку записи текущей транзакции
+    пустым обновлением. Транзакция, которая сначала читает, а потом
+    пишет, получила бы "database is locked", если между чтением и записью
+    пишет другое соединение, например фоновая задача.
+    """
+    from .models import Room
+
+    if not connection.features.has_select_for_update:
+        Room.objects.filter(pk__isnull=True).update(slug=F('slug'))
+
+
+@contextmanager
+def locked_rooms(room_ids):
+    """
+    Транзакция, в которой помещения заблокированы для бронирования.
+    Блокировки берутся в порядке id, чтобы параллельные пакетные
+    бронирования не попадали во взаимную блокировку.
+    """
+    room_ids = sorted(set(room_ids))
+    process_locks = []
+    if not connection.features.has_select_for_update:
+        process_locks = [_process_lock(room_id) for room_id in room_ids]
+    for process_lock in process_locks:
+        process_lock.acquire()
+    try:
+        with transaction.atomic():
+            lock_rooms(room_ids)
+            yield
+    finally:
+        for process_lock in reversed(process_locks):
+            process_lock.release()
+
+
+@contextmanager
+def booking(room_id, datetime_from, datetime_to, exclude_pk=None):
+    """
+    Атомарная секция бронирования: блокирует помещение, повторно проверяет
+    пересечения и даёт сохранить бронь в той же транзакции.
+    Бросает ReservationConflict, если время уже занято.
+    """
+    check_interval(datetime_from, datetime_to)
+    with locked_rooms([room_id]):
+        conflict = find_conflict(room_id, datetime_from, datetime_to,
+                                 exclude_pk)
+        if conflict is not None:
+            raise ReservationConflict(
+                conflict_errors(conflict, datetime_from, datetime_to))
+        yield
+
+
+def find_batch_conflicts(items):
+    """
+    Проверяет пакет броней items - список (room_id, datetime_from,
+    datetime_to) - против базы и друг против друга.
+    Возвращает словарь {номер брони в пакете: конфликт}, где конфликт -
+    ('reservation', id брони в базе), ('series', id серии) или
+    ('item', номер более ранней брони пакета). Брони и серии из базы
+    выбираются двумя запросами; архивные брони, как и в find_conflict,
+    ещё одним, только если пакет начинается до границы архива.
+    """
+    from .archive import archive_horizon
+    from .models import Reservation, ReservationArchive, ReservationSeries
+
+    spans = {}
+    for room_id, datetime_from, datetime_to in items:
+        low, high = spans.get(room_id, (datetime_from, datetime_to))
+        spans[room_id] = (min(low, datetime_from), max(high, datetime_to))
+    if not spans:
+        return {}
+    query = Q()
+    for room_id, (low, high) in spans.items():
+        query |= Q(room_id=room_id, datetime_from__lt=high,
+                   datetime_to__gt=low)
+    models = [Reservation]
+    if min(low for low, _ in spans.values()) < archive_horizon():
+        models.append(ReservationArchive)
+    taken = defaultdict(list)
+    for model in models:
+        rows = model.objects.filter(query).order_by().values_list(
+            'room_id', 'datetime_from', 'datetime_to', 'pk')
+        for room_id, datetime_from, datetime_to, pk in rows:
+            taken[room_id].append((datetime_from, datetime_to,
+                                   ('reservation', pk)))
+    for intervals in taken.values():
+        intervals.sort()
+    series_query = Q()
+    for room_id, (low, high) in spans.items():
+        series_query |= Q(room_id=room_id, datetime_from__lt=high,
+                          until__gt=low)
+    for series in ReservationSeries.objects.filter(series_query):
+        low, high = spans[series.room_id]
+        for occurrence in series.occurrences(low, high):
+            insort(taken[series.room_id],
+                   (occurrence.datetime_from, occurrence.datetime_to,
+                    ('series', series.pk)))
+
+    conflicts = {}
+    for index, (room_id, datetime_from, datetime_to) in enumerate(items):
+        intervals = taken[room_id]
+        # Занятые интервалы помещения не пересекаются и отсортированы,
+        # поэтому пересечься может только последний, начавшийся раньше
+        # окончания новой брони
+        position = bisect_left(intervals, (datetime_to,))
+        if position and intervals[position - 1][1] > datetime_from:
+            conflicts[index] = intervals[position - 1][2]
+        else:
+            insort(intervals, (datetime_from, datetime_to, ('item', index)))
+    return conflicts
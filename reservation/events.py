@@ -0,0 +1,230 @@
+import asyncio
+import datetime
+import heapq
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .async_views import run_db
+from .availability import busy_intervals
+from .fast_serializers import datetime_formatter
+from .models import Room
+from .versions import changed_rooms, current_version
+
+logger = logging.getLogger(__name__)
+
+# Насколько вперёд ищется ближайшая бронь помещения
+HORIZON = datetime.timedelta(days=7)
+
+RoomState = namedtuple('RoomState', 'room building current next')
+
+
+def room_states(rooms=None, buildings=None):
+    """
+    Текущая занятость помещений: идущий сейчас и ближайший интервал брони.
+    Без фильтров возвращает состояние всех помещений.
+    """
+    queryset = Room.objects.all()
+    if rooms is not None or buildings is not None:
+        queryset = queryset.filter(Q(pk__in=rooms or ())
+                                   | Q(building__in=buildings or ()))
+    room_buildings = dict(queryset.values_list('pk', 'building_id'))
+    now = timezone.now()
+    busy = busy_intervals(now, now + HORIZON, list(room_buildings))
+    states = []
+    for room, building in room_buildings.items():
+        intervals = sorted(busy.get(room, ()))
+        current = next((interval for interval in intervals
+                        if interval[0] <= now), None)
+        upcoming = next((interval for interval in intervals
+                         if interval[0] > now), None)
+        states.append(RoomState(room, building, current, upcoming))
+    return states
+
+
+def state_records(states):
+    to_representation = datetime_formatter()
+
+    def interval(value):
+        if value is None:
+            return None
+        return {'datetime_from': to_representation(value[0]),
+                'datetime_to': to_representation(value[1])}
+
+    return [{'room': state.room, 'building': state.building,
+             'busy': state.current is not None,
+             'current': interval(state.current),
+             'next': interval(state.next)} for state in states]
+
+
+class Subscription:
+    """
+    Подписка на помещения и здания. Изменения, пришедшие, пока клиент
+    не забрал предыдущие, сливаются: от помещения остаётся последнее
+    состояние, и медленный клиент не копит очередь.
+    """
+
+    def __init__(self, rooms=None, buildings=None):
+        self.rooms = rooms
+        self.buildings = buildings
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def wants(self, state):
+        if self.rooms is None and self.buildings is None:
+            return True
+        return (state.room in (self.rooms or ())
+                or state.building in (self.buildings or ()))
+
+    def deliver(self, states):
+        for state in states:
+            if self.wants(state):
+                self.pending[state.room] = state
+        if self.pending:
+            self.ready.set()
+
+    async def changes(self, timeout=None):
+        """Накопленные изменения или пустой список по таймауту."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        states, self.pending = list(self.pending.values()), {}
+        return states
+
+
+class Broker:
+    """
+    Рассылает подписчикам изменения занятости помещений не чаще раза за
+    такт: все изменения помещения за такт дают одно событие, а состояние
+    изменившихся помещений читается одним запросом на всех подписчиков.
+    Помещения попадают в рассылку и тогда, когда текущая бронь
+    заканчивается или начинается следующая.
+    Работает в цикле событий ASGI-процесса; источник изменений задают
+    подклассы методом collect.
+    """
+
+    def __init__(self, tick=1):
+        self.tick = tick
+        self.subscribers = set()
+        self.loop = None
+        self._task = None
+        self._transitions = []
+        self._next_transition = {}
+
+    def publish(self, rooms):
+        """Сообщает об изменении помещений; можно вызывать из любого потока."""
+
+    async def collect(self):
+        """Множество помещений, изменившихся с прошлого такта."""
+        raise NotImplementedError
+
+    def subscribe(self, rooms=None, buildings=None):
+        subscription = Subscription(rooms, buildings)
+        self.subscribers.add(subscription)
+        if self._task is None:
+            self.loop = asyncio.get_running_loop()
+            self._task = self.loop.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def track(self, states):
+        """Запоминает, когда состояние помещений изменится само по себе."""
+        for state in states:
+            if state.current is not None:
+                moment = state.current[1]
+            elif state.next is not None:
+                moment = state.next[0]
+            else:
+                self._next_transition.pop(state.room, None)
+                continue
+            self._next_transition[state.room] = moment
+            heapq.heappush(self._transitions, (moment, state.room))
+
+    def _due_transitions(self):
+        now = timezone.now()
+        rooms = set()
+        while self._transitions and self._transitions[0][0] <= now:
+            moment, room = heapq.heappop(self._transitions)
+            if self._next_transition.get(room) == moment:
+                del self._next_transition[room]
+                rooms.add(room)
+        return rooms
+
+    async def _run(self):
+        try:
+            await self.collect()
+            while self.subscribers:
+                await asyncio.sleep(self.tick)
+                try:
+                    await self._broadcast()
+                except Exception:
+                    # Сбой базы в одном такте не останавливает рассылку
+                    logger.exception('Ошибка рассылки занятости помещений')
+
+        finally:
+            self._task = None
+            self._transitions.clear()
+            self._next_transition.clear()
+
+    async def _broadcast(self):
+        rooms = await self.collect() | self._due_transitions()
+        if not rooms or not self.subscribers:
+            return
+        states = await run_db(room_states, rooms)
+        self.track(states)
+        for subscription in self.subscribers:
+            subscription.deliver(states)
+
+
+class InMemoryBroker(Broker):
+    """
+    Брокер в памяти процесса: изменения приходят из сигналов моделей
+    того же процесса. Подходит, когда API и поток событий обслуживает один
+    ASGI-процесс.
+    """
+
+    def __init__(self, tick=1):
+        super().__init__(tick)
+        self._changed = set()
+
+    def publish(self, rooms):
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._changed.update, set(rooms))
+
+    async def collect(self):
+        rooms, self._changed = self._changed, set()
+        return rooms
+
+
+class VersionBroker(Broker):
+    """
+    Брокер поверх таблицы версий изменений: раз в такт сверяет глобальную
+    версию и видит брони, сделанные любым процессом, в том числе
+    WSGI-процессами API.
+    """
+
+    def __init__(self, tick=1):
+        super().__init__(tick)
+        self._version = None
+
+    async def collect(self):
+        version = await run_db(current_version)
+        if self._version is None or version == self._version:
+            rooms = set()
+        else:
+            rooms = await run_db(changed_rooms, self._version)
+        self._version = version
+        return rooms
+
+
+broker = import_string(settings.RESERVATION_EVENTS_BROKER)(
+    tick=settings.RESERVATION_EVENTS_TICK)
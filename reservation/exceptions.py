@@ -0,0 +1,8 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class ReservationConflictError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Выбранное время занято.'
+    default_code = 'conflict'
@@ -0,0 +1,45 @@
+import heapq
+import json
+from operator import itemgetter
+
+from django.conf import settings
+
+from .fast_serializers import (datetime_formatter, reservation_record,
+                               reservation_values)
+
+
+def export_rows(*querysets):
+    """
+    Перебирает брони записями API порциями по
+    RESERVATION_EXPORT_CHUNK_SIZE, не загружая выборку в память целиком.
+    Брони нескольких выборок (например, живые и архивные) идут общим
+    порядком по id.
+    """
+    rows = heapq.merge(*(
+        reservation_values(queryset.order_by('pk')).iterator(
+            chunk_size=settings.RESERVATION_EXPORT_CHUNK_SIZE)
+        for queryset in querysets), key=itemgetter('id'))
+    to_representation = datetime_formatter()
+    for row in rows:
+        yield reservation_record(row, to_representation)
+
+
+def stream_ndjson(records):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) == settings.RESERVATION_EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_json(records):
+    """JSON-массив, собираемый по частям."""
+    yield '['
+    separator = ''
+    for chunk in stream_ndjson(records):
+        yield separator + ','.join(chunk.splitlines())
+        separator = ','
+    yield ']'
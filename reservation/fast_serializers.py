@@ -0,0 +1,94 @@
+"""
+Сериализация для чтения в обход ModelSerializer: записи строятся прямо из
+словарей values() с тем же JSON, что дают ReservationSerializer и
+RoomSerializer, без разбора полей модели и запроса автора на каждую бронь.
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Колонки values() и соответствующие им поля сериализаторов, в порядке полей
+RESERVATION_COLUMNS = ('id', 'author__username', 'datetime_from',
+                       'datetime_to', 'created', 'room_id', 'series_id')
+RESERVATION_FIELDS = ('id', 'author', 'datetime_from', 'datetime_to',
+                      'created', 'room', 'series')
+ROOM_COLUMNS = ('id', 'name', 'slug', 'description', 'building_id',
+                'current_reservation_id', 'busy_until',
+                'next_reservation_start')
+ROOM_FIELDS = ('id', 'name', 'slug', 'description', 'building',
+               'current_reservation', 'busy_until', 'next_reservation_start')
+
+# Форматирует время так же, как поля ModelSerializer
+datetime_field = serializers.DateTimeField()
+
+
+def datetime_formatter():
+    """
+    Возвращает функцию форматирования времени, совпадающую с
+    DateTimeField.to_representation. Для формата ISO 8601 часовой пояс
+    определяется один раз на список, а не для каждого значения.
+    """
+    output_format = api_settings.DATETIME_FORMAT
+    if not settings.USE_TZ or output_format is None \
+            or output_format.lower() != ISO_8601:
+        return datetime_field.to_representation
+    current_timezone = timezone.get_current_timezone()
+
+    def to_representation(value):
+        value = value.astimezone(current_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return to_representation
+
+
+def reservation_values(queryset):
+    return queryset.values(*RESERVATION_COLUMNS)
+
+
+def room_values(queryset):
+    return queryset.values(*ROOM_COLUMNS)
+
+
+def reservation_record(row, to_representation=None):
+    to_representation = to_representation or datetime_formatter()
+    return {
+        'id': row['id'],
+        'author': row['author__username'],
+        'datetime_from': to_representation(row['datetime_from']),
+        'datetime_to': to_representation(row['datetime_to']),
+        'created': to_representation(row['created']),
+        'room': row['room_id'],
+        'series': row['series_id'],
+    }
+
+
+def room_record(row, to_representation=None):
+    to_representation = to_representation or datetime_formatter()
+    # У большинства помещений состояния нет: None не форматируется
+    busy_until = row['busy_until']
+    next_start = row['next_reservation_start']
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'slug': row['slug'],
+        'description': row['description'],
+        'building': row['building_id'],
+        'current_reservation': row['current_reservation_id'],
+        'busy_until': (None if busy_until is None
+                       else to_representation(busy_until)),
+        'next_reservation_start': (None if next_start is None
+                                   else to_representation(next_start)),
+    }
+
+
+def reservation_records(rows):
+    to_representation = datetime_formatter()
+    return [reservation_record(row, to_representation) for row in rows]
+
+
+def room_records(rows):
+    to_representation = datetime_formatter()
+    return [room_record(row, to_representation) for row in rows]
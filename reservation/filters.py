@@ -31,4 +31,11 @@ class RoomFilterBackend(FilterSet):
                 description='Выбирает время начала выборки. Строка в формате ISO',
                 example='2021-01-20 00:00:00',
             ),
+            coreapi.Field(
+                name='building',
+                location='query',
+                required=False,
+                type='integer',
+                description='Выбирает рабочие места одного здания по id',
+            ),
         ]
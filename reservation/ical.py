@@ -0,0 +1,164 @@
+"""
+Календари броней в формате iCalendar (RFC 5545) для подписки из Outlook
+и Google Calendar. Лента содержит только брони окна от
+RESERVATION_ICAL_PAST_DAYS дней назад до RESERVATION_ICAL_FUTURE_DAYS
+дней вперёд, без архива и вхождений серий. Клиенты опрашивают ленты
+часто, поэтому:
+- ответ сверяется с версией изменений, и актуальный клиент получает 304
+  за один запрос к базе;
+- собранная лента кэшируется по той же версии;
+- при сборке фрагменты VEVENT берутся из кэша по броням и заново
+  отрисовываются только для новых и изменившихся броней.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+
+from .caching import (CACHE_KEY_PREFIX, make_etag, not_modified,
+                      set_validators)
+from .versions import scope_state
+
+CONTENT_TYPE = 'text/calendar; charset=utf-8'
+FRAGMENT_KEY_PREFIX = 'reservation:vevent:'
+UID_DOMAIN = 'api-booking'
+# Колонки values() для фрагмента: всё, что в него попадает
+EVENT_COLUMNS = ('id', 'datetime_from', 'datetime_to', 'created',
+                 'room__name', 'room__building__name', 'author__username')
+
+
+def feed_window(now=None):
+    """
+    Окно ленты, выровненное по началу суток, чтобы лента и её ETag
+    менялись от хода времени не чаще раза в сутки.
+    """
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0,
+                                            microsecond=0)
+    past = datetime.timedelta(days=settings.RESERVATION_ICAL_PAST_DAYS)
+    future = datetime.timedelta(days=settings.RESERVATION_ICAL_FUTURE_DAYS)
+    return today - past, today + future
+
+
+def escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Переносит строку длиннее 75 байт, как требует RFC 5545."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        size = min(len(encoded), 75 if not parts else 74)
+        # Перенос не должен разрезать символ UTF-8
+        while size < len(encoded) and encoded[size] & 0xC0 == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode())
+        encoded = encoded[size:]
+    return '\r\n '.join(parts)
+
+
+def utc_stamp(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fingerprint(row):
+    return hashlib.md5(repr(tuple(row[name] for name in EVENT_COLUMNS))
+                       .encode()).hexdigest()
+
+
+def render_event(row):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:reservation-{row["id"]}@{UID_DOMAIN}',
+        f'DTSTAMP:{utc_stamp(row["created"])}',
+        f'DTSTART:{utc_stamp(row["datetime_from"])}',
+        f'DTEND:{utc_stamp(row["datetime_to"])}',
+        f'SUMMARY:{escape(row["room__name"])} '
+        f'(@{escape(row["author__username"])})',
+        f'LOCATION:{escape(row["room__building__name"])}',
+        'END:VEVENT',
+    ]
+    return '\r\n'.join(fold(line) for line in lines)
+
+
+def fragment_key(reservation_id):
+    return f'{FRAGMENT_KEY_PREFIX}{reservation_id}'
+
+
+def forget_reservation(reservation_id):
+    """Удаляет фрагмент изменённой или удалённой брони из кэша."""
+    cache.delete(fragment_key(reservation_id))
+
+
+def event_fragments(rows):
+    """
+    Фрагменты VEVENT броней rows. Кэш читается и пополняется одним
+    обращением на ленту; фрагмент хранится вместе с отпечатком данных
+    брони, поэтому переименование помещения или пользователя тоже
+    приводит к новой отрисовке.
+    """
+    keys = [fragment_key(row['id']) for row in rows]
+    cached = cache.get_many(keys)
+    fragments, missing = [], {}
+    for key, row in zip(keys, rows):
+        stamp = fingerprint(row)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == stamp:
+            fragments.append(entry[1])
+        else:
+            fragment = render_event(row)
+            missing[key] = (stamp, fragment)
+            fragments.append(fragment)
+    if missing:
+        cache.set_many(missing, settings.RESERVATION_ICAL_FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def render_calendar(name, queryset, window):
+    rows = list(queryset.filter(
+        datetime_to__gt=window[0], datetime_from__lt=window[1]
+    ).order_by('datetime_from', 'pk').values(*EVENT_COLUMNS))
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//api_booking//Reservations//RU',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        fold(f'X-WR-CALNAME:{escape(name)}'),
+        *event_fragments(rows),
+        'END:VCALENDAR',
+    ]
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def calendar_response(request, scope, build):
+    """
+    Ответ ленты с условным GET по версии области scope. build() возвращает
+    пару (название календаря, брони) или бросает Http404 и вызывается
+    только при промахе кэша.
+    """
+    window = feed_window()
+    version, updated = scope_state(scope)
+    # Сдвиг окна тоже меняет ленту
+    updated = max(updated, window[0]) if updated else window[0]
+    etag = make_etag(scope, version,
+                     f'{request.build_absolute_uri()}|{window[0]:%Y%m%d}',
+                     CONTENT_TYPE)
+    if not_modified(request, etag, updated):
+        response = HttpResponseNotModified()
+    else:
+        key = CACHE_KEY_PREFIX + etag
+        body = cache.get(key)
+        if body is None:
+            name, queryset = build()
+            body = render_calendar(name, queryset, window)
+            cache.set(key, body, settings.RESERVATION_RESPONSE_CACHE_TIMEOUT)
+        response = HttpResponse(body, content_type=CONTENT_TYPE)
+    set_validators(response, etag, updated)
+    return response
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Замеры текущего запроса; переменная контекста видна и в потоках пула,
+# через которые асинхронные представления обращаются к базе
+current_metrics = ContextVar('reservation_request_metrics', default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def view_name(view_func, method):
+    """Имя представления для замеров: RoomViewSet.list, index и т.п."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return view_func.__name__
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestMetrics:
+    __slots__ = ('request', 'started', 'queries', 'db_time',
+                 'render_started', 'render_time')
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    @property
+    def view(self):
+        """Представление запроса или None, пока адрес не разобран."""
+        match = getattr(self.request, 'resolver_match', None)
+        if match is None:
+            return None
+        return view_name(match.func, self.request.method.lower())
+
+    def server_timing(self, total):
+        return (f'db;dur={self.db_time * 1000:.1f};'
+                f'desc="{self.queries} queries", '
+                f'render;dur={self.render_time * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}')
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL (connection.execute_wrappers): считает запросы
+    и время базы текущего запроса и пишет в журнал медленные запросы вместе
+    с представлением, которое их выполнило.
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.db_time += elapsed
+        if elapsed * 1000 >= settings.RESERVATION_SLOW_QUERY_MS:
+            logger.warning(
+                'Медленный запрос %.1f мс в %s: %s', elapsed * 1000,
+                metrics and metrics.view or '-', sql)
+
+
+def quantile(ordered, q):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ViewStats:
+    """Счётчики представления и последние window замеров для процентилей."""
+
+    def __init__(self, window):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.time = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, total, metrics):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.db_time += metrics.db_time
+        self.time += total
+        self.samples.append((total, metrics.queries, metrics.db_time,
+                             metrics.render_time))
+
+    def summary(self):
+        columns = list(zip(*self.samples)) or [(), (), (), ()]
+        summary = {'requests': self.requests, 'queries': self.queries,
+                   'db_seconds': self.db_time, 'seconds': self.time}
+        for name, values in zip(('seconds', 'queries', 'db_seconds',
+                                 'render_seconds'), columns):
+            ordered = sorted(values)
+            summary[f'{name}_quantiles'] = {
+                str(q): quantile(ordered, q) for q in QUANTILES}
+        return summary
+
+
+class MetricsRegistry:
+    """Замеры запросов по представлениям в памяти процесса."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view, total, metrics):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats(self.window)
+            stats.add(total, metrics)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: stats.summary()
+                    for view, stats in sorted(self._views.items())}
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry(window=settings.RESERVATION_METRICS_WINDOW)
+
+
+def prometheus_text(snapshot):
+    """Замеры в текстовом формате Prometheus."""
+    lines = []
+    counters = (
+        ('booking_requests_total', 'requests', 'Обработано запросов'),
+        ('booking_db_queries_total', 'queries', 'Выполнено SQL-запросов'),
+        ('booking_db_seconds_total', 'db_seconds', 'Время SQL-запросов'),
+    )
+    for metric, key, description in counters:
+        lines += [f'# HELP {metric} {description}.',
+                  f'# TYPE {metric} counter']
+        lines += [f'{metric}{{view="{view}"}} {summary[key]}'
+                  for view, summary in snapshot.items()]
+    summaries = (
+        ('booking_request_seconds', 'seconds', 'requests',
+         'Время ответа'),
+        ('booking_request_db_queries', 'queries', 'requests',
+         'SQL-запросов на ответ'),
+    )
+    for metric, key, count, description in summaries:
+        lines += [f'# HELP {metric} {description} за последние запросы.',
+                  f'# TYPE {metric} summary']
+        for view, summary in snapshot.items():
+            for q, value in summary[f'{key}_quantiles'].items():
+                lines.append(f'{metric}{{view="{view}",quantile="{q}"}} '
+                             f'{value}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {summary[key]}')
+            lines.append(f'{metric}_count{{view="{view}"}} '
+                         f'{summary[count]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,241 @@
+"""
+Фоновые задачи. Задача - функция, зарегистрированная декоратором job;
+enqueue ставит её в очередь, и запрос, изменивший брони, не ждёт её
+выполнения. Аргументы задачи должны сериализоваться в JSON. Задача
+выполняется в транзакции, при ошибке повторяется с экспоненциально
+растущей паузой. Очередь задаёт бэкенд из RESERVATION_JOBS_BACKEND.
+"""
+import datetime
+import heapq
+import logging
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(func=None, *, max_attempts=None):
+    """
+    Регистрирует функцию как задачу под именем модуль.функция.
+    max_attempts по умолчанию - RESERVATION_JOBS_MAX_ATTEMPTS.
+    """
+    def register(func):
+        func.job_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = (max_attempts
+                             or settings.RESERVATION_JOBS_MAX_ATTEMPTS)
+        registry[func.job_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(func, **kwargs):
+    """Ставит задачу func с аргументами kwargs в очередь бэкенда."""
+    backend.enqueue(func.job_name, kwargs, func.max_attempts)
+
+
+def retry_delay(attempts):
+    """Пауза перед следующей попыткой после attempts неудачных."""
+    delay = settings.RESERVATION_JOBS_RETRY_DELAY * 2 ** (attempts - 1)
+    return datetime.timedelta(
+        seconds=min(delay, settings.RESERVATION_JOBS_RETRY_MAX_DELAY))
+
+
+def run_job(name, kwargs):
+    with transaction.atomic():
+        registry[name](**kwargs)
+
+
+class Backend:
+    """
+    Очередь задач. Задача отправляется в неё после фиксации транзакции,
+    в которой поставлена, и не выполняется, если транзакция откатилась.
+    """
+
+    def enqueue(self, name, kwargs, max_attempts):
+        transaction.on_commit(
+            lambda: self.submit(name, kwargs, max_attempts))
+
+    def submit(self, name, kwargs, max_attempts):
+        raise NotImplementedError
+
+
+class InMemoryBackend(Backend):
+    """
+    Очередь в памяти процесса для тестов: задачи выполняются только
+    вызовом run_pending, синхронно и по порядку.
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.failed = []
+        self._order = count()
+
+    def submit(self, name, kwargs, max_attempts, attempts=0, run_at=None):
+        heapq.heappush(self.queue, (run_at or timezone.now(),
+                                    next(self._order), name, kwargs,
+                                    max_attempts, attempts))
+
+    def run_pending(self, now=None):
+        """
+        Выполняет задачи, срок которых наступил к now (по умолчанию -
+        сейчас), включая повторы, срок которых наступает к тому же
+        моменту. Возвращает число успешно выполненных задач.
+        """
+        now = now or timezone.now()
+        done = 0
+        while self.queue and self.queue[0][0] <= now:
+            run_at, _, name, kwargs, max_attempts, attempts = heapq.heappop(
+                self.queue)
+            attempts += 1
+            try:
+                run_job(name, kwargs)
+            except Exception as error:
+                if attempts >= max_attempts:
+                    self.failed.append((name, kwargs, error))
+                else:
+                    self.submit(name, kwargs, max_attempts, attempts,
+                                run_at + retry_delay(attempts))
+            else:
+                done += 1
+        return done
+
+
+class ThreadPoolBackend(Backend):
+    """
+    Выполняет задачи в пуле потоков процесса; повторная попытка
+    отправляется в пул по таймеру. Очередь живёт в памяти процесса, и
+    невыполненные задачи теряются при его остановке.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.RESERVATION_JOBS_THREADS,
+            thread_name_prefix='reservation-jobs',
+        )
+
+    def submit(self, name, kwargs, max_attempts, attempts=0):
+        self.executor.submit(self.run, name, kwargs, max_attempts, attempts)
+
+    def run(self, name, kwargs, max_attempts, attempts):
+        attempts += 1
+        close_old_connections()
+        try:
+            run_job(name, kwargs)
+        except Exception as error:
+            if attempts >= max_attempts:
+                logger.exception('Задача %s не выполнена за %s попыток',
+                                 name, attempts)
+                return
+            logger.warning('Задача %s: %r, попытка %s из %s', name, error,
+                           attempts, max_attempts)
+            timer = threading.Timer(
+                retry_delay(attempts).total_seconds(), self.submit,
+                (name, kwargs, max_attempts, attempts))
+            timer.daemon = True
+            timer.start()
+        finally:
+            close_old_connections()
+
+
+class DatabaseBackend(Backend):
+    """
+    Очередь в таблице Job, которую выполняет команда run_jobs в любом
+    числе процессов. Задача записывается в транзакции изменения, а не
+    после неё: она фиксируется и откатывается вместе с изменением и не
+    теряется, если процесс остановится сразу после фиксации.
+    """
+
+    def enqueue(self, name, kwargs, max_attempts):
+        self.submit(name, kwargs, max_attempts)
+
+    def submit(self, name, kwargs, max_attempts):
+        Job.objects.create(name=name, kwargs=kwargs,
+                           max_attempts=max_attempts, run_at=timezone.now())
+
+
+def claim_jobs(limit, now=None):
+    """
+    Забирает до limit задач, срок которых наступил: задачи помечаются
+    меткой обработчика условным UPDATE, поэтому одновременные
+    обработчики не получают одну задачу дважды. Задачи обработчика, не
+    закончившего их за RESERVATION_JOBS_LEASE секунд, снова доступны,
+    если у них остались попытки; иначе они помечаются failed.
+    """
+    now = now or timezone.now()
+    expired = Job.objects.filter(
+        status=Job.QUEUED, locked_until__lte=now,
+        attempts__gte=F('max_attempts'),
+    ).update(status=Job.FAILED, locked_by='', locked_until=None,
+             last_error='Обработчик не закончил последнюю попытку за '
+                        'RESERVATION_JOBS_LEASE секунд')
+    if expired:
+        logger.error('Задач с истёкшей последней попыткой: %s', expired)
+    available = Q(status=Job.QUEUED, run_at__lte=now,
+                  attempts__lt=F('max_attempts')) & (
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+    ids = list(Job.objects.filter(available).order_by('run_at', 'pk')
+               .values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    worker = uuid.uuid4().hex
+    Job.objects.filter(available, pk__in=ids).update(
+        locked_by=worker, attempts=F('attempts') + 1,
+        locked_until=now + datetime.timedelta(
+            seconds=settings.RESERVATION_JOBS_LEASE))
+    return list(Job.objects.filter(locked_by=worker).order_by('run_at',
+                                                              'pk'))
+
+
+class LeaseLost(Exception):
+    """Задачу, не законченную за срок аренды, забрал другой обработчик."""
+
+
+def execute(claimed):
+    """
+    Выполняет забранную задачу. Задача удаляется в той же транзакции,
+    поэтому изменения в базе, сделанные задачей, фиксируются ровно один
+    раз: если за это время задачу забрал другой обработчик, удалять
+    нечего, и изменения откатываются. Возвращает True, если задача
+    выполнена.
+    """
+    try:
+        with transaction.atomic():
+            registry[claimed.name](**claimed.kwargs)
+            deleted, _ = Job.objects.filter(
+                pk=claimed.pk, locked_by=claimed.locked_by).delete()
+            if not deleted:
+                raise LeaseLost
+    except LeaseLost:
+        logger.warning('Задача %s не закончена за RESERVATION_JOBS_LEASE '
+                       'секунд и отдана другому обработчику', claimed.name)
+        return False
+    except Exception:
+        if claimed.attempts >= claimed.max_attempts:
+            changes = {'status': Job.FAILED}
+            logger.exception('Задача %s не выполнена за %s попыток',
+                             claimed.name, claimed.attempts)
+        else:
+            changes = {'run_at': timezone.now() + retry_delay(
+                claimed.attempts)}
+        Job.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by).update(
+            locked_by='', locked_until=None,
+            last_error=traceback.format_exc(), **changes)
+        return False
+    return True
+
+
+backend = import_string(settings.RESERVATION_JOBS_BACKEND)()
@@ -0,0 +1,51 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservation.archive import archive_batches
+from reservation.models import Reservation
+
+
+class Command(BaseCommand):
+    help = ('Переносит брони, закончившиеся больше --days дней назад, в '
+            'архив ReservationArchive порциями в отдельных транзакциях. '
+            'Списки броней и выгрузка читают архив вместе с таблицей '
+            'броней, а проверки занятости работают с меньшей таблицей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.RESERVATION_ARCHIVE_AFTER_DAYS,
+                            help='Возраст броней в днях, не меньше '
+                                 'RESERVATION_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.RESERVATION_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать брони для переноса')
+
+    def handle(self, *args, **options):
+        # Списки броней не читают архив, пока страница заполнена бронями
+        # новее RESERVATION_ARCHIVE_AFTER_DAYS, поэтому более новые брони
+        # в архив переносить нельзя
+        if options['days'] < settings.RESERVATION_ARCHIVE_AFTER_DAYS:
+            raise CommandError('--days не может быть меньше '
+                               'RESERVATION_ARCHIVE_AFTER_DAYS = '
+                               f'{settings.RESERVATION_ARCHIVE_AFTER_DAYS}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        if options['dry_run']:
+            count = Reservation.objects.filter(
+                datetime_to__lte=cutoff).count()
+            self.stdout.write(f'К переносу: {count} броней, закончившихся '
+                              f'до {cutoff:%d.%m.%Y %H:%M}')
+            return
+        archived = 0
+        for count in archive_batches(cutoff, options['batch_size']):
+            archived += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Перенесено: {archived}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено в архив: {archived} броней, закончившихся до '
+            f'{cutoff:%d.%m.%Y %H:%M}'))
@@ -0,0 +1,193 @@
+import asyncio
+import datetime
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from reservation.models import Building, Room, User
+
+ROOMS = 20
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность синхронного API под WSGI и '
+            'асинхронного /api/v1/async/ под ASGI на поиске свободных '
+            'помещений, списке броней помещения и создании брони, затем '
+            'держит открытыми long-poll запросы и проверяет, что все они '
+            'получают изменение. Созданные данные удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Одновременных запросов (потоков WSGI и '
+                                 'задач ASGI)')
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Запросов на каждый замер')
+        parser.add_argument('--pollers', type=int, default=500,
+                            help='Одновременных long-poll запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict[
+                'NAME'] == ':memory:':
+            raise CommandError('Нужна файловая база: потоки не видят '
+                               'общую базу в памяти.')
+        sync_only = [path for path in settings.MIDDLEWARE
+                     if not getattr(import_string(path), 'async_capable',
+                                    False)]
+        if sync_only:
+            self.stderr.write(
+                'Синхронные middleware обрабатывают ASGI-запросы по одному: '
+                + ', '.join(sync_only))
+        author, _ = User.objects.get_or_create(username='bench_asgi')
+        token, _ = Token.objects.get_or_create(user=author)
+        building = Building.objects.create(name='bench_asgi')
+        Room.objects.bulk_create(
+            Room(name=f'bench_asgi_{i}', slug=f'bench-asgi-{i}',
+                 building=building)
+            for i in range(ROOMS)
+        )
+        rooms = list(building.room.values_list('pk', flat=True))
+        try:
+            with override_settings(RESERVATION_THROTTLE_ENABLED=False):
+                self.compare(rooms, token.key, building.pk, options)
+                self.long_poll(rooms[0], token.key, options)
+        finally:
+            building.delete()
+
+    def compare(self, rooms, token, building, options):
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        slots = itertools.count()
+        query = urlencode({
+            'datetime_from': start.isoformat(),
+            'datetime_to': (start + datetime.timedelta(hours=1)).isoformat(),
+            'building': building,
+        })
+        cases = (
+            ('Свободные помещения', 'GET',
+             lambda prefix, i: (f'{prefix}rooms/?{query}', None)),
+            ('Брони помещения', 'GET',
+             lambda prefix, i: (f'{prefix}rooms/{rooms[i % ROOMS]}/', None)),
+            ('Создание брони', 'POST',
+             lambda prefix, i: (f'{prefix}reservations/',
+                                self.reservation(rooms, start, next(slots)))),
+        )
+        for name, method, make in cases:
+            wsgi = self.run_wsgi(method, make, token, options)
+            asgi = asyncio.run(self.run_asgi(method, make, token, options))
+            self.stdout.write(
+                f'{name}: WSGI {wsgi:.0f} запросов/с, '
+                f'ASGI {asgi:.0f} запросов/с'
+            )
+
+    def reservation(self, rooms, start, slot):
+        datetime_from = start + datetime.timedelta(hours=slot // ROOMS)
+        return {
+            'room': rooms[slot % ROOMS],
+            'datetime_from': datetime_from.isoformat(),
+            'datetime_to': (datetime_from
+                            + datetime.timedelta(hours=1)).isoformat(),
+        }
+
+    def run_wsgi(self, method, make, token, options):
+        numbers = iter(range(options['requests']))
+        guard = threading.Lock()
+
+        def worker():
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            try:
+                while True:
+                    with guard:
+                        number = next(numbers, None)
+                    if number is None:
+                        return
+                    path, data = make('/api/v1/', number)
+                    self.check(client.generic(
+                        method, path, self.body(data),
+                        content_type='application/json'))
+            finally:
+                connection.close()
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for future in [pool.submit(worker)
+                           for _ in range(options['concurrency'])]:
+                future.result()
+        return options['requests'] / (time.perf_counter() - began)
+
+    async def run_asgi(self, method, make, token, options):
+        client = AsyncClient()
+        numbers = iter(range(options['requests']))
+
+        async def worker():
+            for number in numbers:
+                path, data = make('/api/v1/async/', number)
+                self.check(await client.generic(
+                    method, path, self.body(data),
+                    content_type='application/json',
+                    AUTHORIZATION=f'Token {token}'))
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker()
+                               for _ in range(options['concurrency'])))
+        return options['requests'] / (time.perf_counter() - began)
+
+    def long_poll(self, room, token, options):
+        client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        path = f'/api/v1/async/rooms/{room}/'
+        etag = client.get(path)['ETag']
+        threads = threading.active_count()
+
+        async def poll(async_client):
+            response = await async_client.get(
+                f'{path}?wait=30', IF_NONE_MATCH=etag,
+                AUTHORIZATION=f'Token {token}')
+            return response.status_code
+
+        async def run():
+            async_client = AsyncClient()
+            pollers = [asyncio.ensure_future(poll(async_client))
+                       for _ in range(options['pollers'])]
+            await asyncio.sleep(2)
+            waiting = sum(not poller.done() for poller in pollers)
+            peak = threading.active_count() - threads
+            began = time.perf_counter()
+            start = timezone.now() + datetime.timedelta(days=365)
+            self.check(await async_client.post(
+                '/api/v1/async/reservations/', {
+                    'room': room,
+                    'datetime_from': start.isoformat(),
+                    'datetime_to': (start + datetime.timedelta(
+                        hours=1)).isoformat(),
+                }, content_type='application/json',
+                AUTHORIZATION=f'Token {token}'))
+            statuses = await asyncio.gather(*pollers)
+            return waiting, peak, time.perf_counter() - began, statuses
+
+        waiting, peak, elapsed, statuses = asyncio.run(run())
+        self.stdout.write(
+            f'Long-poll: ожидали {waiting} из {options["pollers"]} запросов, '
+            f'добавилось потоков: {peak}, все получили изменение за '
+            f'{elapsed:.2f} с'
+        )
+        if waiting != options['pollers'] or set(statuses) != {200}:
+            raise CommandError('Не все long-poll запросы дождались '
+                               f'изменения: {sorted(set(statuses))}')
+
+    def body(self, data):
+        return json.dumps(data) if data is not None else ''
+
+    def check(self, response):
+        if response.status_code >= 400:
+            raise CommandError(f'Ответ {response.status_code}: '
+                               f'{response.content[:200]}')
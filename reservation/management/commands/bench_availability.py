@@ -0,0 +1,76 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from reservation.availability import free_rooms
+from reservation.models import Building, Reservation, Room, User
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск свободных помещений по истории броней. '
+            'Данные создаются во временной транзакции и откатываются '
+            'по окончании замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=5000)
+        parser.add_argument('--reservations', type=int, default=1000000)
+        parser.add_argument('--days', type=int, default=730,
+                            help='Глубина истории броней в днях')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            now = self.populate(options)
+            timings = []
+            for _ in range(options['repeat']):
+                # Окна в ближайшую неделю: так выглядят реальные запросы
+                start = now + datetime.timedelta(
+                    hours=random.randrange(7 * 24))
+                began = time.perf_counter()
+                rooms = list(free_rooms(
+                    start, start + datetime.timedelta(hours=2)
+                ).values_list('pk', flat=True))
+                timings.append((time.perf_counter() - began) * 1000)
+            transaction.set_rollback(True)
+        timings.sort()
+        self.stdout.write(
+            f'{options["rooms"]} помещений, '
+            f'{options["reservations"]} броней, свободно {len(rooms)}: '
+            f'p50={statistics.median(timings):.1f} мс, '
+            f'p99={timings[int(len(timings) * 0.99) - 1]:.1f} мс'
+        )
+
+    def populate(self, options):
+        author, _ = User.objects.get_or_create(username='bench_availability')
+        building = Building.objects.create(name='bench_availability')
+        Room.objects.bulk_create(
+            (Room(name=f'bench_availability_{i}',
+                  slug=f'bench-availability-{i}', building=building)
+             for i in range(options['rooms'])),
+            batch_size=BATCH_SIZE
+        )
+        room_ids = list(building.room.values_list('pk', flat=True))
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        hours = options['days'] * 24
+
+        def reservations():
+            for _ in range(options['reservations']):
+                # История в прошлом и немного броней на неделю вперёд
+                datetime_from = now + datetime.timedelta(
+                    hours=random.randrange(-hours, 7 * 24))
+                yield Reservation(
+                    room_id=random.choice(room_ids), author=author,
+                    datetime_from=datetime_from,
+                    datetime_to=datetime_from + datetime.timedelta(
+                        hours=random.randint(1, 4))
+                )
+
+        Reservation.objects.bulk_create(reservations(), batch_size=BATCH_SIZE)
+        return now
@@ -0,0 +1,62 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from reservation.conflicts import check_reservation
+from reservation.models import Building, Reservation, Room, User
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время проверки пересечений броней для помещения '
+            'с заданным числом броней. Данные создаются во временной '
+            'транзакции и откатываются по окончании замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Число броней в помещении через запятую')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Число проверок для каждого размера')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        for size in sizes:
+            with transaction.atomic():
+                timings = self.measure(size, options['repeat'])
+                transaction.set_rollback(True)
+            timings.sort()
+            self.stdout.write(
+                f'{size:>9} броней: '
+                f'p50={statistics.median(timings):.3f} мс, '
+                f'p99={timings[int(len(timings) * 0.99) - 1]:.3f} мс'
+            )
+
+    def measure(self, size, repeat):
+        author, _ = User.objects.get_or_create(username='bench_overlap')
+        building = Building.objects.create(name='bench_overlap')
+        room = Room.objects.create(name='bench_overlap', slug='bench-overlap',
+                                   building=building)
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        hour = datetime.timedelta(hours=1)
+        # Брони длиной в час с часовыми промежутками между ними
+        Reservation.objects.bulk_create(
+            (Reservation(room=room, author=author,
+                         datetime_from=start + 2 * i * hour,
+                         datetime_to=start + (2 * i + 1) * hour)
+             for i in range(size)),
+            batch_size=BATCH_SIZE
+        )
+        timings = []
+        for _ in range(repeat):
+            # Ищем свободные окна, чтобы проверка проходила целиком
+            slot = start + (2 * random.randrange(size) + 1) * hour
+            began = time.perf_counter()
+            check_reservation(room.pk, slot, slot + hour)
+            timings.append((time.perf_counter() - began) * 1000)
+        return timings
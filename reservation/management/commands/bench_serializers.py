@@ -0,0 +1,87 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from reservation.fast_serializers import (reservation_records,
+                                          reservation_values, room_records,
+                                          room_values)
+from reservation.models import Building, Reservation, Room, User
+from reservation.room_status import refresh_status
+from reservation.serializers import ReservationSerializer, RoomSerializer
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает сериализацию списков через ModelSerializer и через '
+            'values(): проверяет совпадение JSON и замеряет записи в '
+            'секунду. Данные создаются во временной транзакции и '
+            'откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options['rows'])
+            cases = (
+                ('Reservation', ReservationSerializer,
+                 Reservation.objects.select_related('author'),
+                 reservation_values, reservation_records),
+                ('Room', RoomSerializer, Room.objects.all(),
+                 room_values, room_records),
+            )
+            for name, serializer, queryset, values, records in cases:
+                queryset = queryset.order_by('pk')
+                slow = serializer(queryset, many=True).data
+                fast = records(values(queryset))
+                if json.dumps(slow) != json.dumps(fast):
+                    raise CommandError(f'{name}: JSON быстрого пути '
+                                       'отличается от ModelSerializer')
+                slow_rate = self.rate(
+                    lambda: serializer(queryset.all(), many=True).data,
+                    options['repeat'])
+                fast_rate = self.rate(
+                    lambda: records(values(queryset.all())),
+                    options['repeat'])
+                self.stdout.write(
+                    f'{name}: ModelSerializer {slow_rate:.0f} записей/с, '
+                    f'values() {fast_rate:.0f} записей/с, '
+                    f'ускорение x{fast_rate / slow_rate:.1f}'
+                )
+            transaction.set_rollback(True)
+
+    def rate(self, serialize, repeat):
+        rows = 0
+        began = time.perf_counter()
+        for _ in range(repeat):
+            rows += len(serialize())
+        return rows / (time.perf_counter() - began)
+
+    def populate(self, rows):
+        authors = [User.objects.create(username=f'bench_serializers_{i}')
+                   for i in range(10)]
+        building = Building.objects.create(name='bench_serializers')
+        Room.objects.bulk_create(
+            Room(name=f'bench_serializers_{i}',
+                 slug=f'bench-serializers-{i}', building=building)
+            for i in range(rows // 10)
+        )
+        rooms = list(building.room.all())
+        start = timezone.now()
+        Reservation.objects.bulk_create(
+            (Reservation(room=rooms[i % len(rooms)],
+                         author=authors[i % len(authors)],
+                         datetime_from=start + datetime.timedelta(hours=i),
+                         datetime_to=start + datetime.timedelta(hours=i + 1))
+             for i in range(rows)),
+            batch_size=BATCH_SIZE
+        )
+        # Состояние помещений - часть их JSON, поэтому заполняется, как в
+        # рабочей базе
+        refresh_status(Room.objects.filter(building=building), start)
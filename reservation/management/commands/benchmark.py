@@ -0,0 +1,207 @@
+import datetime
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.instrumentation import quantile
+from reservation.models import Reservation, Room, User
+
+DEFAULT_THRESHOLDS = (Path(__file__).resolve().parents[2]
+                      / 'benchmark_thresholds.json')
+# Сколько помещений и пользователей участвуют в замерах
+SAMPLE_SIZE = 100
+# Показатели замера, которые сравниваются с порогами
+THRESHOLD_KEYS = ('p50_ms', 'p99_ms', 'queries')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет горячие пути бронирования на данных текущей базы '
+            '(см. seed_bookings): время p50/p99 и число SQL-запросов на '
+            'операцию. Печатает результат в JSON и сравнивает его с '
+            'порогами; при превышении завершается ошибкой. Созданные '
+            'брони откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Число операций перед замером, которые '
+                                 'не учитываются')
+        parser.add_argument('--cases', nargs='+', metavar='CASE',
+                            help='Замеряемые операции, по умолчанию все')
+        parser.add_argument('--output', help='Файл для результата в JSON')
+        parser.add_argument('--thresholds', default=str(DEFAULT_THRESHOLDS),
+                            help='JSON с порогами вида {"операция": '
+                                 '{"p99_ms": 50, "queries": 3}}')
+        parser.add_argument('--no-thresholds', action='store_true',
+                            help='Только замерить, не сравнивая с порогами')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        cases = {
+            'full_clean': self.full_clean,
+            'rooms_list': self.rooms_list,
+            'reservation_create': self.reservation_create,
+            'room_reservations': self.room_reservations,
+            'index': self.index,
+            'profile': self.profile,
+        }
+        selected = options['cases'] or list(cases)
+        unknown = set(selected) - set(cases)
+        if unknown:
+            raise CommandError('Неизвестные операции: '
+                               + ', '.join(sorted(unknown)))
+        if not Reservation.objects.exists():
+            raise CommandError('В базе нет броней: сначала выполните '
+                               'seed_bookings.')
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        self.rooms = list(Room.objects.order_by('pk').values_list(
+            'pk', 'slug')[:SAMPLE_SIZE])
+        # Первые пользователи seed_bookings - самые активные авторы
+        self.users = list(User.objects.filter(Exists(
+            Reservation.objects.filter(author=OuterRef('pk')))
+        ).order_by('pk')[:SAMPLE_SIZE])
+        self.api_client = APIClient()
+        self.client = Client()
+
+        report = {
+            'meta': {
+                'started': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'rooms': Room.objects.count(),
+                'reservations': Reservation.objects.count(),
+                'iterations': options['iterations'],
+            },
+            'results': {},
+        }
+        unthrottled = override_settings(RESERVATION_THROTTLE_ENABLED=False)
+        with unthrottled, transaction.atomic():
+            for name in selected:
+                report['results'][name] = self.measure(cases[name], options)
+            transaction.set_rollback(True)
+
+        regressions = []
+        if not options['no_thresholds']:
+            regressions = self.compare(report['results'],
+                                       options['thresholds'])
+        report['regressions'] = regressions
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n',
+                                               encoding='utf-8')
+        else:
+            self.stdout.write(output)
+        if regressions:
+            raise CommandError('Пороги превышены: ' + ', '.join(regressions))
+
+    def measure(self, operation, options):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(options['warmup']):
+            operation()
+        timings = []
+        query_counts = []
+        statuses = Counter()
+        with connection.execute_wrapper(count):
+            for _ in range(options['iterations']):
+                queries = 0
+                began = time.perf_counter()
+                status = operation()
+                timings.append((time.perf_counter() - began) * 1000)
+                query_counts.append(queries)
+                statuses[str(status)] += 1
+        timings.sort()
+        return {
+            'p50_ms': round(quantile(timings, 0.5), 3),
+            'p99_ms': round(quantile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': max(query_counts),
+            'queries_mean': sum(query_counts) / len(query_counts),
+            'statuses': dict(statuses),
+        }
+
+    def compare(self, results, path):
+        try:
+            with open(path, encoding='utf-8') as thresholds_file:
+                thresholds = json.load(thresholds_file)
+        except FileNotFoundError:
+            raise CommandError(f'Нет файла порогов {path}')
+        regressions = []
+        for name, result in results.items():
+            for key in THRESHOLD_KEYS:
+                limit = thresholds.get(name, {}).get(key)
+                if limit is not None and result[key] > limit:
+                    regressions.append(
+                        f'{name}.{key}: {result[key]} > {limit}')
+        return regressions
+
+    def window(self, days):
+        """Случайный интервал на получасовой сетке в пределах days дней."""
+        start = self.now + datetime.timedelta(
+            minutes=30 * self.random.randrange(-days * 48, days * 48))
+        return start, start + datetime.timedelta(
+            minutes=30 * self.random.randint(1, 4))
+
+    def full_clean(self):
+        datetime_from, datetime_to = self.window(7)
+        reservation = Reservation(
+            room_id=self.random.choice(self.rooms)[0],
+            author=self.random.choice(self.users),
+            datetime_from=datetime_from, datetime_to=datetime_to)
+        try:
+            reservation.full_clean()
+        except ValidationError:
+            return 'conflict'
+        return 'ok'
+
+    def rooms_list(self):
+        datetime_from, datetime_to = self.window(7)
+        self.api_client.force_authenticate(self.random.choice(self.users))
+        return self.api_client.get('/api/v1/rooms/', {
+            'datetime_from': datetime_from.isoformat(),
+            'datetime_to': datetime_to.isoformat(),
+        }).status_code
+
+    def reservation_create(self):
+        # Будущее за пределами сгенерированных броней: почти все попытки
+        # успешны, изредка сталкиваясь с бронями, созданными замером
+        datetime_from, datetime_to = self.window(365)
+        datetime_from += datetime.timedelta(days=730)
+        datetime_to += datetime.timedelta(days=730)
+        self.api_client.force_authenticate(self.random.choice(self.users))
+        return self.api_client.post('/api/v1/reservations/', {
+            'room': self.random.choice(self.rooms)[0],
+            'datetime_from': datetime_from.isoformat(),
+            'datetime_to': datetime_to.isoformat(),
+        }, format='json').status_code
+
+    def room_reservations(self):
+        slug = self.random.choice(self.rooms)[1]
+        return self.client.get(
+            reverse('reservation:room', args=[slug])).status_code
+
+    def index(self):
+        return self.client.get(reverse('reservation:index')).status_code
+
+    def profile(self):
+        username = self.random.choice(self.users).username
+        return self.client.get(
+            reverse('reservation:profile', args=[username])).status_code
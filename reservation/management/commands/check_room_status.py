@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservation.models import Room
+from reservation.room_status import refresh_rooms, stale_rooms
+
+
+class Command(BaseCommand):
+    help = ('Сверяет хранимое состояние помещений с бронями. Расхождения '
+            'остаются у помещений, которые sweep_room_status ещё не '
+            'обошёл, и после изменений броней в обход сигналов. С --fix '
+            'состояние таких помещений пересчитывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересчитать расходящиеся помещения')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        stale = stale_rooms(Room.objects.all(), now)
+        for room_id, (stored, expected) in sorted(stale.items()):
+            self.stdout.write(f'Помещение {room_id}: хранится {stored}, '
+                              f'по броням {expected}')
+        if not stale:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif options['fix']:
+            refresh_rooms(Room.objects.filter(pk__in=stale), now)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано помещений: {len(stale)}'))
+        else:
+            raise CommandError(f'Расхождений: {len(stale)}')
@@ -0,0 +1,88 @@
+import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservation.models import Reservation, ReservationArchive, RoomUtilization
+from reservation.utilization import HOUR, hour_start, local_parts
+
+BATCH_SIZE = 5000
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+SECOND = datetime.timedelta(seconds=1)
+
+
+def interval_arrays(queryset):
+    """Помещения, начала и концы броней массивами секунд от эпохи."""
+    rooms, starts, ends = [], [], []
+    rows = queryset.values_list('room_id', 'datetime_from',
+                                'datetime_to').iterator(
+        chunk_size=settings.RESERVATION_EXPORT_CHUNK_SIZE)
+    for room_id, datetime_from, datetime_to in rows:
+        rooms.append(room_id)
+        starts.append((datetime_from - EPOCH) // SECOND)
+        ends.append((datetime_to - EPOCH) // SECOND)
+    return (np.array(rooms, dtype=np.int64), np.array(starts, dtype=np.int64),
+            np.array(ends, dtype=np.int64))
+
+
+def hour_totals(rooms, starts, ends):
+    """
+    Та же арифметика, что utilization.hour_shares, сразу для всех броней:
+    каждая бронь разворачивается в задетые ею часы, доли часов
+    складываются по парам (помещение, час).
+    """
+    first = starts // HOUR
+    counts = (ends - 1) // HOUR - first + 1
+    owners = np.repeat(np.arange(len(rooms)), counts)
+    # Номер часа внутри брони: сквозной номер минус начало её отрезка
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                  counts)
+    hours = first[owners] + offsets
+    seconds = (np.minimum(ends[owners], (hours + 1) * HOUR)
+               - np.maximum(starts[owners], hours * HOUR))
+    keys, inverse = np.unique(np.stack([rooms[owners], hours]), axis=1,
+                              return_inverse=True)
+    return keys, np.bincount(inverse.ravel(), weights=seconds)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает почасовую занятость помещений RoomUtilization '
+            'по броням и их архиву. Изменения броней во время пересчёта '
+            'и ещё не выполненные фоновые задачи занятости учитываются '
+            'неверно, поэтому запускайте его, когда брони не меняются и '
+            'очередь задач пуста, или повторите после.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, action='append',
+                            dest='rooms', help='Пересчитать только '
+                                               'указанные помещения')
+
+    def handle(self, *args, **options):
+        querysets = [Reservation.objects.all(),
+                     ReservationArchive.objects.all()]
+        rollups = RoomUtilization.objects.all()
+        if options['rooms']:
+            querysets = [queryset.filter(room__in=options['rooms'])
+                         for queryset in querysets]
+            rollups = rollups.filter(room__in=options['rooms'])
+        arrays = [interval_arrays(queryset) for queryset in querysets]
+        rooms, starts, ends = (np.concatenate(columns)
+                               for columns in zip(*arrays))
+        keys, totals = hour_totals(rooms, starts, ends)
+        # Часов в истории на порядки меньше, чем строк статистики, поэтому
+        # местное время считается по разу на час
+        parts = {hour: local_parts(hour)
+                 for hour in np.unique(keys[1]).tolist()}
+        with transaction.atomic():
+            rollups.delete()
+            RoomUtilization.objects.bulk_create(
+                (RoomUtilization(room_id=room_id, hour=hour_start(hour),
+                                 day_hour=parts[hour][0],
+                                 weekday=parts[hour][1], seconds=int(seconds))
+                 for room_id, hour, seconds in zip(*keys.tolist(), totals)),
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Броней: {len(rooms)}, часов занятости: {len(totals)}'))
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reservation.jobs import claim_jobs, execute
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди Job (DatabaseBackend). '
+            'Можно запускать несколько обработчиков одновременно. Без '
+            '--once работает постоянно, опрашивая очередь раз в '
+            '--interval секунд, пока она пуста.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и завершиться')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Сколько задач забирать за раз')
+        parser.add_argument('--interval', type=float,
+                            default=settings.RESERVATION_JOBS_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        if settings.RESERVATION_JOBS_BACKEND != \
+                'reservation.jobs.DatabaseBackend':
+            self.stderr.write('RESERVATION_JOBS_BACKEND не DatabaseBackend: '
+                              'новые задачи в очередь Job не попадают')
+        done = failed = 0
+        while True:
+            jobs = claim_jobs(options['batch_size'])
+            for job in jobs:
+                if execute(job):
+                    done += 1
+                else:
+                    failed += 1
+            if jobs and options['verbosity'] > 1:
+                self.stdout.write(f'Выполнено: {done}, с ошибкой: {failed}')
+            if options['once'] and not jobs:
+                break
+            if not jobs:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}'))
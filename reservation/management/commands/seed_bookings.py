@@ -0,0 +1,158 @@
+import datetime
+import random
+from collections import Counter
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from reservation.models import Building, Reservation, Room, User
+from reservation.room_status import refresh_status
+from reservation.versions import rooms_changed
+
+BATCH_SIZE = 5000
+SEED_PREFIX = 'seed'
+# Рабочий день помещений: брони начинаются и заканчиваются в эти часы
+DAY_START = 8
+DAY_END = 20
+SLOT = datetime.timedelta(minutes=30)
+# Длительности броней в слотах и их доли: чаще всего бронируют на час
+DURATIONS = (1, 2, 3, 4, 6, 8)
+DURATION_WEIGHTS = (20, 40, 15, 15, 5, 5)
+# Доля броней в выходные относительно будней
+WEEKEND_WEIGHT = 0.1
+# Во сколько раз самое популярное помещение бронируют чаще обычного
+MAX_POPULARITY = 10
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные для замеров: здания, '
+            'помещения, пользователей и брони без пересечений. Брони '
+            'распределены как в жизни: в рабочие часы и будни, популярные '
+            'помещения и авторы встречаются чаще. Данные сохраняются, '
+            'поэтому генерируйте их в отдельную базу (BOOKING_DB_NAME).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buildings', type=int, default=10)
+        parser.add_argument('--rooms', type=int, default=50,
+                            help='Число помещений в здании')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reservations', type=int, default=1000000,
+                            help='Примерное число броней: в переполненные '
+                                 'дни популярных помещений попадает '
+                                 'меньше')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Глубина истории броней в днях')
+        parser.add_argument('--ahead', type=int, default=30,
+                            help='На сколько дней вперёд есть брони')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора: одинаковые параметры '
+                                 'дают одинаковые данные')
+
+    def handle(self, *args, **options):
+        if Building.objects.filter(
+                name__startswith=f'{SEED_PREFIX}_building_').exists():
+            raise CommandError('Данные уже сгенерированы; для нового набора '
+                               'используйте отдельную базу.')
+        generator = random.Random(options['seed'])
+        with transaction.atomic():
+            rooms = self.create_rooms(options)
+            authors = self.create_users(options)
+            created = 0
+            reservations = self.reservations(generator, rooms, authors,
+                                             options)
+            while True:
+                batch = list(islice(reservations, BATCH_SIZE))
+                if not batch:
+                    break
+                # bulk_create не вызывает сигналы, поэтому версии и
+                # состояние помещений обновляются по разу в конце
+                Reservation.objects.bulk_create(batch)
+                created += len(batch)
+                self.stdout.write(f'\rБроней: {created}', ending='')
+            refresh_status(Room.objects.filter(pk__in=rooms))
+            rooms_changed(rooms)
+        self.stdout.write('')
+        # bulk_create обходит и учёт почасовой занятости
+        call_command('rebuild_utilization', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано зданий: {options["buildings"]}, помещений: '
+            f'{len(rooms)}, пользователей: {len(authors)}, '
+            f'броней: {created}'))
+
+    def create_rooms(self, options):
+        Building.objects.bulk_create(
+            Building(name=f'{SEED_PREFIX}_building_{number}')
+            for number in range(options['buildings'])
+        )
+        buildings = Building.objects.filter(
+            name__startswith=f'{SEED_PREFIX}_building_')
+        Room.objects.bulk_create(
+            (Room(name=f'{SEED_PREFIX}_room_{building.pk}_{number}',
+                  slug=f'{SEED_PREFIX}-room-{building.pk}-{number}',
+                  description='Синтетическое помещение для замеров',
+                  building=building)
+             for building in buildings
+             for number in range(options['rooms'])),
+            batch_size=BATCH_SIZE
+        )
+        return list(Room.objects.filter(building__in=buildings).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def create_users(self, options):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'{SEED_PREFIX}_user_{number}', password=password)
+             for number in range(options['users'])),
+            batch_size=BATCH_SIZE
+        )
+        return list(User.objects.filter(
+            username__startswith=f'{SEED_PREFIX}_user_').order_by(
+            'pk').values_list('pk', flat=True))
+
+    def reservations(self, generator, rooms, authors, options):
+        today = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        days = [today + datetime.timedelta(days=offset)
+                for offset in range(-options['days'], options['ahead'])]
+        day_weights = [WEEKEND_WEIGHT if day.weekday() >= 5 else 1
+                       for day in days]
+        # Популярность помещений и активность авторов распределены по
+        # степенному закону: немногие помещения заняты почти всегда.
+        # Популярность ограничена, чтобы квота помещения умещалась в дни
+        room_weights = [min(generator.paretovariate(1.5), MAX_POPULARITY)
+                        for _ in rooms]
+        author_weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(authors))))
+        total_weight = sum(room_weights)
+        capacity = (DAY_END - DAY_START) * 2
+        for room_id, weight in zip(rooms, room_weights):
+            quota = round(options['reservations'] * weight / total_weight)
+            per_day = Counter(generator.choices(days, day_weights, k=quota))
+            for day, count in sorted(per_day.items()):
+                durations = generator.choices(DURATIONS, DURATION_WEIGHTS,
+                                              k=count)
+                # Самые длинные брони не помещаются в переполненный день
+                durations.sort()
+                while sum(durations) > capacity:
+                    durations.pop()
+                generator.shuffle(durations)
+                # Свободные слоты дня раскладываются по промежуткам
+                # между бронями
+                gaps = Counter(generator.choices(
+                    range(len(durations) + 1),
+                    k=capacity - sum(durations)))
+                slot = day + datetime.timedelta(hours=DAY_START)
+                for position, duration in enumerate(durations):
+                    slot += SLOT * gaps[position]
+                    yield Reservation(
+                        room_id=room_id,
+                        author_id=generator.choices(
+                            authors, cum_weights=author_weights)[0],
+                        datetime_from=slot,
+                        datetime_to=slot + SLOT * duration,
+                    )
+                    slot += SLOT * duration
@@ -0,0 +1,125 @@
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.conflicts import overlapping
+from reservation.models import Building, Reservation, Room, User
+
+
+class Command(BaseCommand):
+    help = ('Нагружает помещения параллельными бронированиями через API '
+            'из нескольких потоков и проверяет, что в базе не появилось '
+            'пересекающихся броней. Печатает профиль базы, чтобы сравнивать '
+            'пропускную способность записи под разными BOOKING_DB_*. '
+            'Созданные данные удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=50,
+                            help='Число попыток бронирования на поток')
+        parser.add_argument('--slots', type=int, default=40,
+                            help='Число часовых слотов, за которые '
+                                 'конкурируют потоки')
+        parser.add_argument('--rooms', type=int, default=1,
+                            help='Число помещений: с одним потоки '
+                                 'конкурируют за блокировку, с несколькими '
+                                 'пишут параллельно')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Не снимать ограничения частоты запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict[
+                'NAME'] == ':memory:':
+            raise CommandError('Нужна файловая база: потоки не видят '
+                               'общую базу в памяти.')
+        author, _ = User.objects.get_or_create(username='stress_booking')
+        building = Building.objects.create(name='stress_booking')
+        Room.objects.bulk_create(
+            Room(name=f'stress_booking_{i}', slug=f'stress-booking-{i}',
+                 building=building)
+            for i in range(options['rooms'])
+        )
+        rooms = list(building.room.values_list('pk', flat=True))
+        self.stdout.write(self.profile())
+        try:
+            with override_settings(
+                    RESERVATION_THROTTLE_ENABLED=options['throttle']):
+                statuses, elapsed = self.hammer(rooms, author, options)
+            overlaps = self.count_overlaps(rooms)
+        finally:
+            building.delete()
+
+        requests = sum(statuses.values())
+        self.stdout.write(
+            f'Запросов: {requests} за {elapsed:.2f} с '
+            f'({requests / elapsed:.0f} в секунду), ответы: '
+            + ', '.join(f'{code}: {count}'
+                        for code, count in sorted(statuses.items()))
+        )
+        if overlaps:
+            raise CommandError(f'Найдено пересекающихся броней: {overlaps}')
+        self.stdout.write(self.style.SUCCESS('Пересечений нет'))
+
+    def profile(self):
+        settings_dict = connection.settings_dict
+        description = (f'База: {connection.vendor}, '
+                       f'CONN_MAX_AGE={settings_dict["CONN_MAX_AGE"]}')
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                description += f', journal_mode={cursor.fetchone()[0]}'
+        if settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+            description += ', пул транзакций PgBouncer'
+        return description
+
+    def hammer(self, rooms, author, options):
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        statuses = Counter()
+        statuses_guard = threading.Lock()
+
+        def worker():
+            client = APIClient()
+            client.force_authenticate(author)
+            try:
+                for _ in range(options['attempts']):
+                    # Половина слота сдвигает интервал, чтобы конкурировали
+                    # и частично пересекающиеся брони
+                    offset = random.randrange(options['slots'] * 2)
+                    datetime_from = start + datetime.timedelta(
+                        minutes=30 * offset)
+                    response = client.post('/api/v1/reservations/', {
+                        'room': random.choice(rooms),
+                        'datetime_from': datetime_from.isoformat(),
+                        'datetime_to': (datetime_from + datetime.timedelta(
+                            hours=1)).isoformat(),
+                    }, format='json')
+                    with statuses_guard:
+                        statuses[response.status_code] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(options['threads'])]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses, time.perf_counter() - began
+
+    def count_overlaps(self, rooms):
+        clashes = overlapping(
+            Reservation.objects.filter(room=OuterRef('room')),
+            OuterRef('datetime_from'), OuterRef('datetime_to')
+        ).exclude(pk=OuterRef('pk'))
+        return Reservation.objects.filter(room__in=rooms).filter(
+            Exists(clashes)).count()
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservation.room_status import sweep
+
+
+class Command(BaseCommand):
+    help = ('Продвигает хранимое состояние помещений (текущая бронь, '
+            'занято до, начало следующей брони), когда текущая бронь '
+            'закончилась или началась следующая. Без --interval выполняет '
+            'один проход, например из cron; с --interval работает '
+            'постоянно с паузой в указанное число секунд.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Пауза между проходами в секундах')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval должен быть положительным')
+        while True:
+            room_ids = sweep()
+            if room_ids or options['verbosity'] > 1:
+                self.stdout.write(f'Обновлено помещений: {len(room_ids)}')
+            if interval is None:
+                return
+            time.sleep(interval)
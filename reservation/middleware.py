@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from django.utils.decorators import sync_and_async_middleware
+
+from .instrumentation import RequestMetrics, current_metrics, registry
+
+
+@sync_and_async_middleware
+def query_instrumentation_middleware(get_response):
+    """
+    Замеряет для каждого запроса число SQL-запросов, время базы, время
+    отрисовки ответа и общее время. Отдаёт их в заголовке Server-Timing и
+    копит по представлениям в instrumentation.registry.
+    Поддерживает синхронный и асинхронный режимы, поэтому не заставляет
+    асинхронные представления работать через поток.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics(request)
+            token = current_metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                current_metrics.reset(token)
+            return finish(metrics, response)
+    else:
+        def middleware(request):
+            metrics = RequestMetrics(request)
+            token = current_metrics.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                current_metrics.reset(token)
+            return finish(metrics, response)
+
+    # Django 3.1 ждёт здесь метод объекта: в сообщениях об ошибках он
+    # берёт имя класса из __self__
+    middleware.process_template_response = (
+        render_timing.process_template_response)
+    return middleware
+
+
+class RenderTiming:
+    """Замер времени отрисовки ответа."""
+
+    def process_template_response(self, request, response):
+        # Ответы DRF и шаблоны отрисовываются после этого метода
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: self.rendered(metrics))
+        return response
+
+    def rendered(self, metrics):
+        metrics.render_time = time.perf_counter() - metrics.render_started
+
+
+render_timing = RenderTiming()
+
+
+def finish(metrics, response):
+    total = time.perf_counter() - metrics.started
+    response['Server-Timing'] = metrics.server_timing(total)
+    # Запросы без представления (404 на разборе адреса) не копятся,
+    # чтобы число имён в замерах оставалось ограниченным
+    view = metrics.view
+    if view is not None:
+        registry.add(view, total, metrics)
+    return response
@@ -1,7 +1,14 @@
+import datetime
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import models
 
+from .conflicts import (check_reservation, find_series_conflict,
+                        series_conflict_errors)
+from .recurrence import DAILY, WEEKLY, Occurrence, expand, parse_weekdays
+
 User = get_user_model()
 
 
@@ -23,6 +30,24 @@ class Room(models.Model):
                                  on_delete=models.CASCADE,
                                  related_name='room'
                                  )
+    # Текущее состояние помещения, которое поддерживают сигналы броней и
+    # команда sweep_room_status (см. room_status). Ссылка на бронь без
+    # ограничения в базе: удаление брони само пересчитывает состояние, и
+    # обнулять ссылку отдельным запросом не нужно
+    current_reservation = models.ForeignKey('Reservation',
+                                            on_delete=models.DO_NOTHING,
+                                            db_constraint=False,
+                                            related_name='+',
+                                            blank=True,
+                                            null=True,
+                                            editable=False,
+                                            verbose_name='Текущая бронь',
+                                            )
+    busy_until = models.DateTimeField('Занято до', blank=True, null=True,
+                                      editable=False)
+    next_reservation_start = models.DateTimeField('Начало следующей брони',
+                                                  blank=True, null=True,
+                                                  editable=False)
 
     class Meta:
         ordering = ['building', 'name']
@@ -36,6 +61,8 @@ class Room(models.Model):
 
 
 class Reservation(models.Model):
+    archived = False
+
     room = models.ForeignKey(Room,
                              on_delete=models.CASCADE,
                              related_name='reservation',
@@ -49,63 +76,264 @@ class Reservation(models.Model):
                                on_delete=models.CASCADE,
                                verbose_name='Клиент',
                                )
+    series = models.ForeignKey('ReservationSeries',
+                               on_delete=models.SET_NULL,
+                               related_name='reservations',
+                               verbose_name='Серия',
+                               blank=True,
+                               null=True,
+                               )
 
     class Meta:
         ordering = ['-datetime_from', '-datetime_to', 'room']
         indexes = [
             models.Index(fields=['-datetime_from', '-datetime_to', ]),
-            models.Index(fields=['room', ]),
+            models.Index(fields=['room', 'datetime_to', 'datetime_from']),
         ]
 
     def full_clean(self, exclude=None, validate_unique=True):
-        # Чтобы не искать пересечения по всем записям, сначала фильтруем
-        # только по интересующему нас помещению
-        if not self.datetime_from:
-            raise ValidationError(
-                {'datetime_from': ('Формат не соответствует ISO')})
-        if not self.datetime_to:
-            raise ValidationError(
-                {'datetime_to': ('Формат не соответствует ISO')})
-        room_reservation = Reservation.objects.filter(room=self.room)
-        # Проверяем, что начало бронирования не попадает в занятый интервал
-        from_intersects = room_reservation.filter(
-            datetime_from__lte=self.datetime_from,
-            datetime_to__gte=self.datetime_from
-        ).count()
-        # Проверяем, что окончание бронирования не попадает в занятый интервал
-        to_intersects = room_reservation.filter(
-            datetime_from__lte=self.datetime_to,
-            datetime_to__gte=self.datetime_to
-        ).count()
-        # Проверяем, что новый интервал не включает в себя уже занятый интервал
-        includes_interval = room_reservation.filter(
-            datetime_from__gte=self.datetime_from,
-            datetime_to__lte=self.datetime_to
-        ).count()
-        incorrect_interval = self.datetime_to <= self.datetime_from
-        if from_intersects:
-            raise ValidationError(
-                {'datetime_from': ('Выбранное время занято. '
-                                   'Выберите более позднее время '
-                                   'для начала бронирования.')
-                 }
-            )
-        if to_intersects:
-            raise ValidationError(
-                {'datetime_to': ('Выбранное время занято. '
-                                 'Выберите более раннее время '
-                                 'для окончания бронирования.')
-                 }
-            )
-        if includes_interval:
-            raise ValidationError({'datetime_to': ('Выбранное время занято.')})
-        if incorrect_interval:
+        # Пересечения ищутся одним запросом по интересующему нас помещению,
+        # редактируемая бронь в поиске не участвует
+        check_reservation(self.room_id, self.datetime_from, self.datetime_to,
+                          exclude_pk=self.pk)
+
+    def __str__(self):
+        return f'{self.room}: {self.datetime_from}-{self.datetime_to}. ' \
+               f'{self.author} ({self.created})'
+
+
+class ReservationArchive(models.Model):
+    """
+    Прошедшие брони, перенесённые командой archive_reservations из
+    Reservation. Сохраняют id исходной брони, поэтому ссылки на неё
+    продолжают работать. Архивные брони не изменяются.
+    """
+    archived = True
+
+    id = models.IntegerField(primary_key=True)
+    room = models.ForeignKey(Room,
+                             on_delete=models.CASCADE,
+                             related_name='archived_reservations',
+                             verbose_name='Рабочее место',
+                             )
+    datetime_from = models.DateTimeField('Начало бронирования')
+    datetime_to = models.DateTimeField('Окончание бронирования')
+    created = models.DateTimeField('Дата бронирования')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='archived_reservations',
+                               verbose_name='Клиент',
+                               )
+    series = models.ForeignKey('ReservationSeries',
+                               on_delete=models.SET_NULL,
+                               related_name='archived_reservations',
+                               verbose_name='Серия',
+                               blank=True,
+                               null=True,
+                               )
+
+    class Meta:
+        ordering = ['-datetime_from', '-datetime_to', 'room']
+        indexes = [
+            models.Index(fields=['-datetime_from', '-datetime_to', ]),
+            models.Index(fields=['room', '-datetime_from']),
+            models.Index(fields=['author', '-datetime_from']),
+        ]
+
+    def __str__(self):
+        return f'{self.room}: {self.datetime_from}-{self.datetime_to}. ' \
+               f'{self.author} ({self.created}, архив)'
+
+
+class ReservationSeries(models.Model):
+    """
+    Повторяющееся бронирование. Хранит только правило повторения,
+    вхождения вычисляются лениво для запрошенного окна.
+    """
+    FREQUENCY_CHOICES = (
+        (DAILY, 'Ежедневно'),
+        (WEEKLY, 'Еженедельно'),
+    )
+
+    room = models.ForeignKey(Room,
+                             on_delete=models.CASCADE,
+                             related_name='series',
+                             verbose_name='Рабочее место',
+                             )
+    datetime_from = models.DateTimeField('Начало первого бронирования')
+    datetime_to = models.DateTimeField('Окончание первого бронирования')
+    frequency = models.CharField('Повторение',
+                                 max_length=10,
+                                 choices=FREQUENCY_CHOICES,
+                                 default=WEEKLY)
+    interval = models.PositiveSmallIntegerField('Интервал повторения',
+                                                default=1)
+    weekdays = models.CharField('Дни недели',
+                                max_length=20,
+                                blank=True,
+                                help_text='Номера дней через запятую, '
+                                          '0 - понедельник. По умолчанию '
+                                          'день первого бронирования')
+    until = models.DateTimeField('Повторять до')
+    # Начала вхождений, превращённых в отдельные брони, в формате ISO
+    excluded = models.TextField('Исключённые вхождения',
+                                blank=True,
+                                editable=False)
+    created = models.DateTimeField('Дата бронирования',
+                                   auto_now_add=True)
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               verbose_name='Клиент',
+                               )
+
+    class Meta:
+        ordering = ['room', 'datetime_from']
+        indexes = [
+            models.Index(fields=['room', 'until', 'datetime_from']),
+        ]
+
+    @property
+    def excluded_starts(self):
+        return {datetime.datetime.fromisoformat(start)
+                for start in self.excluded.split(',') if start}
+
+    def exclude(self, start):
+        """Исключает вхождение с началом start из правила."""
+        self.excluded = ','.join(sorted(
+            excluded.isoformat()
+            for excluded in self.excluded_starts | {start}))
+
+    def occurrences(self, window_from=None, window_to=None):
+        """Вхождения серии, пересекающиеся с окном."""
+        for start, end in expand(
+                self.datetime_from, self.datetime_to, self.frequency,
+                self.interval, parse_weekdays(self.weekdays), self.until,
+                window_from, window_to, self.excluded_starts):
+            yield Occurrence(self, start, end)
+
+    def validate_recurrence(self):
+        """Проверяет правило повторения без обращения к базе."""
+        if not self.datetime_from or not self.datetime_to or not self.until:
+            return
+        if self.datetime_to <= self.datetime_from:
             msg_error = 'Некорректный промежуток бронирования. ' \
                         'Время окончания раньше времени начала'
             raise ValidationError(
-                {'datetime_to': (msg_error), 'datetime_from': (msg_error)}
-            )
+                {'datetime_to': msg_error, 'datetime_from': msg_error})
+        if self.until < self.datetime_to:
+            raise ValidationError(
+                {'until': 'Серия должна заканчиваться после '
+                          'первого бронирования.'})
+        if self.interval < 1:
+            raise ValidationError({'interval': 'Интервал должен быть '
+                                               'не меньше 1.'})
+        try:
+            parse_weekdays(self.weekdays)
+        except ValueError as error:
+            raise ValidationError({'weekdays': str(error)})
+        limit = settings.RESERVATION_SERIES_MAX_OCCURRENCES
+        for number, _ in enumerate(self.occurrences()):
+            if number >= limit:
+                raise ValidationError(
+                    {'until': f'Серия длиннее {limit} вхождений.'})
+
+    def clean(self):
+        self.validate_recurrence()
+        if self.room_id and self.datetime_from and self.until:
+            conflict = find_series_conflict(self)
+            if conflict is not None:
+                raise ValidationError(series_conflict_errors(conflict))
 
     def __str__(self):
-        return f'{self.room}: {self.datetime_from}-{self.datetime_to}. ' \
-               f'{self.author} ({self.created})'
+        return f'{self.room}: {self.get_frequency_display()} ' \
+               f'{self.datetime_from}-{self.datetime_to} до {self.until}. ' \
+               f'{self.author}'
+
+
+class RoomUtilization(models.Model):
+    """
+    Занятость помещения за час: сколько секунд часа, начинающегося в hour,
+    занято бронями, включая архивные. Час дня и день недели в часовом
+    поясе проекта хранятся рядом, чтобы статистика по ним группировалась
+    без преобразования времени. Поддерживается фоновыми задачами после
+    изменения броней и пересчитывается командой rebuild_utilization.
+    Вхождения серий не учитываются: они не хранятся в базе.
+    """
+    room = models.ForeignKey(Room,
+                             on_delete=models.CASCADE,
+                             related_name='utilization',
+                             verbose_name='Рабочее место',
+                             )
+    hour = models.DateTimeField('Начало часа')
+    day_hour = models.PositiveSmallIntegerField('Час дня')
+    weekday = models.PositiveSmallIntegerField('День недели')
+    # Изменения складываются фоновыми задачами в любом порядке, и пока
+    # вычитание опережает прибавление, значение может быть отрицательным
+    seconds = models.IntegerField('Занято секунд', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['room', 'hour'], name='unique_room_hour')
+        ]
+        indexes = [
+            models.Index(fields=['hour', 'room', 'seconds']),
+        ]
+
+    def __str__(self):
+        return f'{self.room}: {self.hour} - {self.seconds} с'
+
+
+class ChangeVersion(models.Model):
+    """
+    Счётчик изменений броней. Строка с общей областью хранит глобальную
+    версию, строки помещений - глобальную версию их последнего изменения,
+    строка tokens - поколение кэшей токенов API. Позволяет кэшам в разных
+    процессах узнавать об изменениях одним запросом, не обращаясь к
+    таблице броней.
+    """
+    scope = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.scope}: {self.version}'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача в очереди DatabaseBackend (см. jobs): имя
+    зарегистрированной функции и её аргументы. Выполняется командой
+    run_jobs; выполненные задачи удаляются, исчерпавшие попытки остаются
+    со статусом failed.
+    """
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField('Задача', max_length=255)
+    kwargs = models.JSONField('Аргументы', default=dict)
+    status = models.CharField('Статус', max_length=16,
+                              choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Наибольшее число '
+                                                    'попыток')
+    run_at = models.DateTimeField('Выполнить не раньше')
+    # Обработчик, взявший задачу, и срок, после которого задачу может
+    # взять другой обработчик, если этот не закончил её
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()}, ' \
+               f'попыток: {self.attempts})'
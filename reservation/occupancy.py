@@ -0,0 +1,138 @@
+import datetime
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .availability import busy_intervals
+from .versions import changed_rooms, current_version
+
+DAY = datetime.timedelta(days=1)
+# Если изменилось слишком много помещений, дешевле перечитать дни целиком
+MAX_INCREMENTAL_ROOMS = 500
+
+
+def day_start(day):
+    return datetime.datetime.combine(day, datetime.time(),
+                                     tzinfo=datetime.timezone.utc)
+
+
+def days_between(datetime_from, datetime_to):
+    """Дни (UTC), которые задевает полуоткрытый интервал."""
+    day = datetime_from.astimezone(datetime.timezone.utc).date()
+    last = (datetime_to - datetime.timedelta(microseconds=1)).astimezone(
+        datetime.timezone.utc).date()
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+class RoomDay:
+    """Отсортированные по началу интервалы занятости помещения за день."""
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals):
+        intervals.sort()
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+
+    def is_busy(self, datetime_from, datetime_to):
+        # Брони одного помещения не пересекаются, поэтому концы отсортированы
+        # вместе с началами и достаточно проверить последний интервал,
+        # начавшийся до конца окна
+        position = bisect_left(self.starts, datetime_to)
+        return position > 0 and self.ends[position - 1] > datetime_from
+
+
+class OccupancyIndex:
+    """
+    Индекс занятости помещений по дням, живущий в памяти процесса.
+    Дни загружаются лениво для всех помещений сразу: один запрос броней и
+    один запрос серий на день.
+    Перед ответом индекс сверяет глобальную версию изменений и перечитывает
+    только изменившиеся помещения, поэтому остаётся согласованным с базой
+    при нескольких рабочих процессах.
+    """
+
+    def __init__(self, max_days=62):
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._version = None
+        self._days = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._days.clear()
+
+    def can_answer(self, datetime_from, datetime_to):
+        """
+        Можно ли ответить на запрос занятости из индекса: индекс включён,
+        интервал помещается в окно индекса и не уходит глубоко в прошлое.
+        """
+        if not settings.RESERVATION_OCCUPANCY_CACHE:
+            return False
+        if datetime_to <= timezone.now() - self.max_days * DAY:
+            return False
+        days = days_between(datetime_from, datetime_to)
+        return sum(1 for _ in days) <= self.max_days
+
+    def busy_rooms(self, datetime_from, datetime_to):
+        """Множество id помещений, занятых в интервале."""
+        days = list(days_between(datetime_from, datetime_to))
+        if len(days) > self.max_days:
+            raise ValueError('Интервал длиннее окна индекса занятости')
+        busy = set()
+        with self._lock:
+            self._sync()
+            for day in days:
+                for room_id, room_day in self._day(day).items():
+                    if room_id not in busy and room_day.is_busy(
+                            datetime_from, datetime_to):
+                        busy.add(room_id)
+        return busy
+
+    def _sync(self):
+        version = current_version()
+        if self._version is not None and version != self._version:
+            rooms = changed_rooms(self._version)
+            if len(rooms) > MAX_INCREMENTAL_ROOMS:
+                self._days.clear()
+            elif rooms and self._days:
+                self._reload(rooms)
+        self._version = version
+
+    def _day(self, day):
+        if day in self._days:
+            self._days.move_to_end(day)
+            return self._days[day]
+        start = day_start(day)
+        self._days[day] = {
+            room_id: RoomDay(intervals) for room_id, intervals
+            in busy_intervals(start, start + DAY).items()
+        }
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+        return self._days[day]
+
+    def _reload(self, rooms):
+        start = day_start(min(self._days))
+        end = day_start(max(self._days)) + DAY
+        fresh = busy_intervals(start, end, rooms)
+        for day, room_days in self._days.items():
+            start = day_start(day)
+            for room_id in rooms:
+                intervals = [
+                    (datetime_from, datetime_to)
+                    for datetime_from, datetime_to in fresh.get(room_id, ())
+                    if datetime_from < start + DAY and datetime_to > start
+                ]
+                if intervals:
+                    room_days[room_id] = RoomDay(intervals)
+                else:
+                    room_days.pop(room_id, None)
+
+
+occupancy = OccupancyIndex(max_days=settings.RESERVATION_OCCUPANCY_DAYS)
@@ -0,0 +1,230 @@
+import base64
+import binascii
+import json
+
+import coreapi
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Порядок Reservation.Meta.ordering, дополненный id до полного порядка
+RESERVATION_ORDERING = ('-datetime_from', '-datetime_to', 'room_id', 'id')
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, значения ключа) или None для неверного."""
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(
+            cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    if len(values) != len(RESERVATION_ORDERING):
+        return None
+    return direction, values
+
+
+def seek(ordering, values, forward=True):
+    """
+    Условие "строка идёт после ключа values в порядке ordering" (или
+    перед ним, если forward=False) для выборки по индексу без OFFSET.
+    """
+    query = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        query |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return query
+
+
+def field_value(obj, name):
+    """Значение поля записи: модели или словаря values()."""
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}'
+                 for field in ordering)
+
+
+class KeysetPage:
+    """Страница списка с курсорами на соседние страницы."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу сортировки вместо OFFSET: страница
+    читается одним запросом по индексу, и время ответа не зависит от
+    глубины страницы. Общее число записей не считается.
+    """
+
+    def __init__(self, queryset, per_page, ordering=RESERVATION_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+
+    def key(self, obj):
+        return [field_value(obj, field.lstrip('-'))
+                for field in self.ordering]
+
+    def fetch(self, queryset, ordering, condition, limit):
+        """Первые limit записей выборки в порядке ordering."""
+        queryset = queryset.order_by(*ordering)
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        return list(queryset[:limit])
+
+    def rows(self, ordering, condition, limit):
+        return self.fetch(self.queryset, ordering, condition, limit)
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        direction, values = position or (NEXT, None)
+        forward = direction == NEXT
+        ordering = (self.ordering if forward
+                    else reverse_ordering(self.ordering))
+        condition = None
+        if values is not None:
+            condition = seek(self.ordering, values, forward)
+        try:
+            # Лишняя запись показывает, есть ли страница дальше
+            object_list = self.rows(ordering, condition, self.per_page + 1)
+        except (ValidationError, ValueError, TypeError):
+            # Повреждённый курсор открывает первую страницу
+            return self.get_page()
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if not forward:
+            object_list.reverse()
+        has_next = has_more if forward else values is not None
+        has_previous = values is not None if forward else has_more
+        return KeysetPage(
+            object_list,
+            encode_cursor(NEXT, self.key(object_list[-1]))
+            if has_next and object_list else None,
+            encode_cursor(PREVIOUS, self.key(object_list[0]))
+            if has_previous and object_list else None,
+        )
+
+
+class ArchiveKeysetPaginator(KeysetPaginator):
+    """
+    KeysetPaginator по броням вместе с их архивом: страница собирается из
+    первых записей обеих выборок. Архив не читается, если страница целиком
+    заполнена бронями, начавшимися не раньше horizon: архивные брони
+    начинаются раньше и на неё не попадут.
+    """
+
+    def __init__(self, queryset, archived, horizon, per_page,
+                 ordering=RESERVATION_ORDERING):
+        super().__init__(queryset, per_page, ordering)
+        self.archived = archived
+        self.horizon = horizon
+
+    def rows(self, ordering, condition, limit):
+        object_list = self.fetch(self.queryset, ordering, condition, limit)
+        if (ordering == self.ordering and len(object_list) == limit
+                and field_value(object_list[-1], 'datetime_from')
+                >= self.horizon):
+            return object_list
+        object_list += self.fetch(self.archived, ordering, condition, limit)
+        # Устойчивая сортировка по полям с конца даёт порядок ordering
+        for field in reversed(ordering):
+            name = field.lstrip('-')
+            object_list.sort(key=lambda obj: field_value(obj, name),
+                             reverse=field.startswith('-'))
+        return object_list[:limit]
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация API поверх KeysetPaginator.
+    В отличие от CursorPagination из DRF не использует OFFSET внутри
+    групп записей с одинаковым временем начала.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = RESERVATION_ORDERING
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request),
+                                    self.ordering)
+        self.page = paginator.get_page(
+            request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                location='query',
+                required=False,
+                type='string',
+                description='Курсор страницы из ссылок next и previous',
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                location='query',
+                required=False,
+                type='integer',
+                description='Число записей на странице',
+            ),
+        ]
@@ -0,0 +1,62 @@
+import datetime
+from collections import namedtuple
+
+DAILY = 'daily'
+WEEKLY = 'weekly'
+
+Occurrence = namedtuple('Occurrence', 'series datetime_from datetime_to')
+
+
+def parse_weekdays(value):
+    """
+    Разбирает дни недели из строки вида '0,2,4' (0 - понедельник).
+    Бросает ValueError при неверном формате.
+    """
+    days = {int(day) for day in value.split(',') if day.strip()}
+    if any(day < 0 or day > 6 for day in days):
+        raise ValueError('День недели должен быть числом от 0 до 6')
+    return sorted(days)
+
+
+def expand(datetime_from, datetime_to, frequency, interval, weekdays, until,
+           window_from=None, window_to=None, excluded=()):
+    """
+    Лениво перечисляет вхождения повторяющейся брони как пары (начало,
+    конец). Вхождения длятся столько же, сколько [datetime_from,
+    datetime_to), начинаются в то же время суток не раньше datetime_from
+    и заканчиваются не позже until. Если задано окно, перебор начинается
+    сразу с нужного периода и останавливается на конце окна, поэтому
+    стоимость зависит от размера окна, а не от длины серии.
+    """
+    duration = datetime_to - datetime_from
+    if frequency == DAILY:
+        period = datetime.timedelta(days=interval)
+        base = datetime_from
+        offsets = [datetime.timedelta()]
+    else:
+        period = datetime.timedelta(weeks=interval)
+        # Начало недели первого вхождения с тем же временем суток
+        base = datetime_from - datetime.timedelta(
+            days=datetime_from.weekday())
+        offsets = [datetime.timedelta(days=day)
+                   for day in (weekdays or [datetime_from.weekday()])]
+    last_start = until - duration
+    if window_to is not None:
+        last_start = min(last_start,
+                         window_to - datetime.timedelta(microseconds=1))
+    lower = datetime_from
+    if window_from is not None:
+        lower = max(lower, window_from - duration)
+    number = max(0, (lower - base) // period)
+    while base + number * period <= last_start:
+        period_start = base + number * period
+        for offset in offsets:
+            start = period_start + offset
+            if start > last_start:
+                break
+            if start < datetime_from or start in excluded:
+                continue
+            if window_from is not None and start + duration <= window_from:
+                continue
+            yield start, start + duration
+        number += 1
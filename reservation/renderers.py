@@ -0,0 +1,29 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .instrumentation import prometheus_text
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Формат построчного JSON. Выгрузка отдаётся потоковым ответом в обход
+    рендерера; через него проходят только ответы с ошибкой, одной строкой
+    JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return JSONRenderer().render(data) + b'\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Текстовый формат замеров Prometheus."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return prometheus_text(data)
@@ -0,0 +1,97 @@
+"""
+Текущее состояние помещений, хранимое в самих помещениях: текущая бронь,
+время её окончания и начало следующей брони. Состояние пересчитывается
+одним запросом UPDATE с подзапросами при изменении броней помещения и
+командой sweep_room_status, когда проходит время окончания текущей или
+начала следующей брони. Вхождения серий в состояние не входят.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .conflicts import lock_writes
+from .models import Reservation, Room
+from .versions import rooms_changed
+
+STATUS_FIELDS = ('current_reservation_id', 'busy_until',
+                 'next_reservation_start')
+
+
+def status_expressions(now):
+    """
+    Подзапросы состояния для помещения OuterRef('pk'). Брони помещения не
+    пересекаются, поэтому порядок по окончанию совпадает с порядком по
+    началу и поиск идёт по индексу (room, datetime_to, datetime_from).
+    """
+    future = Reservation.objects.filter(
+        room=OuterRef('pk'), datetime_to__gt=now).order_by('datetime_to')
+    current = future.filter(datetime_from__lte=now)
+    upcoming = future.filter(datetime_from__gt=now)
+    return {
+        'current_reservation_id': Subquery(current.values('pk')[:1]),
+        'busy_until': Subquery(current.values('datetime_to')[:1]),
+        'next_reservation_start': Subquery(
+            upcoming.values('datetime_from')[:1]),
+    }
+
+
+def refresh_status(rooms, now=None):
+    """Пересчитывает состояние помещений rooms одним запросом."""
+    return rooms.update(**status_expressions(now or timezone.now()))
+
+
+def reservations_changed(room_ids, ends, now=None):
+    """
+    Пересчитывает состояние помещений room_ids после изменения броней с
+    окончаниями ends. Брони, закончившиеся до now, на состояние не
+    влияют, и для них запроса нет.
+    """
+    now = now or timezone.now()
+    if any(datetime_to > now for datetime_to in ends):
+        refresh_status(Room.objects.filter(pk__in=room_ids), now)
+
+
+def due_rooms(now):
+    """Помещения, чьё состояние устарело: бронь закончилась или началась."""
+    return Room.objects.filter(Q(busy_until__lte=now)
+                               | Q(next_reservation_start__lte=now))
+
+
+def refresh_rooms(rooms, now=None):
+    """
+    Пересчитывает состояние помещений rooms и отмечает их изменившимися.
+    Помещения блокируются до пересчёта, так что пересчёт ждёт
+    одновременных броней этих помещений и видит их.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lock_writes()
+        room_ids = list(rooms.select_for_update().values_list('pk',
+                                                               flat=True))
+        if room_ids:
+            refresh_status(Room.objects.filter(pk__in=room_ids), now)
+            rooms_changed(room_ids)
+    return room_ids
+
+
+def sweep(now=None):
+    """Продвигает состояние устаревших помещений; возвращает их id."""
+    now = now or timezone.now()
+    return refresh_rooms(due_rooms(now), now)
+
+
+def stale_rooms(rooms, now=None):
+    """
+    Помещения rooms, чьё хранимое состояние расходится с бронями, одним
+    запросом: словарь {id: (хранимое, ожидаемое)}.
+    """
+    expected = {f'expected_{name}': expression for name, expression
+                in status_expressions(now or timezone.now()).items()}
+    stale = {}
+    for row in rooms.annotate(**expected).values('pk', *STATUS_FIELDS,
+                                                 *expected):
+        stored = tuple(row[name] for name in STATUS_FIELDS)
+        actual = tuple(row[name] for name in expected)
+        if stored != actual:
+            stale[row['pk']] = stored, actual
+    return stale
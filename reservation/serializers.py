@@ -1,6 +1,10 @@
+from copy import copy
+
+from django.core.exceptions import ValidationError
 from rest_framework import serializers
 
-from .models import Reservation, Room, User
+from .conflicts import check_interval
+from .models import Building, Reservation, ReservationSeries, Room, User
 
 
 class ReservationSerializer(serializers.ModelSerializer):
@@ -13,13 +17,95 @@ class ReservationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         model = Reservation
 
+    def validate(self, attrs):
+        # Пересечения проверяются при сохранении под блокировкой помещения
+        instance = self.instance
+        try:
+            check_interval(
+                attrs.get('datetime_from',
+                          getattr(instance, 'datetime_from', None)),
+                attrs.get('datetime_to',
+                          getattr(instance, 'datetime_to', None)),
+            )
+        except ValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+        return attrs
+
+
+class BulkReservationSerializer(serializers.Serializer):
+    """
+    Бронь из пакетного запроса. Помещение принимается как id и
+    проверяется вместе со всем пакетом, чтобы не делать запрос на бронь.
+    """
+    room = serializers.IntegerField(min_value=1)
+    datetime_from = serializers.DateTimeField()
+    datetime_to = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        try:
+            check_interval(attrs['datetime_from'], attrs['datetime_to'])
+        except ValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+        return attrs
+
+
+class ReservationSeriesSerializer(serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(
+        read_only=True,
+        slug_field='username'
+    )
 
-class RoomSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
+        read_only_fields = ('excluded',)
+        model = ReservationSeries
+
+    def validate(self, attrs):
+        # Пересечения проверяются при сохранении под блокировкой помещения
+        series = copy(self.instance) if self.instance else ReservationSeries()
+        for name, value in attrs.items():
+            setattr(series, name, value)
+        try:
+            series.validate_recurrence()
+        except ValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+        return attrs
+
+
+class OccurrenceSerializer(serializers.Serializer):
+    datetime_from = serializers.DateTimeField()
+    datetime_to = serializers.DateTimeField()
+
+
+class RoomSerializer(serializers.ModelSerializer):
+    class Meta:
+        fields = ('id', 'name', 'slug', 'description', 'building',
+                  'current_reservation', 'busy_until',
+                  'next_reservation_start')
         model = Room
 
 
+class RoomScheduleSerializer(RoomSerializer):
+    """Помещение с бронями окна, загруженными в window_reservations."""
+    reservations = ReservationSerializer(many=True, read_only=True,
+                                         source='window_reservations')
+
+    class Meta(RoomSerializer.Meta):
+        fields = RoomSerializer.Meta.fields + ('reservations',)
+
+
+class BuildingSerializer(serializers.ModelSerializer):
+    rooms = RoomSerializer(many=True, read_only=True, source='room')
+
+    class Meta:
+        fields = ('id', 'name', 'rooms')
+        model = Building
+
+
+class BuildingScheduleSerializer(BuildingSerializer):
+    rooms = RoomScheduleSerializer(many=True, read_only=True, source='room')
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .archive import archiving
+from .authentication import invalidate_tokens
+from .ical import forget_reservation
+from .instrumentation import record_query
+from .models import Building, Reservation, ReservationSeries, Room, User
+from .room_status import reservations_changed
+from .utilization import record_intervals
+from .versions import bump_global, bump_rooms, rooms_changed
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Обёртки живут в объекте соединения и переживают переподключения
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Соединение DB-API в обход execute_wrappers: настройка соединения не
+    # входит в число запросов представления
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def loaded_interval(instance):
+    # Поля читаются из __dict__: обращение к отложенному полю (only())
+    # загрузило бы его отдельным запросом
+    values = instance.__dict__
+    interval = (values.get('room_id'), values.get('datetime_from'),
+                values.get('datetime_to'))
+    return interval if None not in interval else None
+
+
+@receiver(post_init, sender=Reservation)
+@receiver(post_init, sender=ReservationSeries)
+def remember_room(sender, instance, **kwargs):
+    # Помещение и время, с которыми бронь была загружена: при переносе
+    # брони меняется занятость обоих помещений
+    instance._loaded_room_id = instance.__dict__.get('room_id')
+    instance._loaded_interval = loaded_interval(instance)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_save, sender=ReservationSeries)
+def reservation_saved(sender, instance, created=False, **kwargs):
+    rooms_changed({instance.room_id, instance._loaded_room_id})
+    interval = loaded_interval(instance)
+    previous = None if created else instance._loaded_interval
+    if sender is Reservation:
+        forget_reservation(instance.pk)
+    if sender is Reservation and interval != previous:
+        record_intervals(added=[interval] if interval else [],
+                         removed=[previous] if previous else [])
+        changed = [item for item in (interval, previous) if item]
+        reservations_changed({room_id for room_id, _, _ in changed},
+                             [datetime_to for _, _, datetime_to in changed])
+    instance._loaded_room_id = instance.room_id
+    instance._loaded_interval = interval
+
+
+@receiver(post_delete, sender=Reservation)
+@receiver(post_delete, sender=ReservationSeries)
+def reservation_deleted(sender, instance, **kwargs):
+    if archiving.get():
+        # Перенос в архив сам отмечает изменившиеся помещения, по разу на
+        # порцию, а в почасовой занятости архивные брони остаются
+        return
+    rooms_changed({instance.room_id, instance._loaded_room_id})
+    if sender is Reservation:
+        forget_reservation(instance.pk)
+    if sender is Reservation and instance._loaded_interval:
+        record_intervals(removed=[instance._loaded_interval])
+        room_id, _, datetime_to = instance._loaded_interval
+        reservations_changed({room_id}, [datetime_to])
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, instance, **kwargs):
+    # Список помещений и их брони кэшируются по версии изменений
+    rooms_changed({instance.pk})
+
+
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Building)
+def building_changed(sender, instance, **kwargs):
+    # Название здания входит в ленты его помещений; помещения удаляемого
+    # здания к post_delete уже удалены и сообщили об изменении сами
+    names_changed(Room.objects.filter(building=instance.pk).values_list(
+        'pk', flat=True))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    invalidate_tokens(key=instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, signal, created=False,
+                 update_fields=None, **kwargs):
+    # Кэш хранит пользователя вместе с токеном: деактивация, смена прав
+    # и удаление должны действовать сразу. Время входа, которое
+    # сохраняется при каждом входе на сайт, на токены не влияет
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_tokens(user_id=instance.pk)
+    # Имя автора входит в брони и ленты помещений; у нового пользователя
+    # броней нет, брони удаляемого сообщают об изменении сами
+    if created or signal is post_delete:
+        return
+    names_changed(
+        Reservation.objects.filter(author=instance.pk).order_by()
+        .values_list('room_id', flat=True)
+        .union(ReservationSeries.objects.filter(author=instance.pk)
+               .order_by().values_list('room_id', flat=True)))
+
+
+def names_changed(room_ids):
+    """
+    Сообщает кэшам об изменении названий, которые выводятся вместе с
+    бронями помещений room_ids. Брони не менялись, поэтому подписчики
+    потока событий ничего не получают. Без помещений меняется только
+    глобальная версия: по ней кэшируются здания и ленты пользователей.
+    """
+    room_ids = set(room_ids)
+    if room_ids:
+        bump_rooms(room_ids)
+    else:
+        transaction.on_commit(bump_global)
@@ -0,0 +1,128 @@
+"""
+Свободное и занятое время помещений на сетке заданного шага. Занятые
+интервалы помещения сортируются один раз, дальше всё считается одним
+проходом по ним.
+"""
+import datetime
+import heapq
+from itertools import islice
+
+from django.conf import settings
+
+from .availability import parse_window
+
+DEFAULT_GRANULARITY = 30
+DEFAULT_LIMIT = 10
+
+
+def parse_slot_params(query_params):
+    """
+    Окно, шаг сетки, длительность слота (или None) и число слотов из
+    параметров запроса. Бросает ValueError с описанием ошибки.
+    """
+    datetime_from, datetime_to = parse_window(query_params)
+    if not datetime_from or not datetime_to:
+        raise ValueError('Нужны datetime_from и datetime_to.')
+    max_days = settings.RESERVATION_SLOTS_MAX_DAYS
+    if datetime_to - datetime_from > datetime.timedelta(days=max_days):
+        raise ValueError(f'Окно длиннее {max_days} дней.')
+    # Шаг и длительность не длиннее окна: иначе слотов нет, а огромное
+    # число минут не помещается в timedelta
+    window_minutes = (datetime_to - datetime_from) // datetime.timedelta(
+        minutes=1)
+    granularity = int(query_params.get('granularity', DEFAULT_GRANULARITY))
+    if not 1 <= granularity <= max(window_minutes, 1):
+        raise ValueError('granularity должен быть от 1 до длины окна в '
+                         'минутах.')
+    duration = query_params.get('duration')
+    if duration is not None:
+        duration = int(duration)
+        if not 1 <= duration <= window_minutes:
+            raise ValueError('duration должен быть от 1 до длины окна в '
+                             'минутах.')
+        duration = datetime.timedelta(minutes=duration)
+    limit = int(query_params.get('limit', DEFAULT_LIMIT))
+    if not 1 <= limit <= settings.RESERVATION_SLOTS_MAX_LIMIT:
+        raise ValueError('limit должен быть от 1 до '
+                         f'{settings.RESERVATION_SLOTS_MAX_LIMIT}.')
+    return (datetime_from, datetime_to,
+            datetime.timedelta(minutes=granularity), duration, limit)
+
+
+def merge_busy(intervals, window_from, window_to):
+    """
+    Занятые интервалы, обрезанные по окну, с пересекающимися и
+    стыкующимися слитыми в один, по порядку.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        start, end = max(start, window_from), min(end, window_to)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def snap(moment, origin, step, up=False):
+    """Граница сетки с началом origin и шагом step не позже moment."""
+    cells = (moment - origin) // step
+    if up and origin + cells * step < moment:
+        cells += 1
+    return origin + cells * step
+
+
+def grid(busy, window_from, window_to, step):
+    """
+    Календарная сетка окна: ячейки шага step, хотя бы частично занятые,
+    сливаются в занятые интервалы, остальные - в свободные. Возвращает
+    тройки (начало, конец, занято) подряд от начала до конца окна.
+    """
+    cells = []
+    cursor = window_from
+    for start, end in busy:
+        start = snap(start, window_from, step)
+        end = min(snap(end, window_from, step, up=True), window_to)
+        if cells and cells[-1][2] and start <= cells[-1][1]:
+            # Занятые интервалы слились после выравнивания по сетке
+            cells[-1] = (cells[-1][0], max(cells[-1][1], end), True)
+        else:
+            if start > cursor:
+                cells.append((cursor, start, False))
+            cells.append((start, end, True))
+        cursor = cells[-1][1]
+    if cursor < window_to:
+        cells.append((cursor, window_to, False))
+    return cells
+
+
+def free_slots(busy, window_from, window_to, step, duration):
+    """
+    Свободные интервалы длиной duration с началами на сетке шага step по
+    порядку; генератор, поэтому первые слоты не требуют обхода всего окна.
+    """
+    cursor = window_from
+    for start, end in [*busy, (window_to, window_to)]:
+        slot = snap(cursor, window_from, step, up=True)
+        while slot + duration <= start:
+            yield slot, slot + duration
+            slot += step
+        cursor = max(cursor, end)
+
+
+def first_free_slots(busy_by_room, window_from, window_to, step, duration,
+                     limit):
+    """
+    Первые limit свободных слотов среди помещений: тройки (начало,
+    помещение, конец) по времени начала, при равенстве - по id помещения.
+    """
+    def room_slots(room_id, busy):
+        for start, end in free_slots(busy, window_from, window_to, step,
+                                     duration):
+            yield start, room_id, end
+
+    return list(islice(heapq.merge(*(
+        room_slots(room_id, busy) for room_id, busy in busy_by_room.items()
+    )), limit))
@@ -0,0 +1,134 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from rest_framework import exceptions
+
+from .async_views import run_db
+from .authentication import CachedTokenAuthentication
+from .events import broker, room_states, state_records
+
+EVENTS_PATH = '/api/v1/events/'
+# Комментарий, который раз в HEARTBEAT секунд не даёт прокси закрыть
+# простаивающее соединение
+HEARTBEAT = 15
+
+
+def token_user(headers, query):
+    """
+    Пользователь по токену из заголовка Authorization или параметра token:
+    EventSource в браузере не умеет передавать заголовки.
+    """
+    authorization = headers.get(b'authorization', b'').split()
+    if authorization and authorization[0].lower() == b'token':
+        if len(authorization) != 2:
+            raise exceptions.AuthenticationFailed()
+        key = authorization[1].decode('latin1')
+    elif query.get('token'):
+        key = query['token'][-1]
+    else:
+        raise exceptions.NotAuthenticated()
+    user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    return user
+
+
+def ids(query, name):
+    if name not in query:
+        return None
+    return {int(value) for values in query[name]
+            for value in values.split(',') if value}
+
+
+def event(name, data):
+    return (f'event: {name}\ndata: '
+            f'{json.dumps(data, ensure_ascii=False)}\n\n').encode()
+
+
+async def respond(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps(data, ensure_ascii=False).encode(),
+    })
+
+
+async def events_app(scope, receive, send):
+    """
+    Поток занятости помещений в формате Server-Sent Events:
+    GET /api/v1/events/?room=1,2&building=3&token=<токен>.
+    Первым приходит событие snapshot с состоянием всех выбранных помещений,
+    затем события rooms с изменившимися помещениями, не чаще раза за такт
+    брокера. Без room и building - все помещения.
+    Django 3.1 не умеет отдавать потоковые ответы из асинхронных
+    представлений, поэтому поток обслуживается отдельным ASGI-приложением.
+    """
+    if scope['method'] != 'GET':
+        await respond(send, 405, {'detail': 'Метод не разрешён.'})
+        return
+    headers = dict(scope['headers'])
+    query = parse_qs(scope['query_string'].decode('latin1'))
+    try:
+        rooms, buildings = ids(query, 'room'), ids(query, 'building')
+    except ValueError:
+        await respond(send, 400, {'detail': 'Неверный id помещения или '
+                                            'здания.'})
+        return
+    try:
+        await run_db(token_user, headers, query)
+    except exceptions.APIException as error:
+        await respond(send, error.status_code, {'detail': str(error.detail)})
+        return
+
+    subscription = broker.subscribe(rooms, buildings)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        states = await run_db(room_states, rooms, buildings)
+        broker.track(states)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                # nginx не должен буферизовать поток
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body',
+                    'body': event('snapshot', state_records(states)),
+                    'more_body': True})
+        while not disconnected.done():
+            changes = asyncio.ensure_future(
+                subscription.changes(HEARTBEAT))
+            await asyncio.wait({changes, disconnected},
+                               return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                changes.cancel()
+                break
+            states = changes.result()
+            body = (event('rooms', state_records(states)) if states
+                    else b': ping\n\n')
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def route_events(application):
+    """Направляет запросы потока событий в events_app, остальные - в Django."""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+            await events_app(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return router
@@ -0,0 +1,65 @@
+import datetime
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from reservation.archive import archive_batches
+from reservation.conflicts import find_batch_conflicts, find_conflict
+from reservation.models import (Building, Reservation, ReservationArchive,
+                                Room, User)
+
+
+@patch('reservation.archive.rooms_changed')
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.room = Room.objects.create(
+            name='r', slug='r', building=Building.objects.create(name='b'))
+        cls.now = timezone.now()
+
+    def reservation(self, days):
+        datetime_from = self.now + datetime.timedelta(days=days)
+        return Reservation.objects.create(
+            room=self.room, author=self.author, datetime_from=datetime_from,
+            datetime_to=datetime_from + datetime.timedelta(hours=1))
+
+    def test_moved_into_past_during_batch(self, rooms_changed):
+        moved = self.reservation(1)
+        past = self.reservation(-2)
+        bulk_create = ReservationArchive.objects.bulk_create
+
+        def move_and_copy(objs):
+            # Бронь переносят в прошлое, пока порция копируется в архив
+            Reservation.objects.filter(pk=moved.pk).update(
+                datetime_from=self.now - datetime.timedelta(days=3),
+                datetime_to=self.now - datetime.timedelta(days=3, hours=-1))
+            return bulk_create(objs)
+
+        with patch.object(ReservationArchive.objects, 'bulk_create',
+                          side_effect=move_and_copy):
+            self.assertEqual(next(archive_batches(self.now, 100)), 1)
+        self.assertEqual(
+            list(ReservationArchive.objects.values_list('pk', flat=True)),
+            [past.pk])
+        self.assertTrue(Reservation.objects.filter(pk=moved.pk).exists())
+
+
+class ArchiveConflictTests(TestCase):
+    """Пакет броней проверяется по архиву так же, как одна бронь."""
+
+    def test_batch_overlaps_archived(self):
+        room = Room.objects.create(
+            name='r', slug='r', building=Building.objects.create(name='b'))
+        datetime_from = timezone.now() - datetime.timedelta(days=365)
+        datetime_to = datetime_from + datetime.timedelta(hours=1)
+        archived = ReservationArchive.objects.create(
+            id=1, room=room, author=User.objects.create(username='author'),
+            datetime_from=datetime_from, datetime_to=datetime_to,
+            created=datetime_from)
+        self.assertEqual(find_conflict(room.pk, datetime_from,
+                                       datetime_to).pk, archived.pk)
+        self.assertEqual(
+            find_batch_conflicts([(room.pk, datetime_from, datetime_to)]),
+            {0: ('reservation', archived.pk)})
@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+import threading
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import AsyncClient, Client, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from reservation.jobs import InMemoryBackend
+from reservation.models import Building, Room, User
+
+
+@patch('reservation.jobs.backend', InMemoryBackend())
+@override_settings(RESERVATION_THROTTLE_ENABLED=False)
+class AsyncViewTests(TransactionTestCase):
+    """
+    Асинхронные представления отвечают так же, как синхронные, а
+    long-poll дожидается изменения. Запросы к базе идут из потоков пула.
+    """
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Потокам нужна тестовая база в файле')
+        user = User.objects.create(username='author')
+        self.token = Token.objects.create(user=user).key
+        building = Building.objects.create(name='b')
+        self.room = Room.objects.create(name='r', slug='r', building=building)
+        self.start = timezone.now() + datetime.timedelta(days=1)
+
+    def booking(self, hours=0):
+        datetime_from = self.start + datetime.timedelta(hours=hours)
+        return {'room': self.room.pk,
+                'datetime_from': datetime_from.isoformat(),
+                'datetime_to': (datetime_from
+                                + datetime.timedelta(hours=1)).isoformat()}
+
+    def create_sync(self):
+        try:
+            Client().post('/api/v1/reservations/', self.booking(),
+                          content_type='application/json',
+                          HTTP_AUTHORIZATION=f'Token {self.token}')
+        finally:
+            connection.close()
+
+    async def create(self, client):
+        return await client.post(
+            '/api/v1/async/reservations/', self.booking(),
+            content_type='application/json',
+            AUTHORIZATION=f'Token {self.token}')
+
+    async def test_create_and_conflict(self):
+        client = AsyncClient()
+        self.assertEqual((await self.create(client)).status_code, 201)
+        self.assertEqual((await self.create(client)).status_code, 409)
+        response = await client.post('/api/v1/async/reservations/', {},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_same_as_sync(self):
+        sync = Client(HTTP_AUTHORIZATION=f'Token {self.token}')
+        response = sync.post('/api/v1/reservations/', self.booking(),
+                             content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        for path in (f'rooms/{self.room.pk}/', 'rooms/'):
+            with self.subTest(path=path):
+                self.assertEqual(
+                    sync.get(f'/api/v1/async/{path}').json(),
+                    sync.get(f'/api/v1/{path}').json())
+
+    async def test_long_poll(self):
+        client = AsyncClient()
+        path = f'/api/v1/async/rooms/{self.room.pk}/'
+        headers = {'AUTHORIZATION': f'Token {self.token}'}
+        etag = (await client.get(path, **headers))['ETag']
+        unchanged = await client.get(f'{path}?wait=0.2',
+                                     IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(unchanged.status_code, 304)
+
+        # Изменение приходит из другого потока, как из другого процесса
+        writer = threading.Timer(0.3, self.create_sync)
+        writer.start()
+        changed = await client.get(f'{path}?wait=10', IF_NONE_MATCH=etag,
+                                   **headers)
+        await asyncio.get_running_loop().run_in_executor(None, writer.join)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(len(changed.json()['results']), 1)
+
+    async def test_malformed_wait(self):
+        client = AsyncClient()
+        path = f'/api/v1/async/rooms/{self.room.pk}/'
+        for wait in ('nan', 'inf', 'abc'):
+            with self.subTest(wait=wait):
+                response = await client.get(
+                    f'{path}?wait={wait}', IF_NONE_MATCH='"etag"',
+                    AUTHORIZATION=f'Token {self.token}')
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+from django.test import TransactionTestCase
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from reservation.authentication import CachedTokenAuthentication, token_cache
+from reservation.models import User
+
+
+class CachedTokenAuthenticationTests(TransactionTestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create(username='author')
+        self.key = Token.objects.create(user=self.user).key
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.key)
+
+    def test_cached_token_reads_generation_only(self):
+        self.authenticate()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    def test_other_process_sees_deactivation(self):
+        self.authenticate()
+        # Другой процесс: его кэш не очищается напрямую, только через
+        # поколение в таблице версий
+        with patch.object(token_cache, 'evict'):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    def test_other_process_sees_deleted_token(self):
+        self.authenticate()
+        with patch.object(token_cache, 'evict'):
+            Token.objects.filter(key=self.key).delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
@@ -0,0 +1,42 @@
+import datetime
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.utils import timezone
+from django.utils.http import http_date
+
+from reservation.caching import not_modified, set_validators
+
+
+class ConditionalGetTests(SimpleTestCase):
+    def setUp(self):
+        self.updated = timezone.now() - datetime.timedelta(minutes=1)
+
+    def request(self, updated):
+        response = HttpResponse()
+        set_validators(response, '"tag"', updated)
+        return RequestFactory().get(
+            '/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_unchanged_is_not_modified(self):
+        request = self.request(self.updated)
+        self.assertTrue(not_modified(request, '"other"', self.updated))
+
+    def test_later_change_is_modified(self):
+        request = self.request(self.updated)
+        self.assertFalse(not_modified(
+            request, '"other"', self.updated + datetime.timedelta(seconds=1)))
+
+    def test_current_second_has_no_last_modified(self):
+        # В текущую секунду ещё может попасть изменение, неотличимое по
+        # Last-Modified с точностью до секунды
+        response = HttpResponse()
+        set_validators(response, '"tag"', timezone.now())
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(response['ETag'], '"tag"')
+
+    def test_if_none_match_wins(self):
+        request = RequestFactory().get(
+            '/', HTTP_IF_NONE_MATCH='"tag"',
+            HTTP_IF_MODIFIED_SINCE=http_date(0))
+        self.assertTrue(not_modified(request, '"tag"', self.updated))
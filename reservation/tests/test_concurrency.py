@@ -0,0 +1,80 @@
+import datetime
+import random
+import threading
+from collections import Counter
+from unittest.mock import patch
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.conflicts import overlapping
+from reservation.jobs import InMemoryBackend
+from reservation.models import Building, Reservation, Room, User
+
+THREADS = 8
+ATTEMPTS = 10
+SLOTS = 6
+
+
+@patch('reservation.jobs.backend', InMemoryBackend())
+@override_settings(RESERVATION_THROTTLE_ENABLED=False)
+class ConcurrentBookingTests(TransactionTestCase):
+    """Одновременные брони из потоков не дают пересечений."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Потокам нужна тестовая база в файле')
+        self.author = User.objects.create(username='author')
+        building = Building.objects.create(name='b')
+        self.rooms = [
+            Room.objects.create(name=f'r{i}', slug=f'r{i}', building=building)
+            for i in range(2)
+        ]
+        self.start = timezone.now().replace(
+            minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
+
+    def book(self, statuses, guard, seed):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        choice = random.Random(seed)
+        try:
+            for _ in range(ATTEMPTS):
+                # Сдвиг на полчаса: конкурируют и частично пересекающиеся
+                # брони
+                datetime_from = self.start + datetime.timedelta(
+                    minutes=30 * choice.randrange(SLOTS * 2))
+                response = client.post('/api/v1/reservations/', {
+                    'room': choice.choice(self.rooms).pk,
+                    'datetime_from': datetime_from.isoformat(),
+                    'datetime_to': (datetime_from + datetime.timedelta(
+                        hours=1)).isoformat(),
+                }, format='json')
+                with guard:
+                    statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    def test_no_overlaps(self):
+        statuses = Counter()
+        guard = threading.Lock()
+        threads = [threading.Thread(target=self.book,
+                                    args=(statuses, guard, seed))
+                   for seed in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(statuses.values()), THREADS * ATTEMPTS)
+        self.assertEqual(set(statuses) - {201, 409}, set(), statuses)
+        self.assertGreater(statuses[409], 0)
+        clashes = overlapping(
+            Reservation.objects.filter(room=OuterRef('room')),
+            OuterRef('datetime_from'), OuterRef('datetime_to')
+        ).exclude(pk=OuterRef('pk'))
+        self.assertFalse(Reservation.objects.filter(Exists(clashes)).exists())
+        self.assertEqual(Reservation.objects.count(), statuses[201])
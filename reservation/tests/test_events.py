@@ -0,0 +1,61 @@
+import datetime
+from unittest.mock import patch
+
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.archive import archive_batches
+from reservation.events import broker
+from reservation.jobs import InMemoryBackend
+from reservation.models import Building, Reservation, Room, User
+from reservation.room_status import sweep
+
+
+@patch('reservation.jobs.backend', InMemoryBackend())
+@override_settings(RESERVATION_THROTTLE_ENABLED=False)
+class PublishTests(TransactionTestCase):
+    """Подписчики потока событий узнают о каждом пути изменения броней."""
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        building = Building.objects.create(name='b')
+        self.room = Room.objects.create(name='r', slug='r', building=building)
+        self.now = timezone.now()
+        patcher = patch.object(broker, 'publish')
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self):
+        return {room for call in self.publish.call_args_list
+                for room in call.args[0]}
+
+    def test_bulk_booking(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.post('/api/v1/reservations/bulk/', [{
+            'room': self.room.pk,
+            'datetime_from': self.now + datetime.timedelta(hours=1),
+            'datetime_to': self.now + datetime.timedelta(hours=2),
+        }], format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.published(), {self.room.pk})
+
+    def test_archiving(self):
+        Reservation.objects.create(
+            room=self.room, author=self.author,
+            datetime_from=self.now - datetime.timedelta(days=2),
+            datetime_to=self.now - datetime.timedelta(days=1))
+        self.publish.reset_mock()
+        self.assertEqual(list(archive_batches(self.now, 100)), [1])
+        self.assertEqual(self.published(), {self.room.pk})
+
+    def test_status_sweep(self):
+        Reservation.objects.create(
+            room=self.room, author=self.author, datetime_from=self.now,
+            datetime_to=self.now + datetime.timedelta(minutes=5))
+        self.publish.reset_mock()
+        self.assertEqual(sweep(self.now + datetime.timedelta(minutes=10)),
+                         [self.room.pk])
+        self.assertEqual(self.published(), {self.room.pk})
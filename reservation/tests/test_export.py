@@ -0,0 +1,46 @@
+import datetime
+import json
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.models import Building, Reservation, Room, User
+
+PATH = '/api/v1/reservations/export/'
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        room = Room.objects.create(name='r', slug='r',
+                                   building=Building.objects.create(name='b'))
+        now = timezone.now()
+        cls.reservation = Reservation.objects.create(
+            room=room, author=cls.author,
+            datetime_from=now, datetime_to=now + datetime.timedelta(hours=1))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_ndjson(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.get(PATH)
+        self.assertEqual(response.status_code, 200)
+        [line] = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(line)['id'], self.reservation.pk)
+
+    def assert_error(self, response, status_code):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        self.assertTrue(response.content.endswith(b'\n'))
+        self.assertIn('detail', json.loads(response.content))
+
+    def test_unauthenticated_error(self):
+        self.assert_error(self.client.get(PATH), 401)
+
+    def test_bad_filter_error(self):
+        self.client.force_authenticate(self.author)
+        self.assert_error(self.client.get(PATH, {'room': 'abc'}), 400)
@@ -0,0 +1,75 @@
+import datetime
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.fast_serializers import (reservation_records,
+                                          reservation_values, room_records,
+                                          room_values)
+from reservation.models import (Building, Reservation, ReservationSeries,
+                                Room, User)
+from reservation.room_status import refresh_status
+from reservation.serializers import ReservationSerializer, RoomSerializer
+
+
+class FastSerializerTests(TestCase):
+    """Записи из values() совпадают с выводом сериализаторов моделей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        building = Building.objects.create(name='b')
+        cls.busy = Room.objects.create(name='busy', slug='busy',
+                                       building=building, description='d')
+        cls.free = Room.objects.create(name='free', slug='free',
+                                       building=building)
+        now = timezone.now()
+        series = ReservationSeries.objects.create(
+            room=cls.free, author=cls.author,
+            datetime_from=now + datetime.timedelta(days=1),
+            datetime_to=now + datetime.timedelta(days=1, hours=1),
+            until=now + datetime.timedelta(days=30))
+        Reservation.objects.create(
+            room=cls.busy, author=cls.author,
+            datetime_from=now - datetime.timedelta(minutes=10),
+            datetime_to=now + datetime.timedelta(minutes=50))
+        Reservation.objects.create(
+            room=cls.free, author=cls.author, series=series,
+            datetime_from=now + datetime.timedelta(days=2),
+            datetime_to=now + datetime.timedelta(days=2, hours=1))
+        refresh_status(Room.objects.all(), now)
+
+    def assert_same(self):
+        reservations = Reservation.objects.order_by('pk')
+        self.assertEqual(
+            reservation_records(reservation_values(reservations)),
+            ReservationSerializer(reservations, many=True).data)
+        rooms = Room.objects.order_by('pk')
+        records = room_records(room_values(rooms))
+        self.assertEqual(records, RoomSerializer(rooms, many=True).data)
+        # Состояние есть у одного помещения: проверены оба случая
+        self.assertIsNotNone(records[0]['busy_until'])
+        self.assertIsNone(records[1]['busy_until'])
+
+    def test_utc(self):
+        self.assert_same()
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_local_time_zone(self):
+        self.assert_same()
+
+
+class ReservationRetrieveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='u'))
+
+    def test_malformed_id_is_not_found(self):
+        response = self.client.get('/api/v1/reservations/abc/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_id_is_not_found(self):
+        response = self.client.get('/api/v1/reservations/999/')
+        self.assertEqual(response.status_code, 404)
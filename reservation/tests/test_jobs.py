@@ -0,0 +1,140 @@
+import datetime
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from reservation.jobs import (DatabaseBackend, InMemoryBackend, claim_jobs,
+                              enqueue, execute, job)
+from reservation.models import Building, Job
+
+calls = []
+
+
+@job
+def record(value):
+    calls.append(value)
+
+
+@job
+def create_building(name):
+    Building.objects.create(name=name)
+
+
+@job(max_attempts=3)
+def flaky(failures):
+    calls.append(failures)
+    if len(calls) <= failures:
+        raise RuntimeError('flaky')
+
+
+class InMemoryBackendTests(TransactionTestCase):
+    """Задачи уходят в очередь только после фиксации транзакции."""
+
+    def setUp(self):
+        calls.clear()
+        self.backend = InMemoryBackend()
+        patcher = patch('reservation.jobs.backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueued_on_commit(self):
+        with transaction.atomic():
+            enqueue(record, value=1)
+            self.assertEqual(self.backend.queue, [])
+        self.assertEqual(self.backend.run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def test_rollback_drops_job(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue(record, value=1)
+            raise RuntimeError
+        self.assertEqual(self.backend.run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    def test_retry_with_backoff(self):
+        enqueue(flaky, failures=2)
+        now = timezone.now()
+        self.assertEqual(self.backend.run_pending(now), 0)
+        # Повтор ждёт RESERVATION_JOBS_RETRY_DELAY секунд
+        self.assertEqual(self.backend.run_pending(now), 0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.backend.run_pending(
+            now + datetime.timedelta(hours=1)), 1)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.backend.failed, [])
+
+    def test_exhausted_attempts_fail(self):
+        enqueue(flaky, failures=5)
+        self.backend.run_pending(timezone.now() + datetime.timedelta(days=1))
+        self.assertEqual(len(calls), 3)
+        [(name, kwargs, error)] = self.backend.failed
+        self.assertEqual(name, flaky.job_name)
+        self.assertIsInstance(error, RuntimeError)
+
+
+class DatabaseBackendTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        patcher = patch('reservation.jobs.backend', DatabaseBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_execute_deletes_job(self):
+        enqueue(record, value=1)
+        [claimed] = claim_jobs(10)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claim_jobs(10), [])
+        self.assertTrue(execute(claimed))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failure_is_retried_later(self):
+        enqueue(flaky, failures=1)
+        [claimed] = claim_jobs(10)
+        self.assertFalse(execute(claimed))
+        self.assertEqual(claim_jobs(10), [])
+        later = timezone.now() + datetime.timedelta(hours=1)
+        [claimed] = claim_jobs(10, later)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertTrue(execute(claimed))
+        self.assertFalse(Job.objects.exists())
+
+    def test_last_failure_marks_failed(self):
+        enqueue(flaky, failures=5)
+        later = timezone.now()
+        for _ in range(3):
+            later += datetime.timedelta(hours=1)
+            [claimed] = claim_jobs(10, later)
+            self.assertFalse(execute(claimed))
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.FAILED, 3))
+        self.assertIn('RuntimeError', failed.last_error)
+
+    def test_expired_lease_is_reclaimed(self):
+        enqueue(create_building, name='b')
+        [claimed] = claim_jobs(10)
+        later = timezone.now() + datetime.timedelta(days=1)
+        [reclaimed] = claim_jobs(10, later)
+        self.assertNotEqual(reclaimed.locked_by, claimed.locked_by)
+        self.assertEqual(reclaimed.attempts, 2)
+        # Изменения первого обработчика откатываются, задача остаётся
+        # второму
+        self.assertFalse(execute(claimed))
+        self.assertFalse(Building.objects.exists())
+        self.assertEqual(Job.objects.get().locked_by, reclaimed.locked_by)
+        self.assertTrue(execute(reclaimed))
+        self.assertEqual(Building.objects.count(), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_expired_last_attempt_is_not_reclaimed(self):
+        enqueue(flaky, failures=0)
+        Job.objects.update(attempts=3)
+        later = timezone.now() + datetime.timedelta(days=1)
+        Job.objects.update(locked_by='dead', locked_until=later)
+        self.assertEqual(claim_jobs(10, later), [])
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.locked_by),
+                         (Job.FAILED, ''))
+        self.assertEqual(calls, [])
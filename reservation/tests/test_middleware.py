@@ -0,0 +1,31 @@
+from django.test import AsyncClient, TestCase
+
+from reservation.models import Building, Room, User
+
+
+class QueryInstrumentationTests(TestCase):
+    """Замеры запроса приходят в Server-Timing в обоих режимах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+        building = Building.objects.create(name='b')
+        cls.room = Room.objects.create(name='r', slug='r', building=building)
+
+    def assert_timing(self, response):
+        timing = response['Server-Timing']
+        for metric in ('db', 'total'):
+            self.assertIn(metric, timing)
+
+    def test_sync(self):
+        self.client.force_login(self.user)
+        response = self.client.get(f'/room/{self.room.slug}/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_timing(response)
+
+    async def test_async(self):
+        # Асинхронное представление читает базу из потока пула и данных
+        # теста не видит; ответ 401 проходит через тот же middleware
+        response = await AsyncClient().get('/api/v1/async/rooms/')
+        self.assertEqual(response.status_code, 401)
+        self.assert_timing(response)
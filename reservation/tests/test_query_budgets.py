@@ -0,0 +1,67 @@
+import datetime
+import re
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from reservation.models import Building, Reservation, Room, User
+
+OLDER_LINK = re.compile(r'href="\?cursor=([^"]+)">Старее')
+# Запросов на страницу для анонимного пользователя: первую и следующую
+# по курсору. Авторизованный добавляет сессию и пользователя
+QUERY_BUDGETS = {
+    'index': (1, 1),
+    'room': (3, 3),
+    'profile': (2, 3),
+}
+AUTHENTICATED_QUERIES = 2
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Страницы списков броней делают одно и то же число запросов
+    независимо от числа броней на странице.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create(username=f'author{i}')
+                       for i in range(5)]
+        building = Building.objects.create(name='b')
+        cls.room = Room.objects.create(name='r', slug='r', building=building)
+        start = timezone.now()
+        Reservation.objects.bulk_create(
+            Reservation(room=cls.room, author=cls.authors[i % 5],
+                        datetime_from=start + datetime.timedelta(hours=2 * i),
+                        datetime_to=start + datetime.timedelta(
+                            hours=2 * i + 1))
+            for i in range(100)
+        )
+
+    def urls(self):
+        return {
+            'index': reverse('reservation:index'),
+            'room': reverse('reservation:room', args=[self.room.slug]),
+            'profile': reverse('reservation:profile',
+                               args=[self.authors[0].username]),
+        }
+
+    def check_pages(self, extra=0):
+        for name, url in self.urls().items():
+            params = {}
+            for page, budget in enumerate(QUERY_BUDGETS[name], 1):
+                with self.subTest(page=name, number=page):
+                    with self.assertNumQueries(budget + extra):
+                        response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 200)
+                # Следующая страница открывается по курсору из ссылки
+                older = OLDER_LINK.search(response.content.decode())
+                params = {'cursor': older.group(1)} if older else {}
+
+    def test_anonymous(self):
+        self.check_pages()
+
+    def test_authenticated(self):
+        self.client.force_login(self.authors[0])
+        self.check_pages(AUTHENTICATED_QUERIES)
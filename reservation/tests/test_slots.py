@@ -0,0 +1,70 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.models import Building, Reservation, Room, User
+
+
+class SlotsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.building = Building.objects.create(name='b')
+        cls.room = Room.objects.create(name='r', slug='r',
+                                       building=cls.building)
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        cls.window = {
+            'datetime_from': start + datetime.timedelta(days=1),
+            'datetime_to': start + datetime.timedelta(days=1, hours=2),
+        }
+        Reservation.objects.create(
+            room=cls.room, author=cls.author,
+            datetime_from=cls.window['datetime_from'],
+            datetime_to=cls.window['datetime_from']
+            + datetime.timedelta(hours=1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get(self, path, **params):
+        return self.client.get(path, {
+            key: value.isoformat() for key, value in self.window.items()
+        } | params)
+
+    def test_room_grid(self):
+        response = self.get(f'/api/v1/rooms/{self.room.pk}/slots/',
+                            granularity=60)
+        self.assertEqual(response.status_code, 200)
+        [room] = response.data['rooms']
+        self.assertEqual([interval['busy'] for interval in room['intervals']],
+                         [True, False])
+
+    def test_building_free_slots(self):
+        response = self.get(f'/api/v1/buildings/{self.building.pk}/slots/',
+                            duration=60)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['slots']), 1)
+
+    def test_malformed_pk_is_not_found(self):
+        for path in ('/api/v1/rooms/abc/slots/',
+                     '/api/v1/buildings/abc/slots/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_missing_pk_is_not_found(self):
+        for path in ('/api/v1/rooms/999/slots/',
+                     '/api/v1/buildings/999/slots/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_out_of_range_params(self):
+        path = f'/api/v1/rooms/{self.room.pk}/slots/'
+        for params in ({'duration': 99999999999}, {'duration': 121},
+                       {'granularity': 99999999999}, {'granularity': 0}):
+            with self.subTest(**params):
+                response = self.get(path, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.data)
@@ -0,0 +1,49 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservation.models import Building, Room, User
+from reservation.utilization import apply_shares, interval_shares
+
+
+class StatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='u')
+        cls.building = Building.objects.create(name='b')
+        cls.empty = Building.objects.create(name='empty')
+        cls.room = Room.objects.create(name='r', slug='r',
+                                       building=cls.building)
+        cls.window_to = timezone.now().replace(minute=0, second=0,
+                                               microsecond=0)
+        cls.window_from = cls.window_to - datetime.timedelta(hours=2)
+        start = int(cls.window_from.timestamp())
+        apply_shares(interval_shares([(cls.room.pk, start, start + 1800)]))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self, building, group_by):
+        return self.client.get('/api/v1/stats/', {
+            'datetime_from': self.window_from.isoformat(),
+            'datetime_to': self.window_to.isoformat(),
+            'building': building.pk,
+            'group_by': group_by,
+        })
+
+    def test_room(self):
+        response = self.stats(self.building, 'room')
+        self.assertEqual(response.status_code, 200)
+        [group] = response.data['results']
+        self.assertEqual((group['booked_minutes'], group['utilization']),
+                         (30, 0.25))
+
+    def test_empty_building(self):
+        for group_by in ('room', 'building', 'hour', 'weekday'):
+            with self.subTest(group_by=group_by):
+                response = self.stats(self.empty, group_by)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['results'], [])
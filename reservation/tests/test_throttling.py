@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from reservation.throttling import LocalBucketStore
+
+
+class LocalBucketStoreTests(SimpleTestCase):
+    def test_rejected_request_takes_no_tokens(self):
+        store = LocalBucketStore()
+        wide = ('wide', 1 / 60, 3, 0)
+        narrow = ('narrow', 1 / 60, 1, 0)
+        self.assertEqual(store.take([wide, narrow]), 0)
+        self.assertGreater(store.take([wide, narrow]), 0)
+        # Отклонённый запрос не тронул корзину wide: в ней два токена
+        self.assertEqual(store.take([wide]), 0)
+        self.assertEqual(store.take([wide]), 0)
+        self.assertGreater(store.take([wide]), 0)
+
+    def test_reserve_is_kept(self):
+        store = LocalBucketStore()
+        bucket = ('room:1', 1 / 60, 5, 2)
+        for _ in range(3):
+            self.assertEqual(store.take([bucket]), 0)
+        self.assertGreater(store.take([bucket]), 0)
+        self.assertEqual(store.take([('room:1', 1 / 60, 5, 0)]), 0)
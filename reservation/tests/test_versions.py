@@ -0,0 +1,67 @@
+import datetime
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from reservation.models import Building, Reservation, Room, User
+from reservation.versions import (GLOBAL_SCOPE, bump_rooms, changed_rooms,
+                                  current_version, room_scope, scope_state)
+
+
+class BumpRoomsTests(TransactionTestCase):
+    def setUp(self):
+        building = Building.objects.create(name='b')
+        self.room = Room.objects.create(name='r', slug='r', building=building)
+        self.version = current_version()
+
+    def test_version_changes_after_commit(self):
+        with transaction.atomic():
+            bump_rooms({self.room.pk})
+            # Строка глобальной версии не блокируется транзакцией изменения
+            self.assertEqual(current_version(), self.version)
+        self.assertEqual(current_version(), self.version + 1)
+        self.assertEqual(scope_state(room_scope(self.room.pk))[0],
+                         self.version + 1)
+        self.assertEqual(changed_rooms(self.version), {self.room.pk})
+
+    def test_rollback_keeps_version(self):
+        with transaction.atomic():
+            bump_rooms({self.room.pk})
+            transaction.set_rollback(True)
+        self.assertEqual(current_version(), self.version)
+        self.assertEqual(changed_rooms(self.version), set())
+        self.assertEqual(scope_state(GLOBAL_SCOPE)[0], self.version)
+
+
+class NameChangeTests(TransactionTestCase):
+    """Названия здания и автора выводятся в ленте помещения."""
+
+    def setUp(self):
+        self.building = Building.objects.create(name='b')
+        room = Room.objects.create(name='r', slug='r', building=self.building)
+        self.author = User.objects.create(username='author')
+        now = timezone.now()
+        Reservation.objects.create(
+            room=room, author=self.author,
+            datetime_from=now + datetime.timedelta(hours=1),
+            datetime_to=now + datetime.timedelta(hours=2))
+
+    def assert_feed_changes(self, rename):
+        path = '/room/r/calendar.ics'
+        etag = self.client.get(path)['ETag']
+        rename()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response.content.decode()
+
+    def test_building_rename(self):
+        self.building.name = 'renamed'
+        feed = self.assert_feed_changes(self.building.save)
+        self.assertIn('LOCATION:renamed', feed)
+
+    def test_author_rename(self):
+        self.author.username = 'renamed'
+        feed = self.assert_feed_changes(self.author.save)
+        self.assertIn('(@renamed)', feed)
@@ -0,0 +1,204 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+CACHE_KEY_PREFIX = 'reservation:throttle:'
+# Сколько корзин хранит LocalBucketStore, прежде чем удалить заполненные
+MAX_LOCAL_BUCKETS = 100000
+
+
+def parse_rate(rate):
+    """Частота вида '30/min' как (запросов, секунд), как в DRF."""
+    requests, period = rate.split('/')
+    duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(requests), duration
+
+
+def refill(tokens, updated, now, rate, capacity):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def token_wait(tokens, rate, reserve):
+    """Сколько секунд ждать, пока в корзине хватит токена сверх reserve."""
+    return max(0, (reserve + 1 - tokens) / rate)
+
+
+class LocalBucketStore:
+    """
+    Корзины токенов в памяти процесса: проверка не обращается ни к базе,
+    ни к кэшу, но лимиты действуют на каждый процесс отдельно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, buckets):
+        """
+        Забирает по токену из каждой корзины buckets - четвёрок (ключ,
+        токенов в секунду, ёмкость, резерв), если в каждой после этого
+        останется не меньше резерва, иначе не забирает ни одного.
+        Возвращает 0 или сколько секунд ждать.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens = {}
+            for key, rate, capacity, _ in buckets:
+                stored, updated, _ = self._buckets.get(key,
+                                                       (capacity, now, now))
+                tokens[key] = refill(stored, updated, now, rate, capacity)
+            wait = max([token_wait(tokens[key], rate, reserve)
+                        for key, rate, _, reserve in buckets], default=0)
+            if wait:
+                return wait
+            for key, rate, capacity, _ in buckets:
+                # Запоминаем, когда корзина заполнится: полная корзина
+                # ничем не отличается от отсутствующей и её можно удалить
+                left = tokens[key] - 1
+                self._buckets[key] = (left, now,
+                                      now + (capacity - left) / rate)
+            if len(self._buckets) > MAX_LOCAL_BUCKETS:
+                self._buckets = {
+                    key: bucket for key, bucket in self._buckets.items()
+                    if bucket[2] > now
+                }
+        return 0
+
+
+class CacheBucketStore:
+    """
+    Корзины токенов в кэше Django: при общем бэкенде кэша лимиты общие для
+    всех процессов. Чтение и запись корзин не атомарны, поэтому при
+    одновременных запросах лимит соблюдается приблизительно.
+    """
+
+    def take(self, buckets):
+        now = time.time()
+        keys = [CACHE_KEY_PREFIX + key for key, _, _, _ in buckets]
+        stored = cache.get_many(keys)
+        tokens = [refill(*stored.get(key, (capacity, now)), now, rate,
+                         capacity)
+                  for key, (_, rate, capacity, _) in zip(keys, buckets)]
+        wait = max([token_wait(left, rate, reserve)
+                    for left, (_, rate, _, reserve) in zip(tokens, buckets)],
+                   default=0)
+        if wait:
+            return wait
+        # Корзина заполняется за capacity / rate секунд, дольше её хранить
+        # незачем
+        cache.set_many(
+            {key: (left - 1, now) for key, left in zip(keys, tokens)},
+            max([int(capacity / rate) + 1
+                 for _, rate, capacity, _ in buckets], default=1))
+        return 0
+
+
+bucket_store = import_string(settings.RESERVATION_THROTTLE_STORE)()
+
+
+class BookingScope:
+    """
+    Область корзин токенов с частотой из RESERVATION_THROTTLE_RATES:
+    '30/min' - корзина на 30 запросов, пополняемая на 30 токенов в минуту.
+    Сотрудникам (is_staff) доступна вся корзина, остальным - без доли
+    RESERVATION_THROTTLE_STAFF_RESERVE, поэтому в момент наплыва запросы
+    сотрудников проходят первыми.
+    """
+    name = None
+    staff_reserve = True
+
+    def get_keys(self, request):
+        """Корзины области, из которых запрос забирает по токену."""
+        raise NotImplementedError
+
+    def buckets(self, request):
+        requests, duration = parse_rate(
+            settings.RESERVATION_THROTTLE_RATES[self.name])
+        reserve = 0
+        if self.staff_reserve and not request.user.is_staff:
+            reserve = requests * settings.RESERVATION_THROTTLE_STAFF_RESERVE
+        return [(f'{self.name}:{key}', requests / duration, requests,
+                 reserve)
+                for key in self.get_keys(request)]
+
+
+class UserScope(BookingScope):
+    """Запросы одного пользователя; на сотрудников не действует."""
+    name = 'user'
+    staff_reserve = False
+
+    def get_keys(self, request):
+        if request.user.is_staff:
+            return []
+        return [request.user.pk]
+
+
+class RoomScope(BookingScope):
+    """Запросы к одному помещению, в том числе каждое помещение пакета."""
+    name = 'room'
+
+    def get_keys(self, request):
+        data = request.data
+        items = data if isinstance(data, list) else [data]
+        rooms = set()
+        for item in items:
+            try:
+                rooms.add(int(item.get('room')))
+            except (AttributeError, TypeError, ValueError):
+                # Неверные данные отклонит сериализатор
+                continue
+        return sorted(rooms)
+
+
+class GlobalScope(BookingScope):
+    """Все запросы, изменяющие брони."""
+    name = 'global'
+
+    def get_keys(self, request):
+        return ['all']
+
+
+class BookingThrottle(BaseThrottle):
+    """
+    Ограничивает запросы, изменяющие брони, корзинами всех областей
+    scopes сразу: запрос проходит, только если токен есть в каждой
+    корзине, а отклонённый запрос не расходует ни одной.
+    RESERVATION_THROTTLE_ENABLED = False снимает ограничения.
+    """
+    scopes = (UserScope(), RoomScope(), GlobalScope())
+
+    def __init__(self):
+        self.wait_time = 0
+
+    def allow_request(self, request, view):
+        if (request.method in SAFE_METHODS
+                or not settings.RESERVATION_THROTTLE_ENABLED):
+            return True
+        buckets = [bucket for scope in self.scopes
+                   for bucket in scope.buckets(request)]
+        self.wait_time = bucket_store.take(buckets)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
+
+
+BOOKING_THROTTLES = (BookingThrottle,)
+
+
+def check_booking_throttles(request):
+    """
+    Проверка BOOKING_THROTTLES для запросов вне представлений DRF, как в
+    APIView.check_throttles: бросает Throttled с наибольшим ожиданием.
+    """
+    durations = [throttle.wait() for throttle in
+                 (throttle_class() for throttle_class in BOOKING_THROTTLES)
+                 if not throttle.allow_request(request, None)]
+    if durations:
+        raise exceptions.Throttled(max(durations))
@@ -6,7 +6,7 @@ from rest_framework import permissions
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 app_name = 'reservation'
 
@@ -36,15 +36,31 @@ urlpatterns = [
 router = DefaultRouter()
 router.register('reservations', views.ReservationViewSet,
                 basename='ReservationView')
+router.register('series', views.ReservationSeriesViewSet,
+                basename='ReservationSeriesView')
 router.register('rooms', views.RoomViewSet, basename='RoomsView')
+router.register('buildings', views.BuildingViewSet, basename='BuildingView')
 router.register('users', views.UserViewSet, basename='UserView')
 
 urlpatterns += [
     path('', views.index, name='index'),
     path('api/v1/', include(router.urls)),
+    path('api/v1/metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('api/v1/stats/', views.StatsView.as_view(), name='stats'),
+    path('api/v1/async/rooms/', async_views.rooms, name='async_rooms'),
+    path('api/v1/async/rooms/<int:pk>/', async_views.room_reservations,
+         name='async_room_reservations'),
+    path('api/v1/async/reservations/', async_views.create_reservation,
+         name='async_reservations'),
     path('room/<slug:slug>/', views.room_reservations, name='room'),
+    path('room/<slug:slug>/calendar.ics', views.room_calendar,
+         name='room_calendar'),
+    path('building/<int:pk>/calendar.ics', views.building_calendar,
+         name='building_calendar'),
     path('new/', views.new_reservation, name="new_reservation"),
     path('<str:username>/', views.profile, name='profile'),
+    path('<str:username>/calendar.ics', views.user_calendar,
+         name='user_calendar'),
     path('<str:username>/<int:reservation_id>/', views.reservation_view,
          name='reservation'),
     path(
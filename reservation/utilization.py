@@ -0,0 +1,149 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .conflicts import lock_writes
+from .jobs import enqueue, job
+from .models import Room, RoomUtilization
+
+HOUR = 3600
+# Группировки статистики и соответствующие им колонки RoomUtilization:
+# помещение, здание, час дня и день недели (0 - понедельник, как в
+# правилах серий) в часовом поясе проекта
+GROUPS = {
+    'room': 'room_id',
+    'building': 'room__building_id',
+    'hour': 'day_hour',
+    'weekday': 'weekday',
+}
+
+
+def hour_shares(start, end):
+    """
+    Пары (номер часа от начала эпохи, занято секунд) для интервала
+    [start, end) в секундах от начала эпохи. Та же арифметика в
+    rebuild_utilization выполняется сразу для массива броней.
+    """
+    for hour in range(start // HOUR, (end - 1) // HOUR + 1):
+        yield hour, min(end, (hour + 1) * HOUR) - max(start, hour * HOUR)
+
+
+def hour_start(hour):
+    return datetime.datetime.fromtimestamp(hour * HOUR, datetime.timezone.utc)
+
+
+def local_parts(hour):
+    """Час дня и день недели (0 - понедельник) в часовом поясе проекта."""
+    local = hour_start(hour).astimezone(timezone.get_default_timezone())
+    return local.hour, local.weekday()
+
+
+def interval_shares(intervals, sign=1):
+    """
+    Изменения занятости по (помещению, часу) для интервалов броней,
+    заданных в секундах от начала эпохи.
+    """
+    shares = Counter()
+    for room_id, start, end in intervals:
+        for hour, seconds in hour_shares(start, end):
+            shares[room_id, hour] += sign * seconds
+    return shares
+
+
+def apply_shares(shares):
+    """
+    Прибавляет изменения одним запросом INSERT ... ON CONFLICT:
+    отсутствующие часы создаются, существующие изменяются в базе, поэтому
+    одновременные изменения не теряются. Изменения складываются в любом
+    порядке: вычитание, выполненное раньше прибавления, временно даёт
+    отрицательную занятость. Поддерживается SQLite 3.24+ и PostgreSQL.
+    """
+    lock_writes()
+    # Помещение могло быть удалено, пока задача ждала в очереди
+    rooms = set(Room.objects.filter(
+        pk__in={room_id for room_id, _ in shares}).values_list('pk',
+                                                               flat=True))
+    shares = {key: seconds for key, seconds in shares.items()
+              if seconds and key[0] in rooms}
+    if not shares:
+        return
+    table = connection.ops.quote_name(RoomUtilization._meta.db_table)
+    rows = []
+    for (room_id, hour), seconds in shares.items():
+        day_hour, weekday = local_parts(hour)
+        rows += [room_id, connection.ops.adapt_datetimefield_value(
+            hour_start(hour)), day_hour, weekday, seconds]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (room_id, hour, day_hour, weekday, seconds) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(shares))} '
+            f'ON CONFLICT (room_id, hour) DO UPDATE '
+            f'SET seconds = {table}.seconds + excluded.seconds', rows)
+
+
+@job
+def update_utilization(added, removed):
+    shares = interval_shares(added)
+    shares.update(interval_shares(removed, sign=-1))
+    apply_shares(shares)
+
+
+def epoch_intervals(intervals):
+    return [(room_id, int(datetime_from.timestamp()),
+             int(datetime_to.timestamp()))
+            for room_id, datetime_from, datetime_to in intervals]
+
+
+def record_intervals(added=(), removed=()):
+    """
+    Учитывает в занятости добавленные и удалённые интервалы броней
+    фоновой задачей: запрос, изменивший брони, её не ждёт.
+    """
+    enqueue(update_utilization, added=epoch_intervals(added),
+            removed=epoch_intervals(removed))
+
+
+def window_hours(datetime_from, datetime_to):
+    """Номера часов окна, выровненного по целым часам."""
+    return range(int(datetime_from.timestamp()) // HOUR,
+                 (int(datetime_to.timestamp()) - 1) // HOUR + 1)
+
+
+def utilization_stats(rooms, datetime_from, datetime_to, group_by='room'):
+    """
+    Занятость помещений rooms за окно по группам group_by из почасовой
+    занятости: занятые и доступные минуты и их доля. Два запроса
+    независимо от числа броней. Группы без доступного времени (в
+    выборке нет помещений) не выводятся.
+    """
+    hours = window_hours(datetime_from, datetime_to)
+    rollups = RoomUtilization.objects.filter(
+        room__in=rooms, hour__gte=hour_start(hours[0]),
+        hour__lte=hour_start(hours[-1]))
+    booked = dict(rollups.values_list(GROUPS[group_by]).annotate(
+        total=Sum('seconds')).order_by())
+    if group_by in ('room', 'building'):
+        counts = rooms.values_list(
+            'pk' if group_by == 'room' else 'building_id'
+        ).annotate(count=Count('pk')).order_by()
+        capacity = {key: count * len(hours) * HOUR for key, count in counts}
+    else:
+        room_count = rooms.count()
+        capacity = defaultdict(int)
+        for hour in hours:
+            day_hour, weekday = local_parts(hour)
+            key = day_hour if group_by == 'hour' else weekday
+            capacity[key] += room_count * HOUR
+    return [
+        {
+            group_by: key,
+            'booked_minutes': booked.get(key, 0) / 60,
+            'available_minutes': available / 60,
+            'utilization': booked.get(key, 0) / available,
+        }
+        for key, available in sorted(capacity.items())
+        if available
+    ]
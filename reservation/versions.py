@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChangeVersion
+
+GLOBAL_SCOPE = 'reservations'
+ROOM_SCOPE_PREFIX = 'room:'
+# Поколение кэшей проверенных токенов API (reservation.authentication)
+TOKEN_SCOPE = 'tokens'
+
+
+def room_scope(room_id):
+    return f'{ROOM_SCOPE_PREFIX}{room_id}'
+
+
+def current_version():
+    """Глобальная версия броней; 0, если изменений ещё не было."""
+    version = ChangeVersion.objects.filter(scope=GLOBAL_SCOPE).values_list(
+        'version', flat=True).first()
+    return version or 0
+
+
+def scope_state(scope):
+    """Пара (версия, время изменения) области; (0, None) без изменений."""
+    state = ChangeVersion.objects.filter(scope=scope).values_list(
+        'version', 'updated').first()
+    return state or (0, None)
+
+
+def changed_rooms(since):
+    """Идентификаторы помещений, изменившихся после версии since."""
+    scopes = ChangeVersion.objects.filter(
+        scope__startswith=ROOM_SCOPE_PREFIX, version__gt=since
+    ).values_list('scope', flat=True)
+    return {int(scope[len(ROOM_SCOPE_PREFIX):]) for scope in scopes}
+
+
+def next_version(scope):
+    """Увеличивает версию области scope; вызывается внутри транзакции."""
+    bumped = ChangeVersion.objects.filter(scope=scope).update(
+        version=F('version') + 1, updated=timezone.now())
+    if not bumped:
+        ChangeVersion.objects.get_or_create(scope=scope)
+        ChangeVersion.objects.filter(scope=scope).update(
+            version=F('version') + 1, updated=timezone.now())
+    return ChangeVersion.objects.values_list('version', flat=True).get(
+        scope=scope)
+
+
+def next_global_version():
+    return next_version(GLOBAL_SCOPE)
+
+
+def bump_scope(scope):
+    """Увеличивает версию области scope в отдельной транзакции."""
+    with transaction.atomic():
+        next_version(scope)
+
+
+def bump_global():
+    """Увеличивает глобальную версию без отметки помещений."""
+    bump_scope(GLOBAL_SCOPE)
+
+
+def rooms_changed(room_ids):
+    """
+    Сообщает об изменении помещений room_ids: после фиксации транзакции
+    меняются их версии для кэшей, и подписчики потока событий получают
+    событие. Все пути, изменяющие брони помещений, проходят через неё.
+    """
+    # Брокер событий зависит от асинхронных представлений, которые
+    # импортируют этот модуль
+    from .events import broker
+
+    room_ids = {room_id for room_id in room_ids if room_id is not None}
+    if room_ids:
+        bump_rooms(room_ids)
+        transaction.on_commit(lambda: broker.publish(room_ids))
+
+
+def bump_rooms(room_ids):
+    """
+    Помечает изменившиеся помещения новой глобальной версией после
+    фиксации текущей транзакции. Строка глобальной версии общая для всех
+    помещений: обновлённая в транзакции изменения, она оставалась бы
+    заблокированной до фиксации и выстраивала в очередь брони разных
+    помещений. Отдельная транзакция после фиксации держит её мгновения, а
+    кэши узнают об изменении сразу после неё; откат изменения версию не
+    меняет.
+    """
+    room_ids = {room_id for room_id in room_ids if room_id is not None}
+    if room_ids:
+        transaction.on_commit(lambda: stamp_rooms(room_ids))
+
+
+def stamp_rooms(room_ids):
+    """Увеличивает глобальную версию и помечает ею помещения room_ids."""
+    with transaction.atomic():
+        version = next_global_version()
+        scopes = {room_scope(room_id) for room_id in room_ids}
+        updated = ChangeVersion.objects.filter(scope__in=scopes).update(
+            version=version, updated=timezone.now())
+        if updated < len(scopes):
+            existing = set(ChangeVersion.objects.filter(
+                scope__in=scopes).values_list('scope', flat=True))
+            ChangeVersion.objects.bulk_create(
+                [ChangeVersion(scope=scope, version=version)
+                 for scope in scopes - existing],
+                ignore_conflicts=True
+            )
@@ -1,28 +1,193 @@
 import datetime
+from itertools import islice
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db.models import Prefetch, Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, status, viewsets
+from rest_framework import permissions, serializers, status, viewsets
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-
+from rest_framework.views import APIView
+
+from .archive import archive_horizon, with_reservation_count
+from .authentication import CachedTokenAuthentication
+from .availability import busy_intervals, free_rooms, parse_window
+from .caching import conditional_response
+from .conflicts import (ReservationConflict, booking, find_batch_conflicts,
+                        find_series_conflict, locked_rooms, overlapping,
+                        series_conflict_errors)
+from .exceptions import ReservationConflictError
+from .export import export_rows, stream_json, stream_ndjson
+from .fast_serializers import (datetime_formatter, reservation_record,
+                               reservation_records, reservation_values,
+                               room_records, room_values)
 from .filters import RoomFilterBackend
 from .forms import ReservationForm
-from .models import Reservation, Room, User
+from .ical import calendar_response
+from .instrumentation import registry
+from .models import (Building, Reservation, ReservationArchive,
+                     ReservationSeries, Room, User)
+from .occupancy import occupancy
+from .pagination import ArchiveKeysetPaginator, KeysetPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import ReservationSerializer, RoomSerializer, UserSerializer
+from .renderers import NDJSONRenderer, PrometheusRenderer
+from .room_status import reservations_changed
+from .serializers import (BuildingScheduleSerializer, BuildingSerializer,
+                          BulkReservationSerializer, OccurrenceSerializer,
+                          ReservationSerializer, ReservationSeriesSerializer,
+                          RoomSerializer, UserSerializer)
+from .slots import first_free_slots, grid, merge_busy, parse_slot_params
+from .throttling import BOOKING_THROTTLES
+from .utilization import GROUPS, record_intervals, utilization_stats
+from .versions import GLOBAL_SCOPE, room_scope, rooms_changed
 
 RECORDS_ON_THE_PAGE = 10
+SERIES_OCCURRENCES = 5
+# Поля, которые выводит includes/reservation_item.html
+LISTING_FIELDS = ('id', 'datetime_from', 'datetime_to', 'created',
+                  'room', 'room__name', 'room__slug',
+                  'author', 'author__username')
+
+
+def listing(queryset):
+    """
+    Брони для вывода списком: помещение и автор подгружаются тем же
+    запросом, остальные колонки не читаются.
+    """
+    return queryset.select_related('room', 'author').only(*LISTING_FIELDS)
+
+
+def history_page(request, queryset, archived):
+    """Страница списка броней вместе с соответствующими архивными."""
+    paginator = ArchiveKeysetPaginator(listing(queryset), listing(archived),
+                                       archive_horizon(), RECORDS_ON_THE_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def slots_response(query_params, room_ids):
+    """
+    Ответ slots/: календарная сетка помещений room_ids или, если задана
+    длительность duration, первые свободные слоты среди них. Брони всех
+    помещений читаются одним запросом, серии - ещё одним.
+    """
+    try:
+        window_from, window_to, step, duration, limit = parse_slot_params(
+            query_params)
+    except (ValueError, OverflowError) as error:
+        return Response({'detail': str(error)},
+                        status=status.HTTP_400_BAD_REQUEST)
+    intervals = busy_intervals(window_from, window_to, room_ids)
+    busy = {room_id: merge_busy(intervals.get(room_id, ()), window_from,
+                                window_to)
+            for room_id in room_ids}
+    to_representation = datetime_formatter()
+    if duration is not None:
+        slots = first_free_slots(busy, window_from, window_to, step,
+                                 duration, limit)
+        return Response({'slots': [
+            {'room': room_id,
+             'datetime_from': to_representation(start),
+             'datetime_to': to_representation(end)}
+            for start, room_id, end in slots
+        ]})
+    return Response({'rooms': [
+        {'room': room_id, 'intervals': [
+            {'datetime_from': to_representation(start),
+             'datetime_to': to_representation(end),
+             'busy': is_busy}
+            for start, end, is_busy in grid(busy[room_id], window_from,
+                                            window_to, step)
+        ]}
+        for room_id in room_ids
+    ]})
+
+
+def save_reservation(form):
+    """
+    Сохраняет бронь из формы под блокировкой помещения.
+    Возвращает False, если время успели занять после валидации формы.
+    """
+    reservation = form.instance
+    try:
+        with booking(reservation.room_id, reservation.datetime_from,
+                     reservation.datetime_to, exclude_pk=reservation.pk):
+            reservation.save()
+    except ReservationConflict as error:
+        form.add_error(None, error)
+        return False
+    return True
+
+
+def save_booking(serializer, **kwargs):
+    """
+    Сохраняет бронь из сериализатора API под блокировкой помещения.
+    Пересечение с уже существующей бронью возвращается со статусом 409.
+    """
+    instance = serializer.instance
+    data = serializer.validated_data
+    room = data.get('room', getattr(instance, 'room', None))
+    try:
+        with booking(room.pk,
+                     data.get('datetime_from',
+                              getattr(instance, 'datetime_from', None)),
+                     data.get('datetime_to',
+                              getattr(instance, 'datetime_to', None)),
+                     exclude_pk=getattr(instance, 'pk', None)):
+            serializer.save(**kwargs)
+    except ReservationConflict as error:
+        raise ReservationConflictError(error.message_dict)
+
+
+def available_room_rows(query_params):
+    """
+    Строки помещений для списка API: при заданных datetime_from и
+    datetime_to - только свободные в этом промежутке, building отбирает
+    помещения здания. Бросает ValueError при неверных параметрах.
+    """
+    datetime_from, datetime_to = parse_window(query_params)
+    building = query_params.get('building', None)
+    queryset = Room.objects.all()
+    if building:
+        queryset = queryset.filter(building=int(building))
+    if datetime_from and datetime_to:
+        if occupancy.can_answer(datetime_from, datetime_to):
+            busy = occupancy.busy_rooms(datetime_from, datetime_to)
+            return [row for row in room_values(queryset)
+                    if row['id'] not in busy]
+        return room_values(free_rooms(datetime_from, datetime_to, queryset))
+    return room_values(queryset)
+
+
+def fetch_bulk_ids(reservations):
+    """
+    Проставляет id броням, созданным через bulk_create, на бэкендах, которые
+    не возвращают id вставленных строк. Брони одного помещения не
+    пересекаются, поэтому помещение и начало однозначно задают бронь.
+    """
+    query = Q()
+    for reservation in reservations:
+        query |= Q(room_id=reservation.room_id,
+                   datetime_from=reservation.datetime_from)
+    ids = {
+        (room_id, datetime_from): pk
+        for pk, room_id, datetime_from in Reservation.objects.filter(
+            query).values_list('pk', 'room_id', 'datetime_from')
+    }
+    for reservation in reservations:
+        reservation.pk = ids[(reservation.room_id, reservation.datetime_from)]
 
 
 def index(request):
-    reservations = Reservation.objects.all()
-    paginator = Paginator(reservations, RECORDS_ON_THE_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = history_page(request, Reservation.objects.all(),
+                        ReservationArchive.objects.all())
     context = {
-        'paginator': paginator,
         'page': page
     }
     return render(request, 'index.html', context)
@@ -30,40 +195,70 @@ def index(request):
 
 def room_reservations(request, slug):
     room = get_object_or_404(Room, slug=slug)
-    reservations = room.reservation.all()
-    paginator = Paginator(reservations, RECORDS_ON_THE_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = history_page(request, room.reservation.all(),
+                        room.archived_reservations.all())
+    # Серии показываются ближайшими вхождениями, без полного разворота
+    now = timezone.now()
+    series_list = [
+        (series, list(islice(series.occurrences(now), SERIES_OCCURRENCES)))
+        for series in room.series.filter(until__gt=now).select_related(
+            'author')
+    ]
     context = {
-        'paginator': paginator,
         'room': room,
-        'page': page
+        'page': page,
+        'series_list': series_list,
     }
     return render(request, 'room.html', context)
 
 
+def room_calendar(request, slug):
+    def build():
+        room = get_object_or_404(Room, slug=slug)
+        return f'Рабочее место {room.name}', room.reservation.all()
+
+    room_id = get_object_or_404(Room.objects.values_list('pk', flat=True),
+                                slug=slug)
+    return calendar_response(request, room_scope(room_id), build)
+
+
+def building_calendar(request, pk):
+    def build():
+        building = get_object_or_404(Building, pk=pk)
+        return (f'Здание {building.name}',
+                Reservation.objects.filter(room__building=building))
+
+    return calendar_response(request, GLOBAL_SCOPE, build)
+
+
+def user_calendar(request, username):
+    def build():
+        user = get_object_or_404(User, username=username)
+        return (f'Бронирования {user.username}',
+                Reservation.objects.filter(author=user))
+
+    return calendar_response(request, GLOBAL_SCOPE, build)
+
+
 @login_required
 def new_reservation(request):
     form = ReservationForm(request.POST or None)
     if form.is_valid():
-        reservation = form.save(commit=False)
-        reservation.author = request.user
-        reservation.save()
-        return redirect('reservation:index')
+        form.instance.author = request.user
+        if save_reservation(form):
+            return redirect('reservation:index')
 
     return render(request, 'reservation_new.html', {'form': form})
 
 
 def profile(request, username):
-    user = get_object_or_404(User.objects, username=username)
-    reservation_list = Reservation.objects.filter(author=user)
-    user_reservation_count = len(reservation_list)
-    paginator = Paginator(reservation_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    user = get_object_or_404(with_reservation_count(User.objects),
+                             username=username)
+    page = history_page(request, Reservation.objects.filter(author=user),
+                        ReservationArchive.objects.filter(author=user))
     context = {
         'profile_user': user,
-        'user_reservation_count': user_reservation_count,
+        'user_reservation_count': user.reservation_count,
         'page': page
     }
     return render(request, 'profile.html', context)
@@ -71,12 +266,19 @@ def profile(request, username):
 
 @login_required
 def reservation_view(request, username, reservation_id):
-    user = get_object_or_404(User.objects, username=username)
-    reservation = Reservation.objects.get(id__exact=reservation_id)
-    user_reservation_count = Reservation.objects.filter(author=user).count()
+    user = get_object_or_404(with_reservation_count(User.objects),
+                             username=username)
+    reservation = Reservation.objects.select_related('room', 'author').filter(
+        id=reservation_id).first()
+    if reservation is None:
+        # Прошедшая бронь могла быть перенесена в архив
+        reservation = get_object_or_404(
+            ReservationArchive.objects.select_related('room', 'author'),
+            id=reservation_id
+        )
     context = {
         'profile_user': user,
-        'user_reservation_count': user_reservation_count,
+        'user_reservation_count': user.reservation_count,
         'reservation': reservation,
     }
 
@@ -93,8 +295,7 @@ def reservation_edit(request, username, reservation_id):
         return redirect('reservation:index')
 
     form = ReservationForm(request.POST or None, instance=reservation)
-    if form.is_valid():
-        form.save()
+    if form.is_valid() and save_reservation(form):
         return redirect('reservation:index')
 
     return render(request, 'reservation_new.html', {'form': form,
@@ -118,9 +319,129 @@ class ReservationViewSet(viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthorOrReadOnly]
+    pagination_class = KeysetPagination
+    throttle_classes = BOOKING_THROTTLES
+    # retrieve фильтрует по id без get_object(): нечисловой id должен
+    # давать 404 ещё на маршрутизации
+    lookup_value_regex = r'\d+'
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        save_booking(serializer, author=self.request.user)
+
+    def perform_update(self, serializer):
+        save_booking(serializer)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Бронирует пакет рабочих мест одним запросом.
+        Принимает список объектов room, datetime_from, datetime_to.
+        Брони проверяются против базы и друг против друга; подходящие
+        сохраняются одной транзакцией. Для каждой брони возвращается
+        результат: created (с id), conflict (с id брони из базы или
+        номером брони пакета) или invalid (с ошибками).
+        """
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Ожидается список броней.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.RESERVATION_BULK_LIMIT:
+            return Response(
+                {'detail': 'Слишком много броней в одном запросе. '
+                           f'Максимум {settings.RESERVATION_BULK_LIMIT}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = [None] * len(request.data)
+        items = {}
+        for index, item in enumerate(request.data):
+            serializer = BulkReservationSerializer(data=item)
+            if serializer.is_valid():
+                items[index] = serializer.validated_data
+            else:
+                results[index] = {'status': 'invalid',
+                                  'errors': serializer.errors}
+        rooms = Room.objects.in_bulk({item['room']
+                                      for item in items.values()})
+        for index, item in list(items.items()):
+            if item['room'] not in rooms:
+                results[index] = {'status': 'invalid', 'errors': {
+                    'room': ['Рабочее место не найдено.']}}
+                del items[index]
+
+        with locked_rooms(rooms):
+            order = list(items)
+            conflicts = find_batch_conflicts([
+                (items[index]['room'], items[index]['datetime_from'],
+                 items[index]['datetime_to']) for index in order
+            ])
+            created = []
+            for position, index in enumerate(order):
+                conflict = conflicts.get(position)
+                if conflict is None:
+                    created.append((index, Reservation(
+                        room_id=items[index]['room'], author=request.user,
+                        datetime_from=items[index]['datetime_from'],
+                        datetime_to=items[index]['datetime_to'],
+                    )))
+                    continue
+                source, value = conflict
+                results[index] = {
+                    'status': 'conflict',
+                    source: order[value] if source == 'item' else value,
+                }
+            Reservation.objects.bulk_create(
+                [reservation for _, reservation in created])
+            if created and created[0][1].pk is None:
+                fetch_bulk_ids([reservation for _, reservation in created])
+            # bulk_create не отправляет post_save
+            rooms_changed(
+                {reservation.room_id for _, reservation in created})
+            record_intervals(added=[
+                (reservation.room_id, reservation.datetime_from,
+                 reservation.datetime_to) for _, reservation in created])
+            reservations_changed(
+                {reservation.room_id for _, reservation in created},
+                [reservation.datetime_to for _, reservation in created])
+        for index, reservation in created:
+            results[index] = {'status': 'created', 'id': reservation.pk}
+        return Response(results)
+
+    @action(detail=False,
+            renderer_classes=[NDJSONRenderer, JSONRenderer])
+    def export(self, request):
+        """
+        Потоковая выгрузка броней для аналитики, включая архивные. Память
+        сервера не зависит от объёма выгрузки.
+        format - ndjson (по умолчанию, одна бронь на строку) или json
+        datetime_from, datetime_to - опционально выбирают брони,
+        пересекающиеся с периодом
+        room, building - опционально выбирают брони рабочего места или
+        здания по id
+        """
+        try:
+            datetime_from, datetime_to = parse_window(request.query_params)
+            room = request.query_params.get('room', None)
+            room = int(room) if room else None
+            building = request.query_params.get('building', None)
+            building = int(building) if building else None
+        except ValueError:
+            return Response({'detail': 'Неверные параметры выгрузки.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        conditions = Q()
+        if datetime_from:
+            conditions &= Q(datetime_to__gt=datetime_from)
+        if datetime_to:
+            conditions &= Q(datetime_from__lt=datetime_to)
+        if room:
+            conditions &= Q(room=room)
+        if building:
+            conditions &= Q(room__building=building)
+        rows = export_rows(Reservation.objects.filter(conditions),
+                           ReservationArchive.objects.filter(conditions))
+        if request.accepted_renderer.format == 'json':
+            return StreamingHttpResponse(stream_json(rows),
+                                         content_type='application/json')
+        return StreamingHttpResponse(stream_ndjson(rows),
+                                     content_type=NDJSONRenderer.media_type)
 
     def create(self, request, *args, **kwargs):
         """
@@ -137,9 +458,14 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """
-        Возвращает список всех имеющихся броней в системе.
+        Возвращает список всех имеющихся броней в системе постранично.
+        cursor - курсор страницы из ссылок next и previous
+        page_size - опционально задаёт число записей на странице
         """
-        return super(ReservationViewSet, self).list(request, *args, **kwargs)
+        queryset = reservation_values(self.filter_queryset(
+            self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(reservation_records(page))
 
     def partial_update(self, request, *args, **kwargs):
         """
@@ -153,8 +479,11 @@ class ReservationViewSet(viewsets.ModelViewSet):
         """
         Выводит детальную информацию о бронировании по id
         """
-        return super(ReservationViewSet, self).retrieve(request, *args,
-                                                        **kwargs)
+        row = reservation_values(self.get_queryset().filter(
+            pk=kwargs['pk'])).first()
+        if row is None:
+            raise Http404
+        return Response(reservation_record(row))
 
     def update(self, request, *args, **kwargs):
         """
@@ -164,12 +493,98 @@ class ReservationViewSet(viewsets.ModelViewSet):
         return super(ReservationViewSet, self).update(request, *args, **kwargs)
 
 
+class ReservationSeriesViewSet(viewsets.ModelViewSet):
+    queryset = ReservationSeries.objects.all()
+    serializer_class = ReservationSeriesSerializer
+    permission_classes = [IsAuthorOrReadOnly]
+    throttle_classes = BOOKING_THROTTLES
+
+    def perform_create(self, serializer):
+        self.perform_booking(serializer, author=self.request.user)
+
+    def perform_update(self, serializer):
+        self.perform_booking(serializer)
+
+    def perform_booking(self, serializer, **kwargs):
+        """
+        Сохраняет серию под блокировкой помещения. Если вхождение серии
+        пересекается с занятым временем, транзакция откатывается и
+        возвращается статус 409.
+        """
+        instance = serializer.instance
+        room = serializer.validated_data.get('room',
+                                             getattr(instance, 'room', None))
+        with locked_rooms({room.pk, getattr(instance, 'room_id', room.pk)}):
+            series = serializer.save(**kwargs)
+            conflict = find_series_conflict(series)
+            if conflict is not None:
+                raise ReservationConflictError(
+                    series_conflict_errors(conflict))
+
+    @action(detail=True)
+    def occurrences(self, request, pk=None):
+        """
+        Возвращает вхождения серии в окне datetime_from - datetime_to.
+        По умолчанию - ближайшие RESERVATION_SERIES_WINDOW_DAYS дней.
+        """
+        series = self.get_object()
+        try:
+            window_from, window_to = parse_window(request.query_params)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        window_from = window_from or timezone.now()
+        window_to = window_to or window_from + datetime.timedelta(
+            days=settings.RESERVATION_SERIES_WINDOW_DAYS)
+        occurrences = islice(series.occurrences(window_from, window_to),
+                             settings.RESERVATION_SERIES_MAX_OCCURRENCES)
+        return Response(OccurrenceSerializer(occurrences, many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def materialize(self, request, pk=None):
+        """
+        Превращает вхождение серии с началом datetime_from в отдельную
+        бронь, которую можно изменять независимо от серии.
+        """
+        series = self.get_object()
+        try:
+            start = serializers.DateTimeField().to_internal_value(
+                request.data.get('datetime_from'))
+        except serializers.ValidationError as error:
+            return Response({'datetime_from': error.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
+        occurrence = next(
+            (occurrence for occurrence in series.occurrences(
+                start, start + datetime.timedelta(microseconds=1))
+             if occurrence.datetime_from == start),
+            None
+        )
+        if occurrence is None:
+            return Response(
+                {'datetime_from': ['У серии нет такого вхождения.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with locked_rooms([series.room_id]):
+            reservation = Reservation.objects.create(
+                room_id=series.room_id, author=series.author, series=series,
+                datetime_from=occurrence.datetime_from,
+                datetime_to=occurrence.datetime_to,
+            )
+            series.exclude(occurrence.datetime_from)
+            series.save(update_fields=['excluded'])
+        return Response(ReservationSerializer(reservation).data,
+                        status=status.HTTP_201_CREATED)
+
+
 class RoomViewSet(viewsets.ModelViewSet):
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filter_class = RoomFilterBackend
+    pagination_class = LimitOffsetPagination
+    # retrieve и slots/ фильтруют по pk без get_object(): нечисловой
+    # pk должен давать 404 ещё на маршрутизации
+    lookup_value_regex = r'\d+'
 
     def create(self, request, *args, **kwargs):
         """
@@ -194,34 +609,25 @@ class RoomViewSet(viewsets.ModelViewSet):
         datetime_from - опционально выбирает время начала выборки
         datetime_to - опционально выбирает время окончания выборки
         INPUT EXAMPLE: 2021-01-20 23:00:00
+        building - опционально выбирает рабочие места одного здания
+        limit, offset - опционально включают постраничный вывод
         Без параметров вернется список всех рабочих мест.
-	    Если есть параметры, то вернется список рабочих мест,
-	    свободных в указанный временной промежуток.
+        Если есть параметры, то вернется список рабочих мест,
+        свободных в указанный временной промежуток.
         """
+        return conditional_response(request, GLOBAL_SCOPE,
+                                    self.available_rooms)
+
+    def available_rooms(self):
         try:
             # получаем параметры запроса, если они невалидны шлем статус 400
-            datetime_from = self.request.query_params.get('datetime_from', None)
-            if datetime_from:
-                datetime_from = datetime.datetime.fromisoformat(datetime_from)
-
-            datetime_to = self.request.query_params.get('datetime_to', None)
-            if datetime_to:
-                datetime_to = datetime.datetime.fromisoformat(datetime_to)
-                if datetime_to <= datetime_from:
-                    raise ValueError(
-                        'Перепутаны местами начало и конец периода')
+            queryset = available_room_rows(self.request.query_params)
         except ValueError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        if not datetime_from or not datetime_to:
-            queryset = Room.objects.all()
-            serializer = RoomSerializer(queryset, many=True)
-            return Response(serializer.data)
-        queryset = Reservation.objects.filter(datetime_from__gte=datetime_from,
-                                              datetime_to__lte=datetime_to)
-        rooms = queryset.values_list('room', flat=True)
-        queryset = Room.objects.exclude(id__in=set(rooms))
-        serializer = RoomSerializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(room_records(page))
+        return Response(room_records(queryset))
 
     def partial_update(self, request, *args, **kwargs):
         """
@@ -234,12 +640,37 @@ class RoomViewSet(viewsets.ModelViewSet):
 
     def retrieve(self, request, pk=None, *args, **kwargs):
         """
-        просмотра списка бронирований по id рабочего места
+        просмотра списка бронирований по id рабочего места постранично
+        cursor - курсор страницы из ссылок next и previous
+        page_size - опционально задаёт число записей на странице
+        """
+        def room_reservations():
+            room = get_object_or_404(Room, pk=pk)
+            queryset = reservation_values(room.reservation.all())
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            return paginator.get_paginated_response(
+                reservation_records(page))
+
+        return conditional_response(request, room_scope(pk),
+                                    room_reservations)
+
+    @action(detail=True)
+    def slots(self, request, pk=None):
         """
-        room = get_object_or_404(Room, pk=pk)
-        queryset = room.reservation.all()
-        serializer = ReservationSerializer(queryset, many=True)
-        return Response(serializer.data)
+        Свободное и занятое время рабочего места.
+        datetime_from, datetime_to - окно поиска, не длиннее
+        RESERVATION_SLOTS_MAX_DAYS дней
+        granularity - шаг сетки в минутах от начала окна, по умолчанию 30
+        duration - длительность в минутах: если задана, возвращаются
+        первые limit (по умолчанию 10) свободных слотов такой длины,
+        иначе - занятые и свободные интервалы, выровненные по сетке
+        """
+        def room_slots():
+            room = get_object_or_404(Room.objects.only('pk'), pk=pk)
+            return slots_response(request.query_params, [room.pk])
+
+        return conditional_response(request, room_scope(pk), room_slots)
 
     def update(self, request, *args, **kwargs):
         """
@@ -251,7 +682,148 @@ class RoomViewSet(viewsets.ModelViewSet):
         return super(RoomViewSet, self).update(request, *args, **kwargs)
 
 
+class BuildingViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Здания с вложенными рабочими местами. С datetime_from и datetime_to
+    у каждого места выводятся брони, пересекающие окно, не длиннее
+    RESERVATION_BUILDINGS_MAX_DAYS дней. Здания, места и брони читаются
+    тремя запросами независимо от их числа. Вхождения серий не выводятся.
+    """
+    queryset = Building.objects.order_by('name')
+    serializer_class = BuildingSerializer
+    # slots/ фильтрует места по pk здания без get_object()
+    lookup_value_regex = r'\d+'
+    window = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('room', queryset=Room.objects.order_by('name')))
+        if self.window:
+            reservations = overlapping(
+                Reservation.objects.select_related('author'), *self.window)
+            queryset = queryset.prefetch_related(Prefetch(
+                'room__reservation',
+                queryset=reservations.order_by('datetime_from', 'pk'),
+                to_attr='window_reservations'))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.window:
+            return BuildingScheduleSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        return self.floor_plan(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.floor_plan(super().retrieve, request, *args, **kwargs)
+
+    def floor_plan(self, handler, request, *args, **kwargs):
+        try:
+            datetime_from, datetime_to = parse_window(request.query_params)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if datetime_from and datetime_to:
+            max_days = settings.RESERVATION_BUILDINGS_MAX_DAYS
+            if datetime_to - datetime_from > datetime.timedelta(
+                    days=max_days):
+                return Response({'detail': f'Окно длиннее {max_days} дней.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            self.window = datetime_from, datetime_to
+        elif datetime_from or datetime_to:
+            return Response({'detail': 'Нужны datetime_from и datetime_to.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return conditional_response(
+            request, GLOBAL_SCOPE,
+            lambda: handler(request, *args, **kwargs))
+
+    @action(detail=True)
+    def slots(self, request, pk=None):
+        """
+        Свободное и занятое время всех рабочих мест здания; с duration
+        возвращаются первые свободные слоты среди всех мест здания.
+        datetime_from, datetime_to - окно поиска, не длиннее
+        RESERVATION_SLOTS_MAX_DAYS дней
+        granularity - шаг сетки в минутах от начала окна, по умолчанию 30
+        duration - длительность в минутах: если задана, возвращаются
+        первые limit (по умолчанию 10) свободных слотов такой длины,
+        иначе - занятые и свободные интервалы, выровненные по сетке
+        """
+        def building_slots():
+            rooms = list(Room.objects.filter(building=pk).values_list(
+                'pk', flat=True))
+            if not rooms:
+                get_object_or_404(Building, pk=pk)
+            return slots_response(request.query_params, rooms)
+
+        return conditional_response(request, GLOBAL_SCOPE, building_slots)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+
+
+class MetricsView(APIView):
+    """
+    Замеры запросов этого процесса по представлениям: число запросов,
+    SQL-запросов и время базы, процентили времени ответа, SQL-запросов,
+    времени базы и отрисовки. ?format=prometheus отдаёт текстовый формат
+    Prometheus. Доступно только администраторам.
+    """
+    authentication_classes = [CachedTokenAuthentication,
+                              SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [JSONRenderer, PrometheusRenderer]
+
+    def get(self, request):
+        return Response(registry.snapshot())
+
+
+class StatsView(APIView):
+    """
+    Занятость рабочих мест по почасовой статистике: для каждой группы
+    занятые и доступные минуты и их доля utilization.
+    datetime_from, datetime_to - период, по умолчанию последние
+    RESERVATION_STATS_DEFAULT_DAYS дней; границы выравниваются по часам
+    group_by - room (по умолчанию), building, hour (час дня) или weekday
+    (день недели, 0 - понедельник)
+    building, room - опционально ограничивают здание или рабочее место
+    Вхождения серий в статистику не входят.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        group_by = params.get('group_by', 'room')
+        if group_by not in GROUPS:
+            return Response(
+                {'group_by': [f'Допустимые значения: {", ".join(GROUPS)}.']},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            datetime_from, datetime_to = parse_window(params)
+            rooms = Room.objects.all()
+            if params.get('building'):
+                rooms = rooms.filter(building=int(params['building']))
+            if params.get('room'):
+                rooms = rooms.filter(pk=int(params['room']))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        datetime_to = datetime_to or timezone.now()
+        datetime_from = datetime_from or datetime_to - datetime.timedelta(
+            days=settings.RESERVATION_STATS_DEFAULT_DAYS)
+        if datetime_to <= datetime_from:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if datetime_to - datetime_from > datetime.timedelta(
+                days=settings.RESERVATION_STATS_MAX_DAYS):
+            return Response(
+                {'detail': 'Период длиннее '
+                           f'{settings.RESERVATION_STATS_MAX_DAYS} дней.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'datetime_from': datetime_from,
+            'datetime_to': datetime_to,
+            'group_by': group_by,
+            'results': utilization_stats(rooms, datetime_from, datetime_to,
+                                         group_by),
+        })